@@ -0,0 +1,154 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from utils.common import hex2bin, crc, icao, df
+from utils.position import airborne_position, util_position, oe_flag
+from utils.BDS50 import is50
+from utils.BDS60 import is60
+from utils.synth import generate
+import scripts.decode as decode_module
+
+sizes = [1000, 10000, 100000]
+repeat = 3
+out_path = "../results/bench"
+
+
+def measure(func, n, repeat=repeat):
+    """Best wall time of `repeat` runs, and the peak traced memory of one more run."""
+    best = None
+    for r in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+
+    # tracing slows allocation down, so memory is measured separately
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dict(n=n, seconds=best, msg_per_s=n / best if best > 0 else None, peak_mb=peak / 2**20)
+
+
+def corpus(n):
+    """Synthetic raw frames, about `n` of them."""
+    n_aircraft = max(1, n // 4 // 600)
+    frames = generate(n_aircraft=n_aircraft, duration=max(60., n / 4 / n_aircraft), seed=n)
+    return frames.iloc[:n].reset_index(drop=True)
+
+
+def position_chunks(frames):
+    """Time bucket x aircraft chunks of DF17 positions, as decode() hands them to util_position."""
+    adsb = frames[[df(c) == 17 for c in frames['code']]].copy()
+    adsb['time'] = pd.to_datetime(adsb['time'], unit='ms').dt.round(decode_module.time_resolution)
+    adsb['acid'] = adsb['code'].str[2:8]
+    adsb['oe'] = [oe_flag(c) for c in adsb['code']]
+    adsb = adsb[adsb['oe'].notna()]
+    return [chunk for _, chunk in adsb.groupby(['time', 'acid'])]
+
+
+def stages(frames):
+    codes = frames['code'].tolist()
+    df17 = [c for c in codes if df(c) == 17]
+    commb = [c for c in codes if df(c) in (20, 21)]
+    pairs, last = list(), dict()
+    for c in df17:
+        oe = oe_flag(c)
+        if oe is None:
+            continue
+        prev = last.get(c[2:8])
+        if prev is not None and oe_flag(prev) != oe:
+            pairs.append((prev, c))
+        last[c[2:8]] = c
+    chunks = position_chunks(frames)
+    raw = frames.rename(columns={'time': 'time_ms'})
+
+    def full_decode():
+        target = pd.DataFrame({'time': pd.to_datetime(raw['time_ms'], unit='ms')
+                              .dt.round(decode_module.time_resolution), 'code': raw['code']})
+        # keep the per-stage progress messages of decode() out of the results
+        logging.disable(logging.INFO)
+        try:
+            decode_module.decode_frame(decode_module.raw_frames(target))
+        finally:
+            logging.disable(logging.NOTSET)
+
+    return {
+        'hex2bin': (lambda: [hex2bin(c) for c in codes], len(codes)),
+        'crc': (lambda: [crc(c) for c in codes], len(codes)),
+        'icao': (lambda: [icao(c) for c in codes], len(codes)),
+        'is50': (lambda: [is50(c) for c in commb], len(commb)),
+        'is60': (lambda: [is60(c) for c in commb], len(commb)),
+        'airborne_position': (lambda: [airborne_position(a, b, 0, 1) for a, b in pairs], len(pairs)),
+        'util_position': (lambda: [util_position(c) for c in chunks], sum(len(c) for c in chunks)),
+        'decode': (full_decode, len(codes)),
+    }
+
+
+def git_version():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+                                       cwd=os.path.dirname(__file__), text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=sizes, only=None):
+    results = list()
+    for n in sizes:
+        frames = corpus(n)
+        for name, (func, count) in stages(frames).items():
+            if only and name not in only:
+                continue
+            record = dict(stage=name, size=n, **measure(func, count))
+            logging.info(json.dumps(record))
+            results.append(record)
+    return dict(version=git_version(), python=platform.python_version(),
+                machine=platform.machine(), time=time.strftime('%Y-%m-%dT%H:%M:%S'), results=results)
+
+
+def compare(new, old):
+    """Speedup of `new` over `old` per stage and size."""
+    base = {(r['stage'], r['size']): r for r in old['results']}
+    rows = list()
+    for r in new['results']:
+        o = base.get((r['stage'], r['size']))
+        if o is not None:
+            rows.append(dict(stage=r['stage'], size=r['size'], speedup=r['msg_per_s'] / o['msg_per_s'],
+                             peak_ratio=r['peak_mb'] / o['peak_mb'] if o['peak_mb'] else None))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decoder benchmark on synthetic frames')
+    parser.add_argument('--sizes', nargs='+', type=int, default=sizes)
+    parser.add_argument('--stages', nargs='+', default=None)
+    parser.add_argument('--out', default=None, help='JSON result file')
+    parser.add_argument('--compare', default=None, help='earlier JSON result file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(message)s')
+    result = run(args.sizes, args.stages)
+    out = args.out or f"{out_path}/bench_{result['version'] or 'local'}.json"
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(result, f, indent=1)
+    logging.info(f"saved {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            for row in compare(result, json.load(f)):
+                logging.info(json.dumps(row))
+
+
+if __name__ == '__main__':
+    main()
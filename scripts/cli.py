@@ -0,0 +1,293 @@
+import os
+import re
+import glob
+import logging
+import argparse
+import importlib
+import configparser
+
+# Settings are read from the module constants of each stage, overridden by
+# the config file (one INI section per subcommand, [DEFAULT] for all of
+# them) and then by the command line.
+config_path = os.environ.get("ADSB_CONFIG", "adsb.ini")
+
+# peak memory per raw row in decode_frame(), and per byte of input CSV in
+# the QC, EDR2 and jerk stages, measured on synthetic days
+decode_row_bytes = 3000
+file_factor = dict(qc=8, edr=20, jerk=6)
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    states = configparser.ConfigParser.BOOLEAN_STATES
+    if value.lower() not in states:
+        raise argparse.ArgumentTypeError(f"not a boolean: {value}")
+    return states[value.lower()]
+
+
+def _years(value):
+    return [int(y) for y in re.split(r"[,\s]+", value.strip()) if y]
+
+
+# subcommand -> option -> (module, attribute, type, help)
+OPTIONS = {
+    'decode': {
+        'input': ('scripts.decode', 'file_path', str, 'raw DF directory'),
+        'output': ('scripts.decode', 'out_path', str, 'merged product directory'),
+        'out_format': ('scripts.decode', 'out_format', str, 'csv or parquet'),
+        'time_resolution': ('scripts.decode', 'time_resolution', str, 'time bucket, e.g. 0.5S'),
+        'batch_size': ('scripts.decode', 'batch_size', int, 'raw rows per batch, 0 for whole files'),
+        'position_mode': ('scripts.decode', 'position_mode', str, 'pair or local'),
+        'meteo': ('scripts.decode', 'meteo_product', _boolean, 'write the BDS 4,4/4,5 meteo product'),
+        'meteo_path': ('scripts.decode', 'meteo_path', str, 'meteo product directory'),
+        'workers': ('scripts.mpd', 'num_core', int, 'worker processes'),
+        'log_path': ('scripts.mpd', 'log_path', str, 'log and manifest directory'),
+    },
+    'qc': {
+        'input': ('scripts.qc', 'csv_path', str, 'merged product directory'),
+        'output': ('scripts.qc', 'df_out_path', str, 'QC product directory'),
+        'in_format': ('scripts.qc', 'in_format', str, 'csv or parquet'),
+        'out_format': ('scripts.qc', 'out_format', str, 'csv or parquet'),
+        'workers': ('scripts.mpq', 'num_core', int, 'worker processes'),
+        'log_path': ('scripts.mpq', 'log_path', str, 'log and manifest directory'),
+    },
+    'edr': {
+        'input': ('scripts.edr', 'csv_path', str, 'QC product directory'),
+        'output': ('scripts.edr', 'edr2_path', str, 'EDR2 product directory'),
+        'in_format': ('scripts.edr', 'in_format', str, 'csv or parquet'),
+        'out_format': ('scripts.edr', 'out_format', str, 'csv or parquet'),
+        'workers': ('scripts.mpedr', 'num_core', int, 'worker processes'),
+        'log_path': ('scripts.mpedr', 'log_path', str, 'log and manifest directory'),
+    },
+    'jerk': {
+        'input': ('scripts.edr', 'csv_path', str, 'QC product directory'),
+        'output': ('scripts.edr', 'jerk_path', str, 'jerk product directory'),
+        'in_format': ('scripts.edr', 'in_format', str, 'csv or parquet'),
+        'out_format': ('scripts.edr', 'out_format', str, 'csv or parquet'),
+        'workers': ('scripts.mpedr', 'num_core', int, 'worker processes'),
+        'log_path': ('scripts.mpedr', 'log_path', str, 'log and manifest directory'),
+    },
+    'compare': {
+        'year': ('scripts.triple_compare', 'target_year', int, 'year to compare'),
+        'input': ('scripts.triple_compare', 'ADSB_path', str, 'QC product directory'),
+        'in_format': ('scripts.triple_compare', 'ADSB_format', str, 'csv or parquet, as written by qc'),
+        'amdar': ('scripts.triple_compare', 'AMDAR_path', str, 'MADIS AMDAR directory'),
+        'era5': ('scripts.triple_compare', 'ERA5_path', str, 'ERA5 directory'),
+        'output': ('scripts.triple_compare', 'results_path', str, 'results directory'),
+        'time_resolution': ('scripts.triple_compare', 'time_resolution', str, 'thinning time step'),
+        'lat_resolution': ('scripts.triple_compare', 'lat_resolution', float, 'thinning latitude step'),
+        'lon_resolution': ('scripts.triple_compare', 'lon_resolution', float, 'thinning longitude step'),
+        'lev_resolution': ('scripts.triple_compare', 'lev_resolution', int, 'thinning pressure step (hPa)'),
+        'method': ('scripts.triple_compare', 'thinning_method', str, 'mean or closest'),
+        'log_path': ('scripts.triple_compare', 'log_path', str, 'log directory'),
+    },
+    'draw': {
+        'years': ('scripts.draw', 'target_years', _years, 'years to draw, e.g. 2020,2021'),
+        'output': ('scripts.draw', 'results_path', str, 'results directory'),
+        'time_resolution': ('scripts.draw', 'time_resolution', str, 'thinning time step of the results'),
+        'method': ('scripts.draw', 'thinning_method', str, 'mean or closest'),
+        'density': ('scripts.draw', 'density', _boolean, 'density raster instead of scatter'),
+    },
+}
+
+# options of the pool commands that are not module constants
+POOL_OPTIONS = {
+    'memory_budget': (float, 'GiB for all workers; sets the decode batch size or caps the workers'),
+    'start': (str, 'first date, YYYY-MM-DD'),
+    'end': (str, 'last date, YYYY-MM-DD'),
+}
+
+
+def read_config(path):
+    config = configparser.ConfigParser()
+    if path and os.path.exists(path):
+        config.read(path)
+        logging.info(f"config: {path}")
+    return config
+
+
+def section(config, command):
+    return config[command] if config.has_section(command) else config[config.default_section]
+
+
+def settings(command, args, config):
+    """Module constants to set for `command`: config file values overridden
+    by command line values.
+    Returns:
+        dict: {module: {attribute: value}}
+    """
+    values = section(config, command)
+    out = dict()
+    for option, (module, attr, kind, _) in OPTIONS[command].items():
+        value = getattr(args, option, None)
+        if value is None and option in values:
+            value = kind(values[option])
+        if value is not None:
+            out.setdefault(module, dict())[attr] = value
+    return out
+
+
+def pool_option(option, args, config, command):
+    value = getattr(args, option, None)
+    values = section(config, command)
+    if value is None and option in values:
+        value = POOL_OPTIONS[option][0](values[option])
+    return value
+
+
+def apply(values):
+    for module, attrs in values.items():
+        mod = importlib.import_module(module)
+        for attr, value in attrs.items():
+            setattr(mod, attr, value)
+
+
+def init_worker(values, initializer, q):
+    """Pool initializer: the settings of the parent, also under spawn, then
+    the logging set-up of the mp script."""
+    apply(values)
+    initializer(q)
+
+
+def parse_date(text):
+    """First YYYYMMDD or YYYY-MM-DD date in `text` as YYYY-MM-DD, None if there is none."""
+    match = re.search(r"(\d{4})-?(\d{2})-?(\d{2})", text)
+    return None if match is None else "-".join(match.groups())
+
+
+def in_range(file_list, root, start=None, end=None):
+    if start is None and end is None:
+        return file_list
+    start = None if start is None else parse_date(start)
+    end = None if end is None else parse_date(end)
+    out = list()
+    for f in file_list:
+        # the date of a file is in its path below the product root
+        d = parse_date(os.path.relpath(f, root))
+        if d is not None and (start is None or d >= start) and (end is None or d <= end):
+            out.append(f)
+    logging.info(f"{len(out)} of {len(file_list)} files between {start} and {end}")
+    return out
+
+
+def budget_workers(workers, file_list, budget, factor):
+    """Workers that fit in the memory budget with the largest input file."""
+    if not budget or not file_list:
+        return workers
+    largest = max(os.path.getsize(f) for f in file_list)
+    fit = max(1, int(budget * 2 ** 30 // (factor * largest)))
+    if fit < workers:
+        logging.info(f"memory budget {budget} GiB: {fit} workers instead of {workers}")
+    return min(workers, fit)
+
+
+def run_decode(args, config, values):
+    from scripts import decode, mpd
+    from utils.scheduler import run_pool
+    from utils.declination import tables
+
+    file_list = in_range(glob.glob(f"{decode.file_path}/**/*.txt"), decode.file_path,
+                         pool_option('start', args, config, 'decode'), pool_option('end', args, config, 'decode'))
+    budget = pool_option('memory_budget', args, config, 'decode')
+    if budget and 'batch_size' not in values.get('scripts.decode', dict()):
+        decode.batch_size = max(1, int(budget * 2 ** 30 / mpd.num_core / decode_row_bytes))
+        values.setdefault('scripts.decode', dict())['batch_size'] = decode.batch_size
+        logging.info(f"memory budget {budget} GiB: batch size {decode.batch_size}")
+
+    q_listener, q = mpd.logger_init()
+    logging.info(f"Decode start, {len(file_list)} files")
+    n_fail = run_pool(decode.decode, file_list, mpd.num_core, f"{mpd.log_path}/decode_manifest.json",
+                      init_worker, [values, mpd.worker_init, q], shared=tables())
+    q_listener.stop()
+    return n_fail
+
+
+def run_qc(args, config, values):
+    from scripts import qc, mpq
+    from utils.scheduler import run_pool
+    from utils.storage import list_products
+
+    file_list = in_range(list_products(qc.csv_path, "*", qc.in_format, ext="txt"), qc.csv_path,
+                         pool_option('start', args, config, 'qc'), pool_option('end', args, config, 'qc'))
+    workers = budget_workers(mpq.num_core, file_list, pool_option('memory_budget', args, config, 'qc'),
+                             file_factor['qc'])
+
+    q_listener, q = mpq.logger_init()
+    logging.info(f'Start QC for calculated wind, {len(file_list)} files')
+    n_fail = run_pool(qc.qc, file_list, workers, f"{mpq.log_path}/{mpq.target_year}_QC_manifest.json",
+                      init_worker, [values, mpq.worker_init, q])
+    q_listener.stop()
+    return n_fail
+
+
+def run_edr(args, config, values, command='edr'):
+    from scripts import edr, mpedr
+    from utils.scheduler import run_pool
+    from utils.storage import list_products
+
+    mpedr.type_edr = "EDR2" if command == 'edr' else "jerk_EDR"
+    file_list = in_range(list_products(edr.csv_path, "*", edr.in_format), edr.csv_path,
+                         pool_option('start', args, config, command), pool_option('end', args, config, command))
+    workers = budget_workers(mpedr.num_core, file_list, pool_option('memory_budget', args, config, command),
+                             file_factor[command])
+
+    q_listener, q = mpedr.logger_init()
+    logging.info(f'Start calculating {mpedr.type_edr}, {len(file_list)} files')
+    func = edr.edr2 if command == 'edr' else edr.jerk
+    n_fail = run_pool(func, file_list, workers, f"{mpedr.log_path}/{mpedr.type_edr}_manifest.json",
+                      init_worker, [values, mpedr.worker_init, q])
+    q_listener.stop()
+    return n_fail
+
+
+def run_jerk(args, config, values):
+    return run_edr(args, config, values, 'jerk')
+
+
+def run_compare(args, config, values):
+    from scripts import triple_compare
+
+    triple_compare.main()
+    return 0
+
+
+def run_draw(args, config, values):
+    from scripts import draw
+
+    draw.draw()
+    return 0
+
+
+COMMANDS = dict(decode=run_decode, qc=run_qc, edr=run_edr, jerk=run_jerk, compare=run_compare, draw=run_draw)
+POOL_COMMANDS = ('decode', 'qc', 'edr', 'jerk')
+
+
+def parser():
+    p = argparse.ArgumentParser(description='ADS-B wind and turbulence processing')
+    p.add_argument('--config', default=config_path, help=f'INI file, default {config_path}')
+    sub = p.add_subparsers(dest='command', required=True)
+    for command, options in OPTIONS.items():
+        sp = sub.add_parser(command)
+        for option, (module, attr, kind, text) in options.items():
+            sp.add_argument(f"--{option.replace('_', '-')}", dest=option, type=kind, default=None,
+                            help=f"{text} ({module}.{attr})")
+        if command in POOL_COMMANDS:
+            for option, (kind, text) in POOL_OPTIONS.items():
+                sp.add_argument(f"--{option.replace('_', '-')}", dest=option, type=kind, default=None, help=text)
+    return p
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if args.command != 'compare':
+        # compare logs to its own file
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+    config = read_config(args.config)
+    values = settings(args.command, args, config)
+    apply(values)
+    return COMMANDS[args.command](args, config, values)
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if main() else 0)
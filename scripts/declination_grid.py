@@ -0,0 +1,55 @@
+import argparse
+import logging
+
+import numpy as np
+
+from utils.declination import read_cof, wmm_declination, grid_path
+
+step = 1.          # degrees between grid points
+years = 4          # yearly grids past the epoch of the last model
+scale = 0.01       # degrees per stored unit, declination is kept as int16
+height = 10.       # km, typical cruise level of the Comm-B data
+
+
+def build(cofs, step=step, years=years, height=height, bbox=(-180, -90, 180, 90)):
+    """Declination grids from WMM coefficient files of successive models.
+    Each model gives the yearly grids from its epoch up to the next model's
+    epoch; the last one `years` years past its epoch.
+    Returns:
+        dict: lat, lon, year axes and dec (year, lat, lon) in units of `scale` degrees
+    """
+    models = sorted(read_cof(cof) for cof in ([cofs] if isinstance(cofs, str) else cofs))
+    lon0, lat0, lon1, lat1 = bbox
+    lat = np.arange(lat0, lat1 + step / 2, step)
+    lon = np.arange(lon0, lon1 + step / 2, step)
+    lon2, lat2 = np.meshgrid(lon, lat)
+    year, dec = list(), list()
+    for k, (epoch, coef) in enumerate(models):
+        until = models[k + 1][0] if k + 1 < len(models) else epoch + years + 1
+        for y in np.arange(epoch, until, dtype=np.float64):
+            year.append(y)
+            dec.append(wmm_declination(lat2, lon2, y, epoch, coef, height))
+    return dict(lat=lat, lon=lon, year=np.array(year), scale=np.float32(scale),
+                dec=np.round(np.stack(dec) / scale).astype(np.int16))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the magnetic declination grid from WMM coefficients')
+    parser.add_argument('cof', nargs='+', help='WMM coefficient files, e.g. WMM_2020.COF WMM_2025.COF')
+    parser.add_argument('--out', default=grid_path)
+    parser.add_argument('--step', type=float, default=step, help='grid spacing in degrees')
+    parser.add_argument('--years', type=int, default=years, help='number of years after the last epoch')
+    parser.add_argument('--height', type=float, default=height, help='height above the ellipsoid in km')
+    parser.add_argument('--bbox', type=float, nargs=4, default=(-180, -90, 180, 90),
+                        metavar=('LON0', 'LAT0', 'LON1', 'LAT1'))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    grid = build(args.cof, args.step, args.years, args.height, args.bbox)
+    np.savez_compressed(args.out, **grid)
+    logging.info(f"saved {args.out}: {grid['dec'].shape} (year, lat, lon), "
+                 f"years {grid['year'][0]:.1f}-{grid['year'][-1]:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,133 +1,615 @@
+import os
+import numpy as np
 import pandas as pd
 import logging
 
-from utils.common import unixtime2utc, df, typecode, icao
-from utils.position import oe_flag, altitude05, util_position, altcode
-from utils.BDS50 import is50, roll50, trk50, gs50, tas50
-from utils.BDS60 import is60, hdg60, vr60ins, mach60, ias60
 from utils.wind import calculate
+from utils.air import distance, bearing, mach2tas, tas2sat
+from utils.constants import kts, ft, nm
+from utils.tracker import KnownAircraft, LastPositions
+from utils.storage import write_product, append_partitions
+from utils.scheduler import atomic_write
+from utils.schema import enforce, frame_words
+from utils.metrics import stage, file_metrics
+from utils import schema, vector
 
 file_path = "/data3/storage/ADSB/raw/DF"
 out_path = "/data3/storage/ADSB/merged"
 time_resolution = "0.5S"
+# DF17 parity: "off", "check" (drop failing frames) or "correct" (also fix single bit errors)
+parity = "correct"
+# Comm-B replies are only decoded for addresses confirmed by DF11/DF17 parity
+known_filter = True
+# seconds an address stays known, None keeps every address seen in the file
+known_ttl = None
+# settle replies passing both the BDS 5,0 and 6,0 rules against the ADS-B track,
+# instead of dropping them
+resolve_ambiguous = True
+# seconds between an ambiguous reply and the ADS-B track used to resolve it
+track_tolerance = 30
+# ground vector for the wind triangle: "bds50" (BDS 5,0 only) or "tc19" (ADS-B
+# airborne velocity where available, BDS 5,0 elsewhere, so BDS 5,0 is not required)
+ground_source = "bds50"
+# "pair": positions from even/odd pairs within a time bucket and the messages after
+# them; "local": every airborne message decoded on its own against a reference
+position_mode = "pair"
+# (lat, lon) of the receiver, the local reference for aircraft without a known position
+receiver = None
+# local decoding: seconds between the even and odd frame of a pair, seconds a position
+# stays usable as reference, and NM a decoded position may lie from its reference
+pair_window = 10
+ref_age = 60
+max_range = 180
+# also write the BDS 4,4 (MRAR) and 4,5 (MHR) replies, which carry wind, temperature
+# and turbulence directly, as a meteo product under meteo_path
+meteo_product = False
+meteo_path = "/data3/storage/ADSB/meteo"
+# raw rows per batch for out-of-core decoding, None reads the whole file at once
+batch_size = None
+# "csv" or "parquet" (date/hour partitions under out_path)
+out_format = "csv"
 
-# Read file
-def decode(f):
-    logging.info(f"file_path: {file_path}")
-    logging.info(f"out_path: {out_path}")
-    logging.info(f"time_resolution: {time_resolution}")
 
-    filename = f.split('/')[-1]
-    date = f.split('/')[-2]
-    logging.info(f"{date}, {filename}")
+def _timestamp(target):
+    target.columns = ['time', 'code']
+
+    # Timestamp, unix time in milliseconds
+    target['time'] = pd.to_datetime(target['time'], unit='ms')
+    target['time'] = target['time'].dt.round(time_resolution)
+    return target
+
+
+def raw_frames(target):
+    """Raw rows (time, hex code) as the RAW table: 112-bit frames as two
+    uint64 words (see schema.frame_words) and 56-bit frames, kept for the
+    DF11 address check, in the low word with `short` set. Rows of any other
+    length are dropped.
+    """
+    code = target['code'].astype(str)
+    n = code.str.len().to_numpy()
+    long, short = n == 28, n == 14
+    hi = np.zeros(len(code), dtype=np.uint64)
+    lo = np.zeros(len(code), dtype=np.uint64)
+    hi[long], lo[long] = frame_words(code.to_numpy()[long])
+    lo[short] = vector.short_words(code.to_numpy()[short])
+    keep = long | short
+    return pd.DataFrame({'time': target['time'].to_numpy()[keep], 'hi': hi[keep], 'lo': lo[keep],
+                         'short': short[keep]})
+
+
+def _words(frames):
+    return frames['hi'].to_numpy(), frames['lo'].to_numpy()
+
+
+def read_raw(f):
+    with stage('read') as s:
+        target = raw_frames(_timestamp(pd.read_csv(f, sep="\s+", header=None, dtype={1: str})))
+        s.rows_out = len(target)
+    return target
+
+
+def read_raw_batches(f, batch_size):
+    """Raw rows in batches of about `batch_size`, cut at time bucket boundaries.
+    Positions and Comm-B replies are paired within one time bucket, so the
+    rows of the last bucket in a batch are held back and go out with the
+    next batch. Only those rows are carried over; they are all the state
+    there is between batches. This relies on time not going back across a
+    batch boundary, which scan_raw() checks.
+    """
+    carry = None
+    for batch in pd.read_csv(f, sep="\s+", header=None, dtype={1: str}, chunksize=batch_size):
+        with stage('read', len(batch)) as s:
+            batch = raw_frames(_timestamp(batch))
+            if carry is not None:
+                batch = pd.concat([carry, batch], ignore_index=True)
+            last = batch['time'].max()
+            carry = batch[batch['time'] == last]
+            batch = batch[batch['time'] != last]
+            s.rows_out = len(batch)
+        if len(batch) > 0:
+            yield batch
+    if carry is not None and len(carry) > 0:
+        yield carry
+
+
+def check_parity(target_adsb, fix=True):
+    """Drop DF17 frames that fail the CRC. With `fix`, frames with a single
+    bit error outside the DF field are repaired first (syndrome lookup).
+    """
+    hi, lo = _words(target_adsb)
+    if fix:
+        hi, lo, status = vector.correct(hi, lo)
+        target_adsb = target_adsb.assign(hi=hi, lo=lo)
+    else:
+        status = np.where(vector.crc(hi, lo) == 0, 0, 2)
+    return target_adsb[status < 2]
+
+
+def track_reference(target_pos):
+    """Ground speed (kts) and track of each aircraft between consecutive
+    ADS-B positions, at the time of the later one."""
+    pos = target_pos.sort_values(['acid', 'time'])
+    prev = pos.groupby('acid', observed=True)[['time', 'lat', 'lon']].shift()
+    dt = (pos['time'] - prev['time']).dt.total_seconds()
+    dist = distance(prev['lat'], prev['lon'], pos['lat'], pos['lon'])
+    ref = pd.DataFrame({'time': pos['time'], 'acid': pos['acid'], 'alt_ref': pos['alt'],
+                        'gs_ref': dist / dt / kts,
+                        'trk_ref': bearing(prev['lat'], prev['lon'], pos['lat'], pos['lon'])})
+    ref = ref[(dt > 0) & ref['gs_ref'].notna()]
+    return ref.sort_values('time')
 
-    try:
-        target = pd.read_csv(f, sep="\s+", header=None)
-        target.columns = ['time', 'code']
-        logging.info(f"Read done")
 
-        # Timestamp
-        target['time'] = target['time'].apply(lambda x: unixtime2utc(x))
-        target['time'] = pd.to_datetime(target['time'])
-        target['time'] = target['time'].dt.round(time_resolution)
-        logging.info(f"Raw data: len {len(target)}")
-        logging.info(f"Add timestamp done")
+def resolve_with_track(ambiguous, target_pos):
+    """BDS label of ambiguous replies from the nearest ADS-B ground vector
+    of the same aircraft, within track_tolerance seconds."""
+    order = ambiguous.reset_index(drop=True).reset_index().sort_values('time')
+    # merge_asof does not join on uint32 keys in older pandas
+    ref = pd.merge_asof(order[['index', 'time', 'acid', 'hi', 'lo']].astype({'acid': np.int64}),
+                        track_reference(target_pos).astype({'acid': np.int64}), on='time', by='acid',
+                        direction='nearest', tolerance=pd.Timedelta(seconds=track_tolerance))
+    ref = ref.sort_values('index')
+    hi, lo = _words(ref)
+    alt = vector.altcode(hi, lo)
+    alt = np.where(np.isnan(alt), ref['alt_ref'].to_numpy(dtype=np.float64), alt)
+    return vector.resolve_bds(hi, lo, alt, ref['gs_ref'].to_numpy(dtype=np.float64),
+                              ref['trk_ref'].to_numpy(dtype=np.float64))
+
+
+def pair_positions(target_adsb):
+    """Positions of every time bucket and aircraft, as util_position() gives
+    them for one chunk: each even/odd pair with altitudes within 50 ft is
+    decoded globally and the messages after it locally against it. All
+    decoding is vectorized; only the walk deciding which message goes with
+    which pair is a loop.
+    """
+    # chunks in the order decode() visited them: time buckets as they come,
+    # aircraft in the order they appear within the bucket
+    time_code = pd.factorize(target_adsb['time'])[0]
+    chunk = pd.factorize((time_code.astype(np.int64) << 24) | target_adsb['acid'].to_numpy(dtype=np.int64))[0]
+    first = np.full(len(chunk), len(chunk))
+    np.minimum.at(first, chunk, np.arange(len(chunk)))
+    order = np.lexsort((np.arange(len(chunk)), first[chunk], time_code))
+    adsb = target_adsb.iloc[order]
+    chunk = chunk[order]
+
+    hi, lo = _words(adsb)
+    oe = adsb['oe'].to_numpy(dtype=np.float64)
+    alt = adsb['alt'].to_numpy(dtype=np.float64)
+    times = adsb['time'].to_numpy().astype(np.int64)
+
+    # even/odd pairs (k, k + 1) within one chunk
+    pair = np.zeros(len(adsb), dtype=bool)
+    pair[:-1] = (chunk[1:] == chunk[:-1]) & (oe[1:] != oe[:-1])
+    k = np.nonzero(pair)[0]
+    lat_pair = np.full(len(adsb), np.nan)
+    lon_pair = np.full(len(adsb), np.nan)
+    lat_pair[k], lon_pair[k] = vector.airborne_position(hi[k], lo[k], hi[k + 1], lo[k + 1], times[k], times[k + 1])
+    alt_pair = (alt + np.roll(alt, -1)) / 2
+
+    # global rows (pair decoded) and local rows with the pair they refer to
+    glob, local, ref = list(), list(), list()
+    has_pair = np.zeros(chunk.max() + 1 if len(chunk) else 0, dtype=bool)
+    has_pair[chunk[k]] = True
+    current, latlon, stuck = -1, None, False
+    for i, (c, p) in enumerate(zip(chunk.tolist(), pair.tolist())):
+        if c != current:
+            current, latlon, stuck = c, None, False
+        if not has_pair[c]:
+            continue
+        if p and not stuck:
+            if np.isnan(alt[i]) or np.isnan(alt[i + 1]):
+                # util_position() matches no further pair of the chunk
+                stuck = True
+            elif abs(alt[i] - alt[i + 1]) < 50:
+                latlon = None if np.isnan(lat_pair[i]) else i
+                if latlon is not None:
+                    glob.append(i)
+        elif latlon is not None:
+            local.append(i)
+            ref.append(latlon)
+
+    glob, local, ref = np.array(glob, dtype=np.intp), np.array(local, dtype=np.intp), np.array(ref, dtype=np.intp)
+    lat_local, lon_local = vector.airborne_position_with_ref(hi[local], lo[local], lat_pair[ref], lon_pair[ref])
+    rows = np.concatenate([glob, local])
+    target_pos = pd.DataFrame({
+        'lat': np.concatenate([lat_pair[glob], lat_local]),
+        'lon': np.concatenate([lon_pair[glob], lon_local]),
+        'alt': np.concatenate([alt_pair[glob], alt[local]]),
+        'time': adsb['time'].to_numpy()[rows],
+        'acid': adsb['acid'].to_numpy()[rows],
+    }).iloc[np.argsort(rows, kind='stable')]
+    return enforce(target_pos.reset_index(drop=True), schema.POSITION)
+
+
+def local_positions(target_adsb, last=None):
+    """Position of every airborne message decoded on its own (local CPR).
+    Consecutive even/odd messages of one aircraft within pair_window seconds
+    are decoded globally; every message is then decoded against the nearest
+    of these, or of the positions in `last` (LastPositions from earlier
+    batches), within ref_age seconds, and against the receiver otherwise.
+    Positions more than max_range NM from their reference are dropped; the
+    receiver reference assumes the aircraft heard are within that range.
+    """
+    adsb = target_adsb.sort_values(['acid', 'time'], kind='stable').reset_index(drop=True)
+    hi, lo = _words(adsb)
+    acid = adsb['acid'].to_numpy()
+    oe = adsb['oe'].to_numpy()
+    alt = adsb['alt'].to_numpy(dtype=np.float64)
+    dt = adsb['time'].diff().dt.total_seconds().to_numpy()
+
+    # global positions of even/odd pairs; the row order stands in for the
+    # arrival time, which the time buckets no longer resolve
+    i = np.nonzero(np.r_[False, (acid[1:] == acid[:-1]) & (oe[1:] != oe[:-1])]
+                   & (dt <= pair_window) & (np.abs(alt - np.roll(alt, 1)) < 50))[0]
+    lat, lon = vector.airborne_position(hi[i - 1], lo[i - 1], hi[i], lo[i], i - 1, i)
+    seeds = pd.DataFrame({'time': adsb['time'].to_numpy()[i], 'acid': acid[i], 'lat_ref': lat, 'lon_ref': lon})
+    seeds = seeds[seeds['lat_ref'].notna()]
+    if last is not None:
+        seeds = pd.concat([last.last.rename(columns={'lat': 'lat_ref', 'lon': 'lon_ref'}), seeds], ignore_index=True)
+    seeds = seeds.astype({'acid': np.int64}).sort_values('time', kind='stable')
+
+    order = adsb[['time', 'acid']].astype({'acid': np.int64}).reset_index().sort_values('time', kind='stable')
+    ref = pd.merge_asof(order, seeds, on='time', by='acid', direction='nearest',
+                        tolerance=pd.Timedelta(seconds=ref_age)).sort_values('index')
+    lat_ref = ref['lat_ref'].to_numpy(dtype=np.float64)
+    lon_ref = ref['lon_ref'].to_numpy(dtype=np.float64)
+    if receiver is not None:
+        no_ref = np.isnan(lat_ref)
+        lat_ref = np.where(no_ref, receiver[0], lat_ref)
+        lon_ref = np.where(no_ref, receiver[1], lon_ref)
+
+    lat, lon = vector.airborne_position_with_ref(hi, lo, lat_ref, lon_ref)
+    with np.errstate(invalid='ignore'):
+        ok = (distance(lat_ref, lon_ref, lat, lon) <= max_range * nm) & ~np.isnan(alt)
+    target_pos = pd.DataFrame({'time': adsb['time'].to_numpy()[ok], 'acid': acid[ok],
+                               'lat': lat[ok], 'lon': lon[ok], 'alt': alt[ok]})
+    target_pos = enforce(target_pos, schema.POSITION)
+    if last is not None:
+        last.update(target_pos)
+    return target_pos
+
+
+def meteo_frame(target_met, target_pos):
+    """BDS 4,4 and 4,5 replies, one row each, at the nearest ADS-B position
+    of the aircraft within track_tolerance seconds. Fields one of the two
+    does not carry are NaN; temp, pres and turb come from either."""
+    hi, lo = _words(target_met)
+    is44 = target_met['bds'].to_numpy() == vector.BDS_44
+    is45 = ~is44
+    wspd, wdir = vector.wind44(hi, lo)
+    met = pd.DataFrame({
+        'time': target_met['time'].to_numpy(),
+        'acid': target_met['acid'].to_numpy().astype(np.int64),
+        'bds': target_met['bds'].to_numpy(),
+        'alt': vector.altcode(hi, lo),
+        'wspd': np.where(is44, wspd, np.nan),
+        'wdir': np.where(is44, wdir, np.nan),
+        'temp': np.where(is44, vector.temp44(hi, lo), vector.temp45(hi, lo)),
+        'pres': np.where(is44, vector.p44(hi, lo), vector.p45(hi, lo)),
+        'hum': np.where(is44, vector.hum44(hi, lo), np.nan),
+        'turb': np.where(is44, vector.turb44(hi, lo), vector.turb45(hi, lo)),
+        'ws': np.where(is45, vector.ws45(hi, lo), np.nan),
+        'mb': np.where(is45, vector.mb45(hi, lo), np.nan),
+        'ic': np.where(is45, vector.ic45(hi, lo), np.nan),
+        'wv': np.where(is45, vector.wv45(hi, lo), np.nan),
+        'rh': np.where(is45, vector.rh45(hi, lo), np.nan),
+    })
+    pos = target_pos[['time', 'acid', 'lat', 'lon', 'alt']].rename(columns={'alt': 'alt_pos'})
+    met = pd.merge_asof(met.sort_values('time', kind='stable'),
+                        pos.astype({'acid': np.int64}).sort_values('time', kind='stable'), on='time', by='acid',
+                        direction='nearest', tolerance=pd.Timedelta(seconds=track_tolerance))
+    met['alt'] = met['alt'].fillna(met['alt_pos'])
+    met = met.dropna(subset=['lat', 'lon', 'alt'])
+    return enforce(met[list(schema.METEO)], schema.METEO)
+
+
+def airborne_velocity(target_vel):
+    """ADS-B ground speed and track (TC 19 subtypes 1 and 2), the last one
+    of each aircraft per time bucket."""
+    hi, lo = _words(target_vel)
+    vel = vector.velocity(hi, lo)
+    target_vel = pd.DataFrame({'time': target_vel['time'].to_numpy(), 'acid': target_vel['acid'].to_numpy(),
+                               'gs19': vel['gs'], 'trk19': vel['trk']}).dropna()
+    return target_vel.groupby(['time', 'acid'], as_index=False).last()
+
+
+def decode_frame(target, known=None, last=None, meteo=None):
+    """Decode one raw frame table into the merged product.
+    `known` (KnownAircraft) carries confirmed addresses and `last`
+    (LastPositions) the local CPR references from earlier batches of the
+    same file; new ones are started when they are None. When a `meteo` list
+    is given, the BDS 4,4/4,5 product of the frame is appended to it.
+    """
+    with stage('filter', len(target)) as s:
+        target = enforce(target, schema.RAW)
+
+        # DF11 all-call replies, only used to confirm addresses
+        short = target['short'].to_numpy()
+        df11_ok, df11_acid = vector.df11_icao(target['lo'].to_numpy()[short])
+        df11_time = target['time'].to_numpy()[short][df11_ok]
+        df11_acid = df11_acid[df11_ok]
 
         # Filtering length
-        target['length'] = target['code'].apply(lambda x: len(x))
-        target = target[target['length']==28]
-        logging.info(f"Length filtering done")
-
-        # Flags
-        target['df'] = target['code'].apply(lambda x: df(x))
-        target['tc'] = target['code'].apply(lambda x: typecode(x))
-        target['oe'] = target['code'].apply(lambda x: oe_flag(x))
-        target['is60'] = target['code'].apply(lambda x: is60(x) if (df(x)==21 or df(x)==20) else None)
-        target['is50'] = target['code'].apply(lambda x: is50(x) if (df(x)==21 or df(x)==20) else None)
-        target['acid'] = target['code'].apply(lambda x: icao(x))
-        logging.info(f"Flag done")
+        target = target[~short].drop(columns='short')
 
         # Filtering downlink format
+        target = target.assign(df=vector.df(*_words(target)))
         target = target[(target['df']==17) | (target['df']==20) | (target['df']==21)]
 
         # Split data based on DF
-        target_adsb = target[target['df']==17]
-        target_commb = target[(target['df']==20) | (target['df']==21)]
-        logging.info(f"First split done")
-
-        # Filtering typecode for ADSB data
-        target_adsb = target_adsb[(target_adsb['tc'] >= 9) & (target_adsb['tc'] <= 18)]
-
-        # Altitude for ADSB data
-        target_adsb['alt'] = target_adsb['code'].apply(lambda x: altitude05(x))
-        logging.info(f"ADSB altitude done")
-
-        # Get position information from ADSB data
-        unqt = target_adsb['time'].unique()
-        adsb_list = list()
-        for j, t in enumerate(unqt):
-            sample = target_adsb[target_adsb['time'] == t]
-            acidlist = sample['acid'].unique()
-            for acid in acidlist:
-                chunk_pos = pd.DataFrame()
-                sample_use = sample[sample['acid'] == acid]
-                sample_latlon_list, sample_alt_list = util_position(sample_use)
-                if len(sample_latlon_list) > 0:
-                    chunk_pos['lat'] = [x[0] for x in sample_latlon_list]
-                    chunk_pos['lon'] = [x[1] for x in sample_latlon_list]
-                    chunk_pos['alt'] = sample_alt_list
-                    chunk_pos['time'] = t
-                    chunk_pos['acid'] = acid
-                    adsb_list.append(chunk_pos)
-        target_pos = pd.concat(adsb_list)
-        logging.info(f"Position work done")
-
-        # Filtering for Comm-b data
-        target_commb = target_commb[~((target_commb['is50']==False)&(target_commb['is60']==False))]
-        target_commb = target_commb[~((target_commb['is50']==True)&(target_commb['is60']==True))]
-        target_50 = target_commb[target_commb['is50']==True]
-        target_60 = target_commb[target_commb['is60']==True]
-        logging.info(f"Total data: len {len(target)}")
-        logging.info(f"ADSB data: len {len(target_adsb)}")
-        logging.info(f"Comm-B data: len {len(target_commb)}")
-        logging.info(f"BDS50 data: len {len(target_50)}")
-        logging.info(f"BDS60 data: len {len(target_60)}")
+        target_adsb = target[target['df']==17].copy()
+        target_commb = target[(target['df']==20) | (target['df']==21)].copy()
+        del target
+        s.rows_out = len(target_adsb) + len(target_commb)
+
+    if parity != 'off':
+        with stage('parity', len(target_adsb)) as s:
+            target_adsb = check_parity(target_adsb, fix=parity == 'correct')
+            s.rows_out = len(target_adsb)
+
+    # Flags
+    with stage('flags', len(target_adsb) + len(target_commb)) as s:
+        hi, lo = _words(target_adsb)
+        target_adsb['tc'] = vector.typecode(hi, lo)
+        target_adsb['oe'] = vector.oe_flag(hi, lo)
+        target_adsb['acid'] = vector.icao(hi, lo)
+        target_adsb = enforce(target_adsb, schema.FLAGS)
+        target_commb['acid'] = vector.icao(*_words(target_commb))
+
+        # Comm-B replies from addresses never confirmed are corrupted frames
+        if known_filter:
+            known = KnownAircraft(known_ttl) if known is None else known
+            known.update(df11_acid, df11_time)
+            if parity != 'off':
+                known.update(target_adsb['acid'].to_numpy(), target_adsb['time'].to_numpy())
+            if len(known) == 0:
+                # with parity off only DF11 confirms addresses; a file without
+                # DF11 would otherwise lose every Comm-B reply
+                logging.warning(f"no confirmed addresses (parity={parity}), "
+                                f"keeping all {len(target_commb)} Comm-B replies unfiltered")
+            else:
+                keep = known.known(target_commb['acid'].to_numpy(), target_commb['time'].to_numpy())
+                if not keep.all():
+                    logging.info(f"known-aircraft filter dropped {(~keep).sum()} of {len(keep)} Comm-B replies")
+                target_commb = target_commb[keep]
+
+        hi, lo = _words(target_commb)
+        target_commb['bds'] = vector.infer_bds(hi, lo, meteo=meteo is not None)
+        target_commb['is50'] = np.isin(target_commb['bds'], (vector.BDS_50, vector.BDS_AMBIGUOUS))
+        target_commb['is60'] = np.isin(target_commb['bds'], (vector.BDS_60, vector.BDS_AMBIGUOUS))
+        target_commb = enforce(target_commb, schema.FLAGS)
+        s.rows_out = len(target_adsb) + len(target_commb)
+
+    # Airborne velocity for the ADS-B ground vector
+    if ground_source == 'tc19':
+        with stage('velocity', len(target_adsb)) as s:
+            target_vel = airborne_velocity(target_adsb[target_adsb['tc'] == 19])
+            s.rows_out = len(target_vel)
+
+    # Filtering typecode for ADSB data
+    target_adsb = target_adsb[(target_adsb['tc'] >= 9) & (target_adsb['tc'] <= 18)]
+
+    # Altitude for ADSB data
+    with stage('altitude', len(target_adsb)) as s:
+        target_adsb['alt'] = vector.altitude05(*_words(target_adsb))
+        s.rows_out = len(target_adsb)
+
+    # Get position information from ADSB data
+    with stage('position', len(target_adsb)) as s:
+        if position_mode == 'local':
+            target_pos = local_positions(target_adsb, LastPositions() if last is None else last)
+        else:
+            target_pos = pair_positions(target_adsb)
+        if len(target_pos) == 0:
+            # no positions, e.g. a small batch without position pairs
+            return enforce(pd.DataFrame(columns=list(schema.MERGED)), schema.MERGED)
+        s.rows_out = len(target_pos)
+
+    if meteo is not None:
+        with stage('meteo', len(target_commb)) as s:
+            target_met = meteo_frame(target_commb[target_commb['bds'] >= vector.BDS_44], target_pos)
+            meteo.append(target_met)
+            s.rows_out = len(target_met)
+
+    # Filtering for Comm-b data
+    with stage('commb', len(target_commb)) as s:
+        target_commb = target_commb[target_commb['bds'] != vector.BDS_NONE]
+        ambiguous = target_commb['bds'] == vector.BDS_AMBIGUOUS
+        if resolve_ambiguous and ambiguous.any():
+            target_commb = target_commb.copy()
+            target_commb.loc[ambiguous, 'bds'] = resolve_with_track(target_commb[ambiguous], target_pos)
+        target_50 = target_commb[target_commb['bds'] == vector.BDS_50].copy()
+        target_60 = target_commb[target_commb['bds'] == vector.BDS_60].copy()
 
         # Get airborne data from Comm-b data
-        target_50['alt'] = target_50['code'].apply(lambda x: altcode(x))
-        target_50['roll'] = target_50['code'].apply(lambda x: roll50(x))
-        target_50['tta'] = target_50['code'].apply(lambda x: trk50(x))
-        target_50['gspd'] = target_50['code'].apply(lambda x: gs50(x))
-        target_50['tas'] = target_50['code'].apply(lambda x: tas50(x))
-
-        target_60['alt'] = target_60['code'].apply(lambda x: altcode(x))
-        target_60['mhed'] = target_60['code'].apply(lambda x: hdg60(x))
-        target_60['vr'] = target_60['code'].apply(lambda x: vr60ins(x))
-        target_60['mach'] = target_60['code'].apply(lambda x: mach60(x))
-        target_60['ias'] = target_60['code'].apply(lambda x: ias60(x))
+        hi, lo = _words(target_50)
+        target_50['alt'] = vector.altcode(hi, lo)
+        target_50['roll'] = vector.roll50(hi, lo)
+        target_50['tta'] = vector.trk50(hi, lo)
+        target_50['gspd'] = vector.gs50(hi, lo)
+        target_50['tas'] = vector.tas50(hi, lo)
+
+        hi, lo = _words(target_60)
+        target_60['alt'] = vector.altcode(hi, lo)
+        target_60['mhed'] = vector.hdg60(hi, lo)
+        target_60['vr'] = vector.vr60ins(hi, lo)
+        target_60['mach'] = vector.mach60(hi, lo)
+        target_60['ias'] = vector.ias60(hi, lo)
 
         # Drop nan values
         target_50 = target_50.dropna(subset=['time', 'acid', 'tta', 'gspd', 'tas'])
-        target_50 = target_50[['time', 'acid', 'alt', 'tta', 'gspd', 'tas', 'roll']]
+        target_50 = enforce(target_50[['time', 'acid', 'alt', 'tta', 'gspd', 'tas', 'roll']], schema.BDS50)
         target_60 = target_60.dropna(subset=['time', 'acid', 'mhed'])
-        target_60 = target_60[['time', 'acid', 'alt', 'mhed', 'ias', 'mach', 'vr']]
+        target_60 = enforce(target_60[['time', 'acid', 'alt', 'mhed', 'ias', 'mach', 'vr']], schema.BDS60)
+        del target_commb
+        s.rows_out = len(target_50) + len(target_60)
 
-        # Merge BDS50 and 60
-        target_info = pd.merge(target_50, target_60, how='inner',  on=['time', 'acid'])
+    with stage('merge', len(target_pos) + len(target_50) + len(target_60)) as s:
+        final_cols = ['time', 'acid', 'lat', 'lon', 'alt', 'alt_x', 'alt_y', 'tta', 'gspd', 'tas', 'roll', 'mhed', 'ias', 'mach', 'vr']
+        if ground_source == 'tc19':
+            # BDS 6,0 with a ground vector from BDS 5,0 or TC 19
+            target_info = pd.merge(target_50, target_60, how='right', on=['time', 'acid'])
+            target_info = pd.merge(target_info, target_vel, how='left', on=['time', 'acid'])
+            target_info = target_info[target_info['gspd'].notna() | target_info['gs19'].notna()]
+            final_cols = final_cols + ['gs19', 'trk19']
+        else:
+            # Merge BDS50 and 60
+            target_info = pd.merge(target_50, target_60, how='inner',  on=['time', 'acid'])
 
         # Merge position and airborne data to produce merged data
         target_final = pd.merge(target_pos, target_info, how='inner', on=['time', 'acid'])
-        final_cols = ['time', 'acid', 'lat', 'lon', 'alt', 'alt_x', 'alt_y', 'tta', 'gspd', 'tas', 'roll', 'mhed', 'ias', 'mach', 'vr']
         target_final = target_final[final_cols]
-        logging.info(f"Final data: len {len(target_final)}")
+        s.rows_out = len(target_final)
 
-        # calculate wind
-        target_final = calculate(target_final)
+    # calculate wind
+    with stage('wind', len(target_final)) as s:
+        # static air temperature (C) from the BDS 5,0 TAS and BDS 6,0 Mach of the same pair
+        sat = tas2sat(target_final['tas'] * kts, target_final['mach']) - 273.15
+        target_final['sat'] = sat.where(np.isfinite(sat))
+        if ground_source == 'tc19':
+            # without BDS 5,0 the true airspeed comes from the BDS 6,0 Mach number
+            target_final['tas'] = target_final['tas'].fillna(
+                mach2tas(target_final['mach'], target_final['alt'] * ft) / kts)
+            target_final = calculate(target_final, ground='tc19')
+            target_final['gspd'] = target_final['gs19'].fillna(target_final['gspd'])
+            target_final['tta'] = target_final['trk19'].fillna(target_final['tta'])
+            target_final = target_final.drop(columns=['gs19', 'trk19'])
+        else:
+            target_final = calculate(target_final)
         target_final = target_final.dropna(subset=['time', 'lat', 'lon', 'alt', 'wspd', 'wdir', 'tas', 'mhed', 'tta', 'gspd'])
+        target_final = enforce(target_final, schema.MERGED)
+        s.rows_out = len(target_final)
+    return target_final
+
+
+def write_merged(target_final, f):
+    filename = f.split('/')[-1]
+    date = f.split('/')[-2]
+    with stage('write', len(target_final)):
+        return write_product(target_final, f"{out_path}/{date}_{filename}", out_format)
+
+
+def write_merged_batches(batches, f):
+    """Write merged batches as they come, so only one batch is in memory."""
+    filename = f.split('/')[-1]
+    date = f.split('/')[-2]
+    out_file = f"{out_path}/{date}_{filename}"
+
+    if out_format == 'parquet':
+        root, name = os.path.split(out_file)
+        committed = dict()
+        for target_final in batches:
+            with stage('write', len(target_final)):
+                committed = append_partitions(target_final, root, os.path.splitext(name)[0], 'parquet', committed)
+        return list(committed)
+
+    n = 0
+    with atomic_write(out_file) as tmp:
+        with open(tmp, 'w') as out:
+            for target_final in batches:
+                with stage('write', len(target_final)):
+                    # keep the running index of a single-pass file
+                    target_final.index = range(n, n + len(target_final))
+                    target_final.to_csv(out, header=n == 0)
+                    n += len(target_final)
+    return [out_file]
+
+
+def write_meteo(meteo, f):
+    filename = f.split('/')[-1]
+    date = f.split('/')[-2]
+    target_met = pd.concat(meteo, ignore_index=True) if meteo else \
+        enforce(pd.DataFrame(columns=list(schema.METEO)), schema.METEO)
+    with stage('write_meteo', len(target_met)):
+        return write_product(target_met, f"{meteo_path}/{date}_{filename}", out_format)
+
+
+def confirmed(target):
+    """Addresses confirmed by a RAW table and when: DF11 replies and, unless
+    parity is off, DF17 frames passing the parity check.
+    Returns:
+        (acid, time): uint32 addresses and datetime64 times
+    """
+    short = target['short'].to_numpy()
+    ok, acid = vector.df11_icao(target['lo'].to_numpy()[short])
+    acids, times = [acid[ok]], [target['time'].to_numpy()[short][ok]]
+    if parity != 'off':
+        frames = target[~short]
+        adsb = check_parity(frames[vector.df(*_words(frames)) == 17], fix=parity == 'correct')
+        acids.append(vector.icao(*_words(adsb)).astype(np.uint32))
+        times.append(adsb['time'].to_numpy())
+    return np.concatenate(acids), np.concatenate(times)
+
+
+def scan_raw(f, known=None):
+    """First pass over a raw file for batched decoding, one batch at a time.
+    Whole-file decoding knows every address confirmed anywhere in the file;
+    these are collected into `known` (KnownAircraft), so that a Comm-B reply
+    is not dropped only because its aircraft is confirmed in a later batch.
+    Returns:
+        bool: whether time never goes back across a batch boundary, which
+        read_raw_batches() relies on
+    """
+    ordered, latest = True, None
+    for batch in pd.read_csv(f, sep="\s+", header=None, dtype={1: str}, chunksize=batch_size):
+        with stage('scan', len(batch)) as s:
+            target = raw_frames(_timestamp(batch))
+            if len(target) > 0:
+                if latest is not None and target['time'].min() < latest:
+                    ordered = False
+                latest = target['time'].max() if latest is None else max(latest, target['time'].max())
+            if known is not None:
+                known.update(*confirmed(target))
+            s.rows_out = len(target)
+    return ordered
+
+
+def decode_batches(f, known=None, meteo=None):
+    """Merged product of `f` decoded batch by batch (read_raw_batches()).
+    `known` is the KnownAircraft of the whole file from scan_raw(). The
+    result is that of whole-file decoding, except in local position mode:
+    a message is only decoded against the reference positions of its own
+    and earlier batches, where whole-file decoding may also use one up to
+    ref_age seconds later.
+    """
+    known = KnownAircraft(known_ttl) if known is None else known
+    last = LastPositions()
+    for target in read_raw_batches(f, batch_size):
+        target_final = decode_frame(target, known, last, meteo)
+        if len(target_final) > 0:
+            yield target_final
+
+
+# Read file
+def decode(f):
+    logging.info(f"file_path: {file_path}")
+    logging.info(f"out_path: {out_path}")
+    logging.info(f"time_resolution: {time_resolution}")
+
+    filename = f.split('/')[-1]
+    date = f.split('/')[-2]
+    logging.info(f"{date}, {filename}")
 
-        target_final.to_csv(f"{out_path}/{date}_{filename}")
-        logging.info(f"Work done")
+    with file_metrics(f"decode {date}/{filename}"):
+        try:
+            meteo = list() if meteo_product else None
+            batched = bool(batch_size)
+            known = KnownAircraft(known_ttl) if batched and known_filter else None
+            if batched and not scan_raw(f, known):
+                logging.warning(f"time goes back across batches of {batch_size} rows, "
+                                f"decoding {filename} as a whole; memory is not bounded by the batch size")
+                batched = False
+            if batched:
+                out_files = write_merged_batches(decode_batches(f, known, meteo), f)
+            else:
+                target = read_raw(f)
+                target_final = decode_frame(target, meteo=meteo)
+                out_files = write_merged(target_final, f)
+            if meteo is not None:
+                out_files = out_files + write_meteo(meteo, f)
+            logging.info(f"Work done")
+            return out_files
 
-    except Exception as e:
-        logging.info(f"UNEXPECTED ERROR at {f}")
-        logging.critical(e, exc_info=True)
+        except Exception as e:
+            logging.info(f"UNEXPECTED ERROR at {f}")
+            logging.critical(e, exc_info=True)
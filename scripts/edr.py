@@ -4,17 +4,33 @@ import logging
 
 from utils.chunk import chunk_dataframe_by_15min, chunk_dataframe_by_minute, chunk_dataframe_by_acid
 from utils.util_edr import calculate_jerk, calculate_edr2
-
-def edr2(f):
-    csv_path = "/data3/storage/ADSB/QCdone"
-    edr_path = f"/data3/storage/ADSB/EDR/EDR2"
-
-    d = f.split('/')[-1][10:-4]
-    logging.info(f"Start Calculating File: {d}")
-
-    try:
-        df = pd.read_csv(f"{csv_path}/FAAL_ADSB_{d}.csv", index_col=0)
-        df['time'] = pd.to_datetime(df['time'])
+from utils.storage import write_product, read_product, product_name
+from utils.tiles import write_tiles
+from utils.schema import enforce
+from utils.metrics import stage, file_metrics
+from utils import schema
+
+csv_path = "/data3/storage/ADSB/QCdone"
+edr2_path = "/data3/storage/ADSB/EDR/EDR2"
+jerk_path = "/data3/storage/ADSB/EDR/jerk"
+# "csv" or "parquet"
+in_format = "csv"
+out_format = "csv"
+
+
+def read_qc(d):
+    with stage('qc_read') as s:
+        if in_format == 'csv':
+            df = read_product(f"{csv_path}/FAAL_ADSB_{d}.csv")
+        else:
+            df = read_product(csv_path, in_format, name=f"FAAL_ADSB_{d}")
+        df = enforce(df, schema.QC)
+        s.rows_out = len(df)
+    return df
+
+
+def edr2_frame(df):
+    with stage('edr2', len(df)) as s:
         df = df.dropna(subset=['wdir', 'wspd'], how='any')
 
         sub_df_list = chunk_dataframe_by_minute(df)
@@ -25,32 +41,19 @@ def edr2(f):
             for chunk in sub_acid_list:
                 if len(chunk) >= 60:
                     chunk_list.append(chunk)
-        logging.info(f"Available chunk: {len(chunk_list)}")
 
         out_csv_list = list()
         for data_i, data in enumerate(chunk_list):
             edr_data = calculate_edr2(data)
             out_csv_list.append(edr_data)
-        logging.info("calc done")
-
-        out_df = pd.concat(out_csv_list)
-        out_df.to_csv(f'{edr_path}/EDR2_{d}.csv')
-        logging.info("save done")
 
-    except Exception as e:
-        logging.critical(e, exc_info=True)
+        out_df = enforce(pd.concat(out_csv_list), schema.EDR2)
+        s.rows_out = len(out_df)
+    return out_df
 
 
-def jerk(f):
-    csv_path = "/data3/storage/ADSB/QCdone"
-    edr_path = f"/data3/storage/ADSB/EDR/jerk"
-
-    d = f.split('/')[-1][10:-4]
-    logging.info(f"Start Calculating File: {d}")
-
-    try:
-        df = pd.read_csv(f"{csv_path}/FAAL_ADSB_{d}.csv", index_col=0)
-        df['time'] = pd.to_datetime(df['time'])
+def jerk_frame(df):
+    with stage('jerk', len(df)) as s:
         df = df.dropna(subset=['vr'], how='any')
 
         sub_df_list = chunk_dataframe_by_15min(df)
@@ -61,8 +64,52 @@ def jerk(f):
             for data in sub_acid_list:
                 jerk_data = calculate_jerk(data)
                 jerk_list.append(jerk_data)
-        jerk_df = pd.concat(jerk_list)
-        jerk_df.to_csv(f'{edr_path}/jerk_{d}.csv')
+        jerk_df = enforce(pd.concat(jerk_list), schema.JERK)
+        s.rows_out = len(jerk_df)
+    return jerk_df
+
+
+def write_edr2(out_df, d):
+    with stage('edr2_write', len(out_df)):
+        out_files = write_product(out_df, f'{edr2_path}/EDR2_{d}.csv', out_format)
+    with stage('edr2_tiles', len(out_df)) as s:
+        s.rows_out = write_tiles(out_df, out_files, edr2_path, f"EDR2_{d}", out_format)
+    return out_files
+
+
+def write_jerk(jerk_df, d):
+    with stage('jerk_write', len(jerk_df)):
+        out_files = write_product(jerk_df, f'{jerk_path}/jerk_{d}.csv', out_format)
+    with stage('jerk_tiles', len(jerk_df)) as s:
+        s.rows_out = write_tiles(jerk_df, out_files, jerk_path, f"jerk_{d}", out_format)
+    return out_files
+
+
+def edr2(f):
+    d = product_name(f)[10:]
+    logging.info(f"Start Calculating File: {d}")
+
+    with file_metrics(f"EDR2 {d}"):
+        try:
+            df = read_qc(d)
+            out_df = edr2_frame(df)
+            out_files = write_edr2(out_df, d)
+            logging.info("save done")
+            return out_files
+
+        except Exception as e:
+            logging.critical(e, exc_info=True)
+
+
+def jerk(f):
+    d = product_name(f)[10:]
+    logging.info(f"Start Calculating File: {d}")
+
+    with file_metrics(f"jerk {d}"):
+        try:
+            df = read_qc(d)
+            jerk_df = jerk_frame(df)
+            return write_jerk(jerk_df, d)
 
-    except Exception as e:
-        logging.critical(e, exc_info=True)
+        except Exception as e:
+            logging.critical(e, exc_info=True)
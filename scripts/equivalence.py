@@ -0,0 +1,184 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.engines import engines, fields
+from utils.synth import generate
+from utils.schema import frame_words
+from utils import vector
+
+n_synthetic = 100000
+n_sample = 100000
+repeat = 3
+n_examples = 5
+reference = 'reference'
+out_path = "../results/equivalence"
+
+
+def synthetic_corpus(n, seed=0):
+    """Synthetic frames with plenty of noise and single bit errors, so that
+    invalid and borderline frames are exercised as well as clean ones."""
+    n_aircraft = max(1, n // 4 // 600)
+    frames = generate(n_aircraft=n_aircraft, duration=max(60., n / 4 / n_aircraft),
+                      seed=seed, noise=0.2, bit_errors=0.05)
+    return frames.iloc[:n].reset_index(drop=True)
+
+
+def real_corpus(file_list, n, seed=0):
+    """Uniform sample of `n` long frames from raw DF files."""
+    frames = pd.concat([pd.read_csv(f, sep=r'\s+', header=None, names=['time', 'code'], dtype={'code': str})
+                        for f in file_list])
+    frames = frames[frames['code'].str.len() == 28]
+    frames = frames[frames['code'].str.fullmatch('[0-9A-Fa-f]+')]
+    if len(frames) > n:
+        frames = frames.sample(n, random_state=seed)
+    return frames.sort_values('time', kind='stable').reset_index(drop=True)
+
+
+def inputs(frames, seed=0):
+    """Arguments of each kind of field for one corpus.
+    Pairs are consecutive even/odd airborne positions of one aircraft;
+    reference positions are the pair positions moved by up to half a degree.
+    """
+    codes = frames['code'].to_numpy().astype(str)
+    times = frames['time'].to_numpy()
+    hi, lo = frame_words(codes)
+    tc = vector.typecode(hi, lo)
+    oe = vector.bits(hi, lo, 54, 54)
+    airborne = np.nonzero((tc >= 9) & (tc <= 18))[0]
+
+    msg0, msg1, t0, t1 = list(), list(), list(), list()
+    last = dict()
+    for i in airborne:
+        addr = codes[i][2:8]
+        j = last.get(addr)
+        if j is not None and oe[i] != oe[j]:
+            msg0.append(codes[j])
+            msg1.append(codes[i])
+            t0.append(times[j])
+            t1.append(times[i])
+        last[addr] = i
+    pair = (np.array(msg0, dtype=str), np.array(msg1, dtype=str), np.array(t0), np.array(t1))
+
+    lat, lon = vector.airborne_position(*frame_words(pair[0]), *frame_words(pair[1]), pair[2], pair[3])
+    ok = ~np.isnan(lat)
+    rng = np.random.default_rng(seed)
+    ref = (pair[1][ok],
+           lat[ok] + rng.uniform(-0.5, 0.5, ok.sum()),
+           lon[ok] + rng.uniform(-0.5, 0.5, ok.sum()))
+    return {'msg': (codes,), 'pair': pair, 'ref': ref}
+
+
+def timed(func, args, repeat=repeat):
+    best, out = None, None
+    for r in range(repeat):
+        t = time.perf_counter()
+        out = func(*args)
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    if isinstance(out, tuple):
+        out = np.column_stack(out)
+    return np.asarray(out, dtype=np.float64), best
+
+
+def mismatches(a, b):
+    same = (a == b) | (np.isnan(a) & np.isnan(b))
+    if same.ndim > 1:
+        same = same.all(axis=1)
+    return np.nonzero(~same)[0]
+
+
+def _frames(args, i):
+    return [str(a[i]) if isinstance(a[i], str) else float(a[i]) for a in args]
+
+
+def _values(v):
+    return [None if np.isnan(x) else float(x) for x in np.atleast_1d(v)]
+
+
+def check(corpus, args_by_kind, names=None, repeat=repeat):
+    """Run every engine against the reference on one corpus.
+    Returns:
+        list: one record per field and engine
+    """
+    names = names or [e for e in engines if e != reference]
+    records = list()
+    for field, kind in fields.items():
+        args = args_by_kind[kind]
+        n = len(args[0])
+        expected, t_ref = timed(engines[reference][field], args, repeat)
+        for name in names:
+            record = dict(corpus=corpus, field=field, engine=name, n=n)
+            func = engines[name].get(field)
+            if func is None:
+                record['status'] = 'not implemented'
+                records.append(record)
+                continue
+            got, t = timed(func, args, repeat)
+            bad = mismatches(expected, got)
+            record.update(
+                status='ok' if len(bad) == 0 else 'mismatch',
+                mismatches=int(len(bad)),
+                speedup=t_ref / t if t > 0 else None,
+                reference_s=t_ref,
+                engine_s=t,
+                examples=[dict(frames=_frames(args, i), reference=_values(expected[i]), engine=_values(got[i]))
+                          for i in bad[:n_examples]],
+            )
+            records.append(record)
+    return records
+
+
+def summary(records):
+    lines = [f"{'corpus':<10}{'field':<28}{'engine':<12}{'n':>8}{'mismatch':>10}{'speedup':>10}"]
+    for r in records:
+        if r['status'] == 'not implemented':
+            lines.append(f"{r['corpus']:<10}{r['field']:<28}{r['engine']:<12}{r['n']:>8}{'not implemented':>20}")
+        else:
+            lines.append(f"{r['corpus']:<10}{r['field']:<28}{r['engine']:<12}{r['n']:>8}"
+                         f"{r['mismatches']:>10}{r['speedup']:>10.1f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare decoding engines with the reference decoders')
+    parser.add_argument('--synthetic', type=int, default=n_synthetic, help='number of synthetic frames, 0 for none')
+    parser.add_argument('--raw', nargs='*', default=[], help='raw DF files to sample real frames from')
+    parser.add_argument('--sample', type=int, default=n_sample, help='number of real frames sampled')
+    parser.add_argument('--engines', nargs='+', default=None)
+    parser.add_argument('--repeat', type=int, default=repeat)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='JSON result file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(message)s')
+    corpora = dict()
+    if args.synthetic > 0:
+        corpora['synthetic'] = synthetic_corpus(args.synthetic, args.seed)
+    if args.raw:
+        corpora['real'] = real_corpus(args.raw, args.sample, args.seed)
+
+    records = list()
+    for corpus, frames in corpora.items():
+        logging.info(f"equivalence: {corpus} corpus, {len(frames)} frames")
+        records += check(corpus, inputs(frames, args.seed), args.engines, args.repeat)
+    logging.info(summary(records))
+
+    out = args.out or f"{out_path}/equivalence.json"
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(records, f, indent=1)
+    logging.info(f"saved {out}")
+
+    # non-zero exit status when any engine disagrees with the reference
+    sys.exit(int(any(r['status'] == 'mismatch' for r in records)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+
+modules = ['scripts.decode', 'scripts.qc', 'scripts.edr', 'scripts.pipeline',
+           'scripts.mpd', 'scripts.mpq', 'scripts.mpedr', 'scripts.mpp']
+heavy = ['matplotlib', 'scipy', 'cartopy', 'netCDF4', 'pyarrow']
+repeat = 5
+
+# run in a fresh interpreter, as a spawned worker would
+probe = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps(dict(seconds=elapsed, heavy=[m for m in {heavy!r} if m in sys.modules])))
+"""
+
+
+def measure(module, repeat=repeat):
+    """Best import time of `module` over `repeat` fresh interpreters, and the
+    heavy packages it pulled in."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    best = None
+    for r in range(repeat):
+        out = subprocess.run([sys.executable, '-c', probe.format(module=module, heavy=heavy)],
+                             env=env, cwd=root, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return dict(module=module, **best)
+
+
+def compare(result, baseline):
+    """Import time of each module against an earlier run."""
+    before = {row['module']: row for row in baseline}
+    for row in result:
+        old = before.get(row['module'])
+        if old is not None:
+            yield dict(module=row['module'], before=old['seconds'], after=row['seconds'],
+                       speedup=old['seconds'] / row['seconds'] if row['seconds'] > 0 else None,
+                       dropped=sorted(set(old['heavy']) - set(row['heavy'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time of the worker entry points')
+    parser.add_argument('--modules', nargs='+', default=modules)
+    parser.add_argument('--repeat', type=int, default=repeat)
+    parser.add_argument('--out', default=None, help='JSON result file')
+    parser.add_argument('--compare', default=None, help='earlier JSON result file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(message)s')
+    result = list()
+    for module in args.modules:
+        row = measure(module, args.repeat)
+        logging.info(f"{module}: {row['seconds'] * 1e3:.0f} ms, heavy: {', '.join(row['heavy']) or '-'}")
+        result.append(row)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=1)
+        logging.info(f"saved {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            for row in compare(result, json.load(f)):
+                logging.info(json.dumps(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import asyncio
+import argparse
+import json
+import logging
+import sys
+import time
+
+from utils.common import unixtime2utc
+from utils.stream import line_parsers, BeastDecoder
+from utils.tracker import Tracker
+
+host = "127.0.0.1"
+port = 30003
+framing = "raw"         # 'raw' (timestamp hexframe), 'avr' or 'beast'
+queue_size = 10000      # messages buffered between the readers and the decoder
+out_file = None         # JSON lines of wind observations, stdout when None
+stats_interval = 60     # seconds between throughput log records
+
+
+class LiveDecoder:
+    """Decode messages from a bounded queue and write wind observations.
+    Readers block on a full queue, which stops reading from their socket
+    and pushes the backpressure back to the sender.
+    A line starting with '#' is a latency marker: it is queued like a
+    message and echoed back to its sender once everything before it has
+    been decoded (see scripts/replay.py).
+    """
+
+    def __init__(self, out, maxsize=queue_size):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.tracker = Tracker()
+        self.out = out
+        self.n_obs = 0
+
+    async def run(self):
+        while True:
+            t, msg = await self.queue.get()
+            if t is None:
+                writer, marker = msg
+                writer.write(marker)
+                self.queue.task_done()
+                continue
+            obs = self.tracker.update(t, msg)
+            if obs is not None:
+                obs['time'] = unixtime2utc(obs['time'] * 1000)
+                self.out.write(json.dumps(obs) + "\n")
+                self.n_obs += 1
+            self.queue.task_done()
+
+            # let the readers run when the queue stays busy
+            if self.tracker.n_msg % 1000 == 0:
+                await asyncio.sleep(0)
+
+    async def flush(self, interval=0.5):
+        # bounded output latency without flushing per observation
+        while True:
+            await asyncio.sleep(interval)
+            self.out.flush()
+
+    async def stats(self, interval=stats_interval):
+        n_prev, t_prev = 0, time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            n, t = self.tracker.n_msg, time.monotonic()
+            logging.info(f"live: {(n - n_prev) / (t - t_prev):.0f} msg/s, queue {self.queue.qsize()}, "
+                         f"aircraft {len(self.tracker)}, observations {self.n_obs}")
+            n_prev, t_prev = n, t
+
+
+async def read_lines(reader, writer, decoder, parse):
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        if line[:1] == b'#':
+            await decoder.queue.put((None, (writer, line)))
+            continue
+        item = parse(line.decode('ascii', errors='ignore'))
+        if item is not None:
+            await decoder.queue.put(item)
+
+
+async def read_beast(reader, decoder):
+    beast = BeastDecoder()
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            break
+        for item in beast.feed(data):
+            await decoder.queue.put(item)
+
+
+def client_handler(decoder, framing):
+    async def handle(reader, writer):
+        peer = writer.get_extra_info('peername')
+        logging.info(f"live: connection from {peer}")
+        try:
+            if framing == 'beast':
+                await read_beast(reader, decoder)
+            else:
+                await read_lines(reader, writer, decoder, line_parsers[framing])
+        finally:
+            writer.close()
+            logging.info(f"live: {peer} closed")
+    return handle
+
+
+async def serve(host=host, port=port, framing=framing, out=None, maxsize=queue_size):
+    decoder = LiveDecoder(out or sys.stdout, maxsize)
+    server = await asyncio.start_server(client_handler(decoder, framing), host, port)
+    logging.info(f"live: listening on {host}:{port}, framing {framing}")
+    tasks = [asyncio.create_task(decoder.run()),
+             asyncio.create_task(decoder.flush()),
+             asyncio.create_task(decoder.stats())]
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Live Mode-S wind decoding')
+    parser.add_argument('--host', default=host)
+    parser.add_argument('--port', default=port, type=int)
+    parser.add_argument('--framing', default=framing, choices=['raw', 'avr', 'beast'])
+    parser.add_argument('--queue', dest='queue_size', default=queue_size, type=int)
+    parser.add_argument('--out', dest='out_file', default=out_file)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(message)s')
+    out = open(args.out_file, 'a') if args.out_file else sys.stdout
+    try:
+        asyncio.run(serve(args.host, args.port, args.framing, out, args.queue_size))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        out.flush()
+
+
+if __name__ == '__main__':
+    main()
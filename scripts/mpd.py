@@ -4,11 +4,12 @@ from logging.handlers import QueueHandler, QueueListener
 import multiprocessing
 
 from scripts.decode import decode
+from utils.scheduler import run_pool
+from utils.declination import tables
 
 log_path = "../log"
 file_path = "/data3/storage/ADSB/raw/DF"
 num_core = 36
-file_list = glob.glob(f"{file_path}/**/*.txt")
 
 
 def worker_init(q):
@@ -38,11 +39,9 @@ def logger_init():
 def main():
     q_listener, q = logger_init()
     logging.info(f"Decode start, all files")
-    pool = multiprocessing.Pool(num_core, worker_init, [q])
-    for result in pool.map(decode, file_list):
-        pass
-    pool.close()
-    pool.join()
+    file_list = glob.glob(f"{file_path}/**/*.txt")
+    run_pool(decode, file_list, num_core, f"{log_path}/decode_manifest.json", worker_init, [q],
+             shared=tables())
     q_listener.stop()
 
 if __name__ == '__main__':
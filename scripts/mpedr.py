@@ -1,16 +1,15 @@
-import glob
 import logging
 from logging.handlers import QueueHandler, QueueListener
 import multiprocessing
 import warnings
 
-from scripts.edr import edr2, jerk
+from scripts.edr import edr2, jerk, in_format
+from utils.scheduler import run_pool
+from utils.storage import list_products
 
 warnings.filterwarnings(action='ignore')
 
 csv_path = "/data3/storage/ADSB/QCdone"
-file_list = glob.glob(f"{csv_path}/*.csv")
-# file_list = [x.split('/')[-1][:-4] for x in csv_list]
 # type_edr = "EDR2"
 type_edr = "jerk_EDR"
 
@@ -45,11 +44,9 @@ def logger_init():
 def main():
     q_listener, q = logger_init()
     logging.info(f'Start calculating {type_edr}')
-    pool = multiprocessing.Pool(num_core, worker_init, [q])
-    for result in pool.map(jerk, file_list):
-        pass
-    pool.close()
-    pool.join()
+    file_list = list_products(csv_path, "*", in_format)
+    func = edr2 if type_edr == "EDR2" else jerk
+    run_pool(func, file_list, num_core, f"{log_path}/{type_edr}_manifest.json", worker_init, [q])
     q_listener.stop()
 
 if __name__ == '__main__':
@@ -0,0 +1,48 @@
+import glob
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import multiprocessing
+
+from scripts.pipeline import pipeline, write_stages
+from utils.scheduler import run_pool
+from utils.declination import tables
+
+log_path = "../log"
+file_path = "/data3/storage/ADSB/raw/DF"
+num_core = 36
+
+
+def worker_init(q):
+    qh = QueueHandler(q)
+    logger = logging.getLogger()
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(qh)
+
+
+def logger_init():
+    q = multiprocessing.Queue()
+    handler = logging.FileHandler(f"{log_path}/pipeline.log", mode="a")
+    handler.setFormatter(
+        logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    )
+
+    ql = QueueListener(q, handler)
+    ql.start()
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+
+    return ql, q
+
+
+def main():
+    q_listener, q = logger_init()
+    logging.info(f"Pipeline start, all files, write {write_stages}")
+    file_list = glob.glob(f"{file_path}/**/*.txt")
+    run_pool(pipeline, file_list, num_core, f"{log_path}/pipeline_manifest.json", worker_init, [q],
+             shared=tables())
+    q_listener.stop()
+
+if __name__ == '__main__':
+    main()
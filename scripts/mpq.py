@@ -1,16 +1,15 @@
-import glob
 import logging
 from logging.handlers import QueueHandler, QueueListener
 import multiprocessing
 
-from scripts.qc import qc
+from scripts.qc import qc, in_format
+from utils.scheduler import run_pool
+from utils.storage import list_products
 
 
 target_year = "2022"
 
 csv_path = "/data3/storage/ADSB/merged"
-file_list = glob.glob(f"{csv_path}/{target_year}*.txt")
-# file_list = [x.split('/')[-1][:-4] for x in csv_list]
 
 log_path = "../log"
 num_core = 36
@@ -43,11 +42,8 @@ def logger_init():
 def main():
     q_listener, q = logger_init()
     logging.info(f'Start QC for calculated wind')
-    pool = multiprocessing.Pool(num_core, worker_init, [q])
-    for result in pool.map(qc, file_list):
-        pass
-    pool.close()
-    pool.join()
+    file_list = list_products(csv_path, f"{target_year}*", in_format, ext="txt")
+    run_pool(qc, file_list, num_core, f"{log_path}/{target_year}_QC_manifest.json", worker_init, [q])
     q_listener.stop()
 
 if __name__ == '__main__':
@@ -0,0 +1,51 @@
+import logging
+
+from scripts.decode import read_raw, decode_frame, write_merged
+from scripts.qc import qc_frame, write_qc
+from scripts.edr import edr2_frame, jerk_frame, write_edr2, write_jerk
+from utils.metrics import file_metrics
+
+# Stages whose output is written to disk.
+# Choose from 'merged', 'qc', 'EDR2', 'jerk'; the others stay in memory.
+write_stages = ('qc', 'EDR2', 'jerk')
+
+
+def pipeline(f, write=None):
+    """Take one raw DF file through decoding, wind, QC and EDR/jerk in memory.
+    Every stage hands a DataFrame to the next one, so nothing is re-parsed
+    from CSV between stages. Returns the list of files written.
+    """
+    write = write_stages if write is None else write
+    filename = f.split('/')[-1]
+    date = f.split('/')[-2]
+    d = f"{date}_{filename[:-4]}"
+    logging.info(f"Pipeline start: {d}, write {write}")
+
+    out_files = list()
+    with file_metrics(f"pipeline {d}"):
+        try:
+            target = read_raw(f)
+            merged = decode_frame(target)
+            del target
+            if 'merged' in write:
+                out_files.extend(write_merged(merged, f))
+
+            if not {'qc', 'EDR2', 'jerk'} & set(write):
+                return out_files
+
+            df_qc = qc_frame(merged)
+            del merged
+            if 'qc' in write:
+                out_files.extend(write_qc(df_qc, d))
+
+            if 'EDR2' in write:
+                out_files.extend(write_edr2(edr2_frame(df_qc), d))
+
+            if 'jerk' in write:
+                out_files.extend(write_jerk(jerk_frame(df_qc), d))
+
+            return out_files
+
+        except Exception as e:
+            logging.info(f"UNEXPECTED ERROR at {f}")
+            logging.critical(e, exc_info=True)
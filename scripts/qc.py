@@ -4,19 +4,24 @@ import numpy as np
 
 from utils.util_QC import rangeQC, staticQC, flucQC, additionalQC
 from utils.chunk import chunk_dataframe_by_acid, chunk_dataframe_by_15min
+from utils.storage import write_product, read_product, product_name
+from utils.trajectory import build_index, write_index
+from utils.tiles import write_tiles
+from utils.schema import enforce
+from utils.metrics import stage, file_metrics
+from utils import schema
 
+csv_path = "/data3/storage/ADSB/merged"
+df_out_path = "/data3/storage/ADSB/QCdone"
+# "csv" or "parquet"
+in_format = "csv"
+out_format = "csv"
 
-def qc(f):
-    csv_path = "/data3/storage/ADSB/merged"
-    df_out_path = "/data3/storage/ADSB/QCdone"
 
-    d = f.split('/')[-1][:-4]
-    logging.info(f"Start Calculating File: {d}")
-    try:
-        df = pd.read_csv(f"{csv_path}/{d}.txt", index_col=0)
-        df['time'] = pd.to_datetime(df['time'])
+def qc_frame(df):
+    with stage('qc_range', len(df)) as s:
+        df = enforce(df, schema.MERGED)
         df['wspd'] = df['wspd']*0.514444    # kts to m/s
-        logging.info('read done')
 
         # altitude QC
         alt_cutoff = (np.abs(df['alt'] - df['alt_x']) > 25) | (np.abs(df['alt'] - df['alt_y']) > 25)
@@ -27,37 +32,64 @@ def qc(f):
         df = df.dropna(subset=['time', 'lat', 'lon', 'alt', 'wspd', 'wdir', 'tas', 'mhed', 'tta', 'gspd'])
 
         df = rangeQC(df)
-        # logging.info(f"After Range QC length: {len(df)}")
+        s.rows_out = len(df)
 
+    # per-chunk counts are summed here rather than logged, a log record per
+    # chunk through the worker QueueHandler costs more than the QC itself
+    with stage('qc_chunks', len(df)) as s:
         sub_df_list = chunk_dataframe_by_15min(df)
-        # logging.info(f"Chunking by time done, {len(sub_df_list)}/4")
         acid_list = chunk_dataframe_by_acid(sub_df_list)
-        # logging.info(f"Chunking by acid done, {[len(cl) for cl in acid_list]}")
 
         chunk_list = list()
         for sub_acid_list in acid_list:
             for chunk in sub_acid_list:
                 if len(chunk) > 1:
-                    logging.info(f"init {len(chunk)}")
                     chunk = staticQC(chunk)
-                    logging.info(f"after static QC {len(chunk)}")
                     chunk = flucQC(chunk)
-                    logging.info(f"after fluc QC {len(chunk)}")
                     chunk = additionalQC(chunk)
-                    logging.info(f"after additional QC {len(chunk)}")
                     chunk = chunk.dropna(subset=['wspd', 'wdir'])
                     if len(chunk) > 2:
                         chunk_list.append(chunk[1:])
-                logging.info(f"fin {len(chunk)}")
-        logging.info("static, fluc QC done, concat start")
-        df_out = pd.concat(chunk_list)
+        s.rows_out = sum(len(chunk) for chunk in chunk_list)
 
+    with stage('qc_concat', s.rows_out) as s:
+        df_out = pd.concat(chunk_list)
         df_out = df_out.drop_duplicates(subset=['time', 'acid', 'lat', 'lon', 'alt'])
+        df_out = enforce(df_out, schema.QC)
+        s.rows_out = len(df_out)
+    return df_out
+
 
-        logging.info(f"Concat done. Final length: {len(df_out)}")
+def write_qc(df_out, d):
+    with stage('qc_write', len(df_out)):
+        out_files = write_product(df_out, f"{df_out_path}/FAAL_ADSB_{d}.csv", out_format)
+    # per-aircraft index for get_trajectory()
+    with stage('qc_index', len(df_out)) as s:
+        index = build_index(df_out, out_files, out_format)
+        write_index(index, df_out_path, f"FAAL_ADSB_{d}")
+        s.rows_out = len(index)
+    # space-time tile index for regional queries
+    with stage('qc_tiles', len(df_out)) as s:
+        s.rows_out = write_tiles(df_out, out_files, df_out_path, f"FAAL_ADSB_{d}", out_format)
+    return out_files
+
+
+def qc(f):
+    d = product_name(f)
+    logging.info(f"Start Calculating File: {d}")
+    with file_metrics(f"qc {d}"):
+        try:
+            with stage('qc_read') as s:
+                if in_format == 'csv':
+                    df = read_product(f"{csv_path}/{d}.txt")
+                else:
+                    df = read_product(csv_path, in_format, name=d)
+                s.rows_out = len(df)
 
-        df_out.to_csv(f"{df_out_path}/FAAL_ADSB_{d}.csv")
-        logging.info("save done")
+            df_out = qc_frame(df)
+            out_files = write_qc(df_out, d)
+            logging.info("save done")
+            return out_files
 
-    except Exception as e:
-        logging.critical(e, exc_info=True)
+        except Exception as e:
+            logging.critical(e, exc_info=True)
@@ -0,0 +1,162 @@
+import asyncio
+import argparse
+import heapq
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+
+host = "127.0.0.1"
+port = 30003
+speed = 1.0             # 1 real time, N for N times real time, 0 as fast as possible
+marker_every = 1000     # messages between latency markers
+ack_timeout = 30        # seconds to wait for the last markers after sending
+
+
+def read_frames(f):
+    """(timestamp in ms, frame) of a raw DF file, in file order."""
+    with open(f) as lines:
+        for line in lines:
+            parts = line.split()
+            if len(parts) == 2:
+                try:
+                    yield int(parts[0]), parts[1]
+                except ValueError:
+                    continue
+
+
+def multiplex(file_list):
+    """Merge several raw files into one stream ordered by timestamp."""
+    return heapq.merge(*[read_frames(f) for f in file_list], key=lambda x: x[0])
+
+
+def first_timestamp(file_list):
+    return min(next(read_frames(f))[0] for f in file_list)
+
+
+class Pacer:
+    """Hold each message back until its original inter-arrival time,
+    divided by `speed`, has passed since the start of the replay."""
+
+    def __init__(self, t0, speed):
+        self.t0 = t0
+        self.speed = speed
+        self.start = time.monotonic()
+
+    def delay(self, t):
+        if self.speed <= 0:
+            return 0.
+        return (t - self.t0) / 1000. / self.speed - (time.monotonic() - self.start)
+
+
+def percentiles(latencies):
+    if len(latencies) == 0:
+        return dict()
+    lat = np.array(latencies) * 1000.
+    out = {f"p{q}_ms": float(np.percentile(lat, q)) for q in (50, 90, 99)}
+    out['max_ms'] = float(lat.max())
+    return out
+
+
+async def replay_receiver(i, f, pacer, result):
+    """Replay one raw file over its own connection, like one receiver."""
+    reader, writer = await asyncio.open_connection(host, port)
+    latencies = result['latency']
+    pending = dict()
+
+    async def read_acks():
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            sent = pending.pop(line.split()[1].decode(), None)
+            if sent is not None:
+                latencies.append(time.time() - sent)
+
+    ack_task = asyncio.create_task(read_acks())
+    n = 0
+    for t, msg in read_frames(f):
+        delay = pacer.delay(t)
+        if delay > 0.001:
+            await writer.drain()
+            await asyncio.sleep(delay)
+        writer.write(f"{t} {msg}\n".encode())
+        n += 1
+        if n % marker_every == 0:
+            token = f"{i}:{n}"
+            pending[token] = time.time()
+            writer.write(f"# {token}\n".encode())
+            await writer.drain()
+
+    token = f"{i}:{n}:end"
+    pending[token] = time.time()
+    writer.write(f"# {token}\n".encode())
+    await writer.drain()
+    result['sent'] += n
+
+    deadline = time.monotonic() + ack_timeout
+    while pending and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    result['lost_markers'] += len(pending)
+    ack_task.cancel()
+    writer.close()
+
+
+async def replay_socket(file_list):
+    result = dict(sent=0, latency=list(), lost_markers=0)
+    pacer = Pacer(first_timestamp(file_list), speed)
+    await asyncio.gather(*[replay_receiver(i, f, pacer, result) for i, f in enumerate(file_list)])
+    return result
+
+
+def replay_pipe(file_list, out=sys.stdout):
+    """Write the merged stream to a pipe. There is no way back from a pipe,
+    so only the send rate is measured."""
+    pacer = Pacer(first_timestamp(file_list), speed)
+    n = 0
+    for t, msg in multiplex(file_list):
+        delay = pacer.delay(t)
+        if delay > 0.001:
+            out.flush()
+            time.sleep(delay)
+        out.write(f"{t} {msg}\n")
+        n += 1
+    out.flush()
+    return dict(sent=n, latency=list(), lost_markers=0)
+
+
+def report(result, elapsed):
+    record = dict(sent=result['sent'], elapsed_s=round(elapsed, 3),
+                  msg_per_s=round(result['sent'] / elapsed, 1) if elapsed > 0 else None,
+                  markers=len(result['latency']), lost_markers=result['lost_markers'])
+    record.update(percentiles(result['latency']))
+    return record
+
+
+def main():
+    global host, port, speed, marker_every
+    parser = argparse.ArgumentParser(description='Replay raw DF files as a live feed')
+    parser.add_argument('files', nargs='+', help='raw DF files, one simulated receiver each')
+    parser.add_argument('--host', default=host)
+    parser.add_argument('--port', default=port, type=int)
+    parser.add_argument('--speed', default=speed, type=float,
+                        help='1 real time, N for N times real time, 0 as fast as possible')
+    parser.add_argument('--marker-every', dest='marker_every', default=marker_every, type=int)
+    parser.add_argument('--pipe', action='store_true', help='write the merged stream to stdout')
+    args = parser.parse_args()
+    host, port, speed, marker_every = args.host, args.port, args.speed, args.marker_every
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr,
+                        format='%(name)s - %(levelname)s - %(message)s')
+    start = time.monotonic()
+    if args.pipe:
+        result = replay_pipe(args.files)
+    else:
+        result = asyncio.run(replay_socket(args.files))
+    logging.info(json.dumps(report(result, time.monotonic() - start)))
+
+
+if __name__ == '__main__':
+    main()
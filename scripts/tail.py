@@ -0,0 +1,153 @@
+import argparse
+import glob
+import logging
+import os
+import pickle
+import time
+
+import pandas as pd
+
+from utils.tracker import Tracker
+from utils.stream import parse_raw
+from utils.storage import append_partitions
+from utils.scheduler import atomic_write
+from utils.schema import enforce
+from utils import schema
+
+file_path = "/data3/storage/ADSB/raw/DF"
+out_path = "/data3/storage/ADSB/merged_hourly"
+checkpoint_path = "/data3/storage/ADSB/merged_hourly/checkpoint"
+time_resolution = "0.5S"
+# "csv" or "parquet"; a Parquet file cannot be appended to, so every batch
+# rewrites the hour partitions it touches, and an hour tailed in k batches
+# costs k rewrites of its partition. CSV appends in place.
+out_format = "csv"
+recent_hours = 24       # raw files modified within this many hours are tailed
+read_size = 64 * 2**20  # bytes read per batch
+
+
+class Checkpoint:
+    """Where tailing a raw file stopped: the byte offset after the last
+    complete line, the per-aircraft Tracker state at that point and the
+    committed size of every output partition.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.inode = None
+        self.tracker = Tracker()
+        self.outputs = dict()
+
+    @classmethod
+    def load(cls, path):
+        cp = cls(path)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+            cp.offset, cp.inode, cp.tracker, cp.outputs = \
+                state['offset'], state['inode'], state['tracker'], state['outputs']
+        return cp
+
+    def save(self):
+        state = dict(offset=self.offset, inode=self.inode, tracker=self.tracker, outputs=self.outputs)
+        with atomic_write(self.path) as tmp:
+            with open(tmp, 'wb') as out:
+                pickle.dump(state, out)
+
+
+def product(f):
+    filename = f.split('/')[-1]
+    date = f.split('/')[-2]
+    return f"{date}_{os.path.splitext(filename)[0]}"
+
+
+def observations(obs_list):
+    df = pd.DataFrame(obs_list)
+    df['time'] = pd.to_datetime(df['time'] * 1000, unit='ms').dt.round(time_resolution)
+    return enforce(df, schema.MERGED)
+
+
+def tail(f):
+    """Decode the lines appended to raw file `f` since the last call.
+    Messages are decoded one at a time with a Tracker, not with decode():
+    each BDS 5,0 and BDS 6,0 reply goes into at most one observation, paired
+    with the latest position of the aircraft, where decode() joins every
+    reply of a time bucket with every other. Rows are therefore fewer than
+    in the batch product of the same file and not comparable one to one;
+    the known-aircraft filter of decode() is replaced by requiring an
+    ADS-B position before any Comm-B reply of the address is used.
+    A file that was replaced (new inode) or truncated is decoded again from
+    offset 0 and the partitions written for it before are removed first.
+    Returns:
+        int: number of wind observations appended
+    """
+    name = product(f)
+    cp = Checkpoint.load(f"{checkpoint_path}/{name}.pkl")
+
+    st = os.stat(f)
+    if cp.inode != st.st_ino or st.st_size < cp.offset:
+        # a new or truncated file starts from scratch, so do its outputs
+        if cp.inode is not None:
+            logging.info(f"tail: {name} restarts from offset 0, removing {len(cp.outputs)} partitions")
+        for out_file in cp.outputs:
+            if os.path.exists(out_file):
+                os.remove(out_file)
+        cp = Checkpoint(cp.path)
+        cp.inode = st.st_ino
+        cp.save()
+    if st.st_size == cp.offset:
+        return 0
+
+    n_obs = 0
+    with open(f, 'rb') as raw:
+        raw.seek(cp.offset)
+        while True:
+            data = raw.read(read_size)
+            end = data.rfind(b'\n')
+            if end < 0:
+                # only an incomplete last line, left for the next call
+                break
+            data = data[:end + 1]
+
+            obs_list = list()
+            for line in data.decode('ascii', errors='ignore').splitlines():
+                item = parse_raw(line)
+                if item is None:
+                    continue
+                obs = cp.tracker.update(*item)
+                if obs is not None:
+                    obs_list.append(obs)
+
+            if obs_list:
+                cp.outputs = append_partitions(observations(obs_list), out_path, name, out_format, cp.outputs)
+                n_obs += len(obs_list)
+            cp.offset += len(data)
+            cp.save()
+            raw.seek(cp.offset)
+
+    logging.info(f"tail: {name} offset {cp.offset}, {n_obs} new observations, aircraft {len(cp.tracker)}")
+    return n_obs
+
+
+def recent_files(hours=recent_hours):
+    since = time.time() - hours * 3600
+    return sorted(f for f in glob.glob(f"{file_path}/**/*.txt") if os.path.getmtime(f) >= since)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode what was appended to raw DF files since the last run')
+    parser.add_argument('files', nargs='*', help=f'raw DF files, default those modified in the last {recent_hours} h')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(message)s')
+    os.makedirs(checkpoint_path, exist_ok=True)
+    for f in args.files or recent_files():
+        try:
+            tail(f)
+        except Exception as e:
+            logging.critical(e, exc_info=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from utils import schema
+from utils.schema import enforce
+from utils.storage import write_product, read_product
+
+# all-digit addresses that pandas would read as integers
+ADDRESSES = ['718123', '000E10', '071234']
+
+
+def merged_frame():
+    n = len(ADDRESSES)
+    df = pd.DataFrame({
+        'time': pd.date_range('2022-01-01', periods=n, freq='min'),
+        'acid': ADDRESSES,
+        'lat': np.linspace(35., 36., n),
+        'lon': np.linspace(127., 128., n),
+        'alt': np.full(n, 30000.),
+    })
+    return enforce(df, schema.MERGED)
+
+
+def test_csv_product_keeps_all_digit_acid(tmp_path):
+    out_file = str(tmp_path / 'product.csv')
+    write_product(merged_frame(), out_file, 'csv')
+
+    df = read_product(out_file, 'csv')
+    assert list(enforce(df, schema.QC)['acid']) == ADDRESSES
+
+    df = read_product(out_file, 'csv', columns=['time', 'acid', 'alt'], acid='718123')
+    assert list(df['acid']) == ['718123']
+
+
+def test_enforce_hexes_only_uint32_acid():
+    df = pd.DataFrame({'acid': np.array([0x718123, 0x000E10], dtype=np.uint32)})
+    assert list(enforce(df, schema.MERGED)['acid']) == ['718123', '000E10']
+
+    df = pd.DataFrame({'acid': ['718123', '000E10']})
+    assert list(enforce(df, schema.MERGED)['acid']) == ['718123', '000E10']
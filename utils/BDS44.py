@@ -0,0 +1,119 @@
+from utils.common import allzeros, hex2bin, wrongstatus, data, bin2int
+
+
+def is44(msg):
+    if allzeros(msg):
+        return False
+
+    d = hex2bin(data(msg))
+
+    # status bit 5, 35, 47, 50
+    if wrongstatus(d, 5, 6, 23):
+        return False
+
+    if wrongstatus(d, 35, 36, 46):
+        return False
+
+    if wrongstatus(d, 47, 48, 49):
+        return False
+
+    if wrongstatus(d, 50, 51, 56):
+        return False
+
+    # Bits 1-4 indicate the source, values > 4 are reserved
+    if bin2int(d[0:4]) > 4:
+        return False
+
+    vw, dw = wind44(msg)
+    if vw is not None and vw > 250:
+        return False
+
+    temp = temp44(msg)
+    if temp > 60 or temp < -80:
+        return False
+
+    return True
+
+
+def wind44(msg):
+    """Wind speed and direction, BDS 4,4 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        (int, float): speed in knots, direction in degrees to true north
+    """
+    d = hex2bin(data(msg))
+
+    if d[4] == "0":
+        return None, None
+
+    speed = bin2int(d[5:14])  # kts
+    direction = bin2int(d[14:23]) * 180 / 256  # degree
+    return speed, round(direction, 1)
+
+
+def temp44(msg):
+    """Static air temperature, BDS 4,4 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        float: temperature in Celsius, with the 0.25 degree resolution of
+               ICAO Doc 9871 ed. 2
+    """
+    d = hex2bin(data(msg))
+
+    sign = int(d[23])
+    value = bin2int(d[24:34])
+
+    if sign:
+        value = value - 1024
+
+    temp = value * 0.25  # celsius
+    return round(temp, 2)
+
+
+def p44(msg):
+    """Static pressure, BDS 4,4 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        int: static pressure in hPa
+    """
+    d = hex2bin(data(msg))
+
+    if d[34] == "0":
+        return None
+
+    p = bin2int(d[35:46])  # hPa
+    return p
+
+
+def turb44(msg):
+    """Turbulence, BDS 4,4 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        int: turbulence level, 0 (NIL) to 3 (severe)
+    """
+    d = hex2bin(data(msg))
+
+    if d[46] == "0":
+        return None
+
+    return bin2int(d[47:49])
+
+
+def hum44(msg):
+    """Humidity, BDS 4,4 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        float: percentage of humidity, [0 - 100] %
+    """
+    d = hex2bin(data(msg))
+
+    if d[49] == "0":
+        return None
+
+    hm = bin2int(d[50:56]) * 100 / 64  # %
+    return round(hm, 1)
@@ -0,0 +1,156 @@
+from utils.common import allzeros, hex2bin, wrongstatus, data, bin2int
+
+
+def is45(msg):
+    if allzeros(msg):
+        return False
+
+    d = hex2bin(data(msg))
+
+    # status bit 1, 4, 7, 10, 13, 16, 27, 39
+    if wrongstatus(d, 1, 2, 3):
+        return False
+
+    if wrongstatus(d, 4, 5, 6):
+        return False
+
+    if wrongstatus(d, 7, 8, 9):
+        return False
+
+    if wrongstatus(d, 10, 11, 12):
+        return False
+
+    if wrongstatus(d, 13, 14, 15):
+        return False
+
+    if wrongstatus(d, 16, 17, 26):
+        return False
+
+    if wrongstatus(d, 27, 28, 38):
+        return False
+
+    if wrongstatus(d, 39, 40, 51):
+        return False
+
+    # reserved bits
+    if bin2int(d[51:56]) != 0:
+        return False
+
+    temp = temp45(msg)
+    if temp is not None and (temp > 60 or temp < -80):
+        return False
+
+    return True
+
+
+def _hazard(msg, sb):
+    d = hex2bin(data(msg))
+
+    if d[sb - 1] == "0":
+        return None
+
+    return bin2int(d[sb:sb + 2])
+
+
+def turb45(msg):
+    """Turbulence, BDS 4,5 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        int: hazard level 0 (NIL) to 3 (severe)
+    """
+    return _hazard(msg, 1)
+
+
+def ws45(msg):
+    """Wind shear, BDS 4,5 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        int: hazard level 0 (NIL) to 3 (severe)
+    """
+    return _hazard(msg, 4)
+
+
+def mb45(msg):
+    """Microburst, BDS 4,5 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        int: hazard level 0 (NIL) to 3 (severe)
+    """
+    return _hazard(msg, 7)
+
+
+def ic45(msg):
+    """Icing, BDS 4,5 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        int: hazard level 0 (NIL) to 3 (severe)
+    """
+    return _hazard(msg, 10)
+
+
+def wv45(msg):
+    """Wake vortex, BDS 4,5 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        int: hazard level 0 (NIL) to 3 (severe)
+    """
+    return _hazard(msg, 13)
+
+
+def temp45(msg):
+    """Static air temperature, BDS 4,5 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        float: temperature in Celsius
+    """
+    d = hex2bin(data(msg))
+
+    if d[15] == "0":
+        return None
+
+    sign = int(d[16])
+    value = bin2int(d[17:26])
+
+    if sign:
+        value = value - 512
+
+    temp = value * 0.25  # celsius
+    return round(temp, 1)
+
+
+def p45(msg):
+    """Average static pressure, BDS 4,5 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        int: static pressure in hPa
+    """
+    d = hex2bin(data(msg))
+
+    if d[26] == "0":
+        return None
+
+    p = bin2int(d[27:38])  # hPa
+    return p
+
+
+def rh45(msg):
+    """Radio height, BDS 4,5 message
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        int: radio height in ft
+    """
+    d = hex2bin(data(msg))
+
+    if d[38] == "0":
+        return None
+
+    rh = bin2int(d[39:51]) * 16  # ft
+    return rh
@@ -13,6 +13,13 @@ def atmos(H):
     return p, rho, T
 
 
+def isa(H):
+    """Pressure, density, temperature and speed of sound at H (m) from one
+    evaluation of the atmosphere, for conversions that need several of them"""
+    p, rho, T = atmos(H)
+    return p, rho, T, np.sqrt(gamma * R * T)
+
+
 def temperature(H):
     p, r, T = atmos(H)
     return T
@@ -110,28 +117,39 @@ def tas2eas(Vtas, H):
 def cas2tas(Vcas, H):
     """Calibrated Airspeed to True Airspeed"""
     p, rho, T = atmos(H)
-    qdyn = p0 * ((1 + rho0 * Vcas * Vcas / (7 * p0)) ** 3.5 - 1.0)
-    Vtas = np.sqrt(7 * p / rho * ((1 + qdyn / p) ** (2 / 7.0) - 1.0))
-    return Vtas
+    return _cas2tas(Vcas, p, rho)
 
 
 def tas2cas(Vtas, H):
     """True Airspeed to Calibrated Airspeed"""
     p, rho, T = atmos(H)
+    return _tas2cas(Vtas, p, rho)
+
+
+def _tas2cas(Vtas, p, rho):
     qdyn = p * ((1 + rho * Vtas * Vtas / (7 * p)) ** 3.5 - 1.0)
-    Vcas = np.sqrt(7 * p0 / rho0 * ((qdyn / p0 + 1.0) ** (2 / 7.0) - 1.0))
-    return Vcas
+    return np.sqrt(7 * p0 / rho0 * ((qdyn / p0 + 1.0) ** (2 / 7.0) - 1.0))
+
+
+def _cas2tas(Vcas, p, rho):
+    qdyn = p0 * ((1 + rho0 * Vcas * Vcas / (7 * p0)) ** 3.5 - 1.0)
+    return np.sqrt(7 * p / rho * ((1 + qdyn / p) ** (2 / 7.0) - 1.0))
 
 
 def mach2cas(Mach, H):
     """Mach number to Calibrated Airspeed"""
-    Vtas = mach2tas(Mach, H)
-    Vcas = tas2cas(Vtas, H)
-    return Vcas
+    p, rho, T, a = isa(H)
+    return _tas2cas(Mach * a, p, rho)
 
 
 def cas2mach(Vcas, H):
     """Calibrated Airspeed to Mach number"""
-    Vtas = cas2tas(Vcas, H)
-    Mach = tas2mach(Vtas, H)
-    return Mach
+    p, rho, T, a = isa(H)
+    return _cas2tas(Vcas, p, rho) / a
+
+
+def tas2sat(Vtas, Mach):
+    """Static air temperature (K) from True Airspeed and Mach number"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = Vtas / Mach
+    return a * a / (gamma * R)
@@ -0,0 +1,175 @@
+import os
+import logging
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from utils import shared
+
+# Magnetic declination (degrees, east positive) on a lat/lon grid per year,
+# built offline with scripts/declination_grid.py from World Magnetic Model
+# coefficients. utils/declination.npz is the 1 degree global grid of
+# WMM2020 and WMM2025 for 2020-2029. Without a grid file the fixed
+# correction of the Korean domain is used everywhere.
+grid_path = os.environ.get("ADSB_DECLINATION", os.path.join(os.path.dirname(__file__), "declination.npz"))
+default = -8.
+
+# WMM geomagnetic reference radius and WGS 84 ellipsoid, km
+a_ref = 6371.2
+a_wgs = 6378.137
+f_wgs = 1 / 298.257223563
+
+
+def read_cof(path):
+    """Read a WMM coefficient file (WMM.COF).
+    Returns:
+        (float, np.ndarray): epoch and the rows n, m, g, h, g_dot, h_dot
+    """
+    rows = list()
+    with open(path) as f:
+        epoch = float(f.readline().split()[0])
+        for line in f:
+            if line.startswith('9999'):
+                break
+            items = line.split()
+            if len(items) == 6:
+                rows.append([float(x) for x in items])
+    return epoch, np.array(rows)
+
+
+def wmm_declination(lat, lon, year, epoch, coef, h=0.):
+    """Declination from spherical harmonic coefficients.
+    Args:
+        lat, lon (array): geodetic position in degrees
+        year (float): decimal year
+        epoch (float): epoch of the coefficients
+        coef (np.ndarray): rows of n, m, g, h, g_dot, h_dot (nT, nT/year)
+        h (float): height above the ellipsoid in km
+    Returns:
+        np.ndarray: declination in degrees, east positive
+    """
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -89.999, 89.999))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+
+    # geodetic to geocentric spherical coordinates
+    e2 = f_wgs * (2 - f_wgs)
+    rc = a_wgs / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    p = (rc + h) * np.cos(lat)
+    z = (rc * (1 - e2) + h) * np.sin(lat)
+    r = np.hypot(p, z)
+    lat_c = np.arcsin(z / r)
+
+    n_max = int(coef[:, 0].max())
+    x, c = np.sin(lat_c), np.cos(lat_c)
+
+    # Schmidt semi-normalized associated Legendre functions
+    P = dict()
+    P[0, 0] = np.ones_like(x)
+    for n in range(1, n_max + 1):
+        for m in range(n + 1):
+            if m == n:
+                P[n, m] = c * P[n - 1, m - 1] * (1. if n == 1 else np.sqrt((2 * n - 1) / (2 * n)))
+            else:
+                P[n, m] = ((2 * n - 1) * x * P[n - 1, m]
+                           - (np.sqrt((n - 1) ** 2 - m ** 2) * P[n - 2, m] if n - 2 >= m else 0)) \
+                          / np.sqrt(n ** 2 - m ** 2)
+
+    bx = np.zeros_like(x)
+    by = np.zeros_like(x)
+    bz = np.zeros_like(x)
+    for n, m, g, hh, g_dot, h_dot in coef:
+        n, m = int(n), int(m)
+        g = g + (year - epoch) * g_dot
+        hh = hh + (year - epoch) * h_dot
+        scale = (a_ref / r) ** (n + 2)
+        cos_m, sin_m = np.cos(m * lon), np.sin(m * lon)
+        dP = (-n * x * P[n, m] + (np.sqrt(n ** 2 - m ** 2) * P[n - 1, m] if n - 1 >= m else 0)) / c
+        bx -= scale * (g * cos_m + hh * sin_m) * dP
+        by += scale * m * (g * sin_m - hh * cos_m) * P[n, m] / c
+        bz -= (n + 1) * scale * (g * cos_m + hh * sin_m) * P[n, m]
+
+    # rotate the north component back to the ellipsoid
+    north = bx * np.cos(lat_c - lat) - bz * np.sin(lat_c - lat)
+    return np.degrees(np.arctan2(by, north))
+
+
+def decimal_year(time):
+    """Decimal year of datetimes (array, Series or scalar)."""
+    t = np.atleast_1d(np.asarray(pd.to_datetime(time), dtype='datetime64[ns]'))
+    year = t.astype('datetime64[Y]')
+    start = year.astype('datetime64[ns]')
+    end = (year + 1).astype('datetime64[ns]')
+    return 1970 + year.astype(np.float64) + (t - start) / (end - start)
+
+
+def read_grid(path=grid_path):
+    """The declination grid file as arrays; None without the file."""
+    if not os.path.exists(path):
+        logging.warning(f"declination grid {path} not found, using {default} degrees")
+        return None
+    with np.load(path) as grid:
+        out = {k: grid[k] for k in ('lat', 'lon', 'year', 'dec')}
+        if 'scale' in grid:
+            out['dec'] = (out['dec'] * grid['scale']).astype(np.float32)
+    return out
+
+
+def load_grid(path=grid_path):
+    """The declination grid, attached from shared memory in pool workers
+    and otherwise read once per process."""
+    # looked up before the cache, so a grid cached by the parent before the
+    # pool forked does not shadow the shared one
+    grid = shared.lookup('declination')
+    if grid is not None and path == grid_path:
+        return grid
+    return _cached_grid(path)
+
+
+@lru_cache(maxsize=None)
+def _cached_grid(path):
+    return read_grid(path)
+
+
+def tables(path=grid_path):
+    """The declination grid as a table for utils.shared, empty without the file."""
+    grid = read_grid(path)
+    return dict() if grid is None else {'declination': grid}
+
+
+def _weights(axis, values):
+    # index of the lower grid point and the weight of the upper one, clipped to the grid
+    pos = np.interp(values, axis, np.arange(len(axis)))
+    i = np.minimum(np.floor(pos).astype(int), len(axis) - 2) if len(axis) > 1 else np.zeros(len(pos), int)
+    return i, pos - i
+
+
+def declination(lat, lon, time=None, path=grid_path):
+    """Magnetic declination by bilinear lookup in the grid, linear in time.
+    Args:
+        lat, lon (array): position in degrees
+        time: datetimes, None for the first year of the grid
+    Returns:
+        np.ndarray: declination in degrees, east positive; true heading is
+        magnetic heading plus declination
+    """
+    lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+    lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+    grid = load_grid(path)
+    if grid is None:
+        return np.full(lat.shape, default)
+
+    lon = (lon + 180) % 360 - 180
+    year = np.full(lat.shape, grid['year'][0]) if time is None else decimal_year(time)
+    dec = grid['dec']
+    i, wi = _weights(grid['lat'], lat)
+    j, wj = _weights(grid['lon'], lon)
+    k, wk = _weights(grid['year'], year)
+    out = np.zeros(lat.shape)
+    for dk, fk in ((0, 1 - wk), (1, wk)):
+        if dec.shape[0] == 1 and dk == 1:
+            continue
+        for di, fi in ((0, 1 - wi), (1, wi)):
+            for dj, fj in ((0, 1 - wj), (1, wj)):
+                out += fk * fi * fj * dec[k + dk, i + di, j + dj]
+    return out
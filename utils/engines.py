@@ -0,0 +1,141 @@
+import numpy as np
+
+from utils import common, position, velocity, BDS44, BDS45, BDS50, BDS60, vector
+from utils.schema import frame_words
+
+# field name -> kind of input
+#   msg:  array of frames
+#   pair: even/odd frames and their timestamps (msg0, msg1, t0, t1)
+#   ref:  frames and a reference position (msg, lat_ref, lon_ref)
+fields = {
+    'df': 'msg',
+    'typecode': 'msg',
+    'icao': 'msg',
+    'oe_flag': 'msg',
+    'altitude05': 'msg',
+    'altcode': 'msg',
+    'velocity': 'msg',
+    'airborne_position': 'pair',
+    'airborne_position_with_ref': 'ref',
+    'is50': 'msg',
+    'roll50': 'msg',
+    'trk50': 'msg',
+    'gs50': 'msg',
+    'rtrk50': 'msg',
+    'tas50': 'msg',
+    'is60': 'msg',
+    'hdg60': 'msg',
+    'ias60': 'msg',
+    'mach60': 'msg',
+    'vr60baro': 'msg',
+    'vr60ins': 'msg',
+    'is44': 'msg',
+    'wind44': 'msg',
+    'temp44': 'msg',
+    'p44': 'msg',
+    'turb44': 'msg',
+    'hum44': 'msg',
+    'is45': 'msg',
+    'turb45': 'msg',
+    'ws45': 'msg',
+    'mb45': 'msg',
+    'ic45': 'msg',
+    'wv45': 'msg',
+    'temp45': 'msg',
+    'p45': 'msg',
+    'rh45': 'msg',
+}
+
+engines = dict()
+
+
+def register_engine(name, funcs):
+    """Register a decoding engine.
+    Args:
+        name (str): engine name
+        funcs (dict): field name -> function. 'msg' functions take an array
+            of frames, 'pair' functions (msg0, msg1, t0, t1) and 'ref'
+            functions (msg, lat_ref, lon_ref). Values come back as arrays,
+            NaN where the reference returns None; positions as (lat, lon)
+            and other multi-valued fields as tuples.
+            Fields left out are reported as not implemented.
+    """
+    unknown = set(funcs) - set(fields)
+    if unknown:
+        raise ValueError(f"unknown fields: {sorted(unknown)}")
+    engines[name] = funcs
+
+
+def _value(v):
+    if v is None:
+        return np.nan
+    if isinstance(v, str):
+        return int(v, 16)
+    if isinstance(v, tuple):
+        return tuple(_value(x) for x in v)
+    return v
+
+
+def _scalar(func):
+    def run(codes):
+        out = list()
+        for c in codes:
+            try:
+                out.append(_value(func(c)))
+            except (TypeError, RuntimeError):
+                out.append(np.nan)
+        return np.array(out, dtype=np.float64)
+    return run
+
+
+def _scalar_position(func):
+    def run(*args):
+        out = list()
+        for a in zip(*args):
+            try:
+                latlon = func(*a)
+            except RuntimeError:
+                latlon = None
+            out.append((np.nan, np.nan) if latlon is None else latlon)
+        out = np.array(out, dtype=np.float64).reshape(-1, 2)
+        return out[:, 0], out[:, 1]
+    return run
+
+
+def _vector(func):
+    def run(codes):
+        return func(*frame_words(codes))
+    return run
+
+
+register_engine('reference', dict(
+    {name: _scalar(getattr(module, name)) for module, names in (
+        (common, ('df', 'typecode', 'icao')),
+        (position, ('oe_flag', 'altitude05', 'altcode')),
+        (velocity, ('velocity',)),
+        (BDS50, ('is50', 'roll50', 'trk50', 'gs50', 'rtrk50', 'tas50')),
+        (BDS60, ('is60', 'hdg60', 'ias60', 'mach60', 'vr60baro', 'vr60ins')),
+        (BDS44, ('is44', 'wind44', 'temp44', 'p44', 'turb44', 'hum44')),
+        (BDS45, ('is45', 'turb45', 'ws45', 'mb45', 'ic45', 'wv45', 'temp45', 'p45', 'rh45')),
+    ) for name in names},
+    airborne_position=_scalar_position(position.airborne_position),
+    airborne_position_with_ref=_scalar_position(position.airborne_position_with_ref),
+))
+
+# order of the velocity() tuple of the reference
+velocity_fields = ('subtype', 'gs', 'trk', 'hdg', 'airspeed', 'tas', 'vr')
+
+
+def _vector_velocity(codes):
+    vel = vector.velocity(*frame_words(codes))
+    return tuple(vel[k] for k in velocity_fields)
+
+
+register_engine('vector', dict(
+    {name: _vector(getattr(vector, name)) for name, kind in fields.items() if kind == 'msg'},
+    velocity=_vector_velocity,
+    airborne_position=lambda msg0, msg1, t0, t1: vector.airborne_position(
+        *frame_words(msg0), *frame_words(msg1), t0, t1),
+    airborne_position_with_ref=lambda msg, lat_ref, lon_ref: vector.airborne_position_with_ref(
+        *frame_words(msg), lat_ref, lon_ref),
+))
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import logging
+from contextlib import contextmanager
+
+# ADSB_PROFILE=cprofile or tracemalloc turns on profiling of every file a
+# worker processes; the output goes to ADSB_PROFILE_DIR (default ".").
+profile_env = "ADSB_PROFILE"
+profile_dir_env = "ADSB_PROFILE_DIR"
+tracemalloc_top = 25
+
+
+def rss_mb():
+    """Current resident set size, None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return None
+
+
+def reset_peak_rss():
+    """Restart the peak RSS (VmHWM) from the current RSS, Linux 4.0 and later.
+    Returns False where that is not possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak RSS since the last reset_peak_rss(), None without /proc."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.
+    except OSError:
+        pass
+    return None
+
+
+def _round(x):
+    return None if x is None else round(x, 1)
+
+
+class StageTimer:
+    """Wall time, row counts and memory of one stage: the RSS at entry and
+    exit and the peak RSS in between. Pool workers are long-lived, so the
+    peak is restarted at every stage rather than taken from ru_maxrss,
+    which would repeat the largest file the worker has seen.
+    """
+
+    def __init__(self, stage, rows_in=None):
+        self.stage = stage
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.wall_s = None
+        self.rss_start_mb = None
+        self.rss_end_mb = None
+        self.peak_rss_mb = None
+
+    def __enter__(self):
+        self.rss_start_mb = rss_mb()
+        self._peak = reset_peak_rss()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_s = time.perf_counter() - self._t0
+        self.rss_end_mb = rss_mb()
+        self.peak_rss_mb = peak_rss_mb() if self._peak else None
+        return False
+
+    def record(self):
+        rows = self.rows_in if self.rows_in is not None else self.rows_out
+        return dict(stage=self.stage, wall_s=round(self.wall_s, 4), rows_in=self.rows_in, rows_out=self.rows_out,
+                    rows_per_s=round(rows / self.wall_s, 1) if rows and self.wall_s else None,
+                    rss_start_mb=_round(self.rss_start_mb), rss_end_mb=_round(self.rss_end_mb),
+                    peak_rss_mb=_round(self.peak_rss_mb))
+
+
+class Metrics:
+    """Stage timers of one input file, emitted as a single JSON record."""
+
+    def __init__(self, name):
+        self.name = name
+        self.stages = list()
+        self.extra = dict()
+        reset_peak_rss()
+        self.t0 = time.perf_counter()
+
+    def stage(self, stage, rows_in=None):
+        timer = StageTimer(stage, rows_in)
+        self.stages.append(timer)
+        return timer
+
+    def record(self):
+        # a stage run once per batch is reported once, with summed times and rows
+        merged = dict()
+        for s in self.stages:
+            if s.wall_s is None:
+                continue
+            m = merged.get(s.stage)
+            if m is None:
+                merged[s.stage] = m = StageTimer(s.stage)
+                m.wall_s, m.batches = 0., 0
+                m.rss_start_mb = s.rss_start_mb
+            m.wall_s += s.wall_s
+            m.batches += 1
+            m.rss_end_mb = s.rss_end_mb
+            if s.peak_rss_mb is not None:
+                m.peak_rss_mb = max(m.peak_rss_mb or 0., s.peak_rss_mb)
+            if s.rows_in is not None:
+                m.rows_in = (m.rows_in or 0) + s.rows_in
+            if s.rows_out is not None:
+                m.rows_out = (m.rows_out or 0) + s.rows_out
+        stages = [dict(m.record(), batches=m.batches) if m.batches > 1 else m.record() for m in merged.values()]
+        # stages restart the peak, so the file peak is the largest stage peak
+        peaks = [s.peak_rss_mb for s in self.stages if s.peak_rss_mb is not None] + [peak_rss_mb()]
+        peaks = [p for p in peaks if p is not None]
+        return dict(file=self.name, pid=os.getpid(), wall_s=round(time.perf_counter() - self.t0, 4),
+                    peak_rss_mb=_round(max(peaks)) if peaks else None, stages=stages, **self.extra)
+
+
+# metrics of the file this process is working on; pool workers take one file at a time
+_current = None
+
+
+def stage(name, rows_in=None):
+    """Timer for one stage of the current file:
+        with stage('flags', len(target)) as s:
+            ...
+            s.rows_out = len(out)
+    Outside file_metrics() the timing is measured but not reported.
+    """
+    if _current is None:
+        return StageTimer(name, rows_in)
+    return _current.stage(name, rows_in)
+
+
+@contextmanager
+def _profile(name):
+    mode = os.environ.get(profile_env, "").lower()
+    out_dir = os.environ.get(profile_dir_env, ".")
+    base = os.path.join(out_dir, f"{name.replace('/', '_').replace(' ', '_')}.{os.getpid()}")
+
+    if mode == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{base}.prof")
+
+    elif mode == "tracemalloc":
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            _current.extra['traced_peak_mb'] = round(peak / 2**20, 1)
+            with open(f"{base}.tracemalloc.txt", "w") as out:
+                for line in snapshot.statistics('lineno')[:tracemalloc_top]:
+                    out.write(f"{line}\n")
+
+    else:
+        yield
+
+
+@contextmanager
+def file_metrics(name):
+    """Collect the stage timers of one file and log them as one JSON record
+    at the end, instead of a log message per step."""
+    global _current
+    _current = Metrics(name)
+    try:
+        with _profile(name):
+            yield _current
+    finally:
+        logging.info(f"metrics {json.dumps(_current.record())}")
+        _current = None
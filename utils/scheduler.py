@@ -0,0 +1,145 @@
+import os
+import glob
+import json
+import logging
+import multiprocessing
+from contextlib import contextmanager
+from functools import partial
+
+from utils.shared import publish, init_worker
+
+
+def product_files(f):
+    """All files of the input `f` stands for: every date/hour partition of a
+    Parquet product (see storage.list_products()), or `f` itself."""
+    parts = f.split(os.sep)
+    if f.endswith('.parquet') and len(parts) >= 3 and parts[-2].startswith('hour=') and parts[-3].startswith('date='):
+        return sorted(glob.glob(os.path.join(os.sep.join(parts[:-3]), 'date=*', 'hour=*', parts[-1])))
+    return [f]
+
+
+def order_by_size(file_list, sizes=None):
+    """Largest input first, so a single big day file starts early
+    instead of stalling the tail of the run. `sizes` maps inputs to their
+    size when they were already stat'ed."""
+    if sizes is None:
+        sizes = {f: sum(os.path.getsize(p) for p in product_files(f)) for f in file_list}
+    return sorted(file_list, key=lambda f: sizes[f], reverse=True)
+
+
+@contextmanager
+def atomic_write(path):
+    """Yield a temporary path next to `path` and move it into place on success.
+    Readers never see a partially written output, and a crashed worker
+    leaves no file that would look complete on the next run.
+    """
+    dirname, basename = os.path.split(path)
+    tmp = os.path.join(dirname, f".{basename}.{os.getpid()}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class Manifest:
+    """Completed work, keyed on the input path with its size and mtime.
+    An input is up to date when it has not changed since it was processed
+    and all recorded outputs still exist.
+    Entries live in the JSON file `path`; record() only appends one JSON
+    line per input to the journal `{path}.log`, which is folded into the
+    JSON file when the manifest is loaded again or saved.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.journal = f"{path}.log"
+        self.entries = dict()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+        if os.path.exists(self.journal):
+            with open(self.journal) as journal:
+                for line in journal:
+                    try:
+                        f, entry = json.loads(line)
+                    except ValueError:
+                        # last line cut short by a crash
+                        continue
+                    self.entries[f] = entry
+            self.save()
+
+    @staticmethod
+    def stat(f):
+        """Size and mtime of an input; for a Parquet product the total size,
+        the latest mtime and the number of its partitions."""
+        files = product_files(f)
+        if files == [f]:
+            st = os.stat(f)
+            return {"size": st.st_size, "mtime": st.st_mtime}
+        stats = [os.stat(p) for p in files]
+        return {"size": sum(st.st_size for st in stats), "mtime": max(st.st_mtime for st in stats),
+                "parts": len(stats)}
+
+    def is_done(self, f, st=None):
+        entry = self.entries.get(f)
+        if entry is None or not os.path.exists(f):
+            return False
+        st = self.stat(f) if st is None else st
+        if {k: entry.get(k) for k in st} != st:
+            return False
+        return all(os.path.exists(out) for out in entry["outputs"])
+
+    def record(self, f, outputs, st=None):
+        """Record `f` as done. `st` is its stat() from before it was
+        processed; an input that grew meanwhile then counts as changed
+        and is processed again."""
+        if isinstance(outputs, str):
+            outputs = [outputs]
+        entry = dict(self.stat(f) if st is None else st, outputs=list(outputs))
+        self.entries[f] = entry
+        with open(self.journal, "a") as out:
+            out.write(json.dumps([f, entry]) + "\n")
+
+    def save(self):
+        """Write all entries to the JSON file and drop the journal."""
+        with atomic_write(self.path) as tmp:
+            with open(tmp, "w") as out:
+                json.dump(self.entries, out, indent=1)
+        if os.path.exists(self.journal):
+            os.remove(self.journal)
+
+
+def _call(func, task):
+    f, st = task
+    return f, st, func(f)
+
+
+def run_pool(func, file_list, num_core, manifest_path, initializer=None, initargs=(), shared=None):
+    """Run `func` over `file_list` on a process pool.
+    Files are dispatched one at a time, largest first, and each result is
+    recorded in the manifest as soon as it arrives. `func` returns the
+    output path(s) it wrote, or None on failure; failed inputs are retried
+    on the next run. `shared` ({table: {key: array}}) is placed in shared
+    memory once and attached by every worker (see utils.shared).
+    """
+    manifest = Manifest(manifest_path)
+    # stat once, before any worker starts; that is what gets recorded
+    stats = {f: manifest.stat(f) for f in file_list}
+    todo = [f for f in order_by_size(file_list, {f: st['size'] for f, st in stats.items()})
+            if not manifest.is_done(f, stats[f])]
+    logging.info(f"Scheduler: {len(file_list)} files, {len(file_list) - len(todo)} up to date, {len(todo)} to run")
+
+    n_fail = 0
+    with publish(shared or dict()) as spec, \
+            multiprocessing.Pool(num_core, init_worker, (spec, initializer, initargs)) as pool:
+        tasks = [(f, stats[f]) for f in todo]
+        for k, (f, st, outputs) in enumerate(pool.imap_unordered(partial(_call, func), tasks, chunksize=1)):
+            if outputs:
+                manifest.record(f, outputs, st)
+            else:
+                n_fail += 1
+            logging.info(f"Scheduler: {k + 1}/{len(todo)} done, {n_fail} failed, last {f}")
+    manifest.save()
+    return n_fail
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+# Declared dtypes of the pipeline DataFrames, enforced at each stage boundary.
+# ICAO addresses are uint32 inside decode() and a categorical hex string in
+# the products; nullable UInt8 keeps the None of typecode()/oe_flag().
+# Frames are two uint64 words (frame_words()); a 56-bit frame sits in the
+# low word with `short` set.
+RAW = {
+    'time': 'datetime64[ns]',
+    'hi': 'uint64',
+    'lo': 'uint64',
+    'short': 'bool',
+}
+
+FLAGS = {
+    'df': 'uint8',
+    'tc': 'UInt8',
+    'oe': 'UInt8',
+    'acid': 'uint32',
+    'is50': 'boolean',
+    'is60': 'boolean',
+    'bds': 'uint8',
+}
+
+POSITION = {
+    'time': 'datetime64[ns]',
+    'acid': 'uint32',
+    'lat': 'float64',
+    'lon': 'float64',
+    'alt': 'float32',
+}
+
+BDS50 = {
+    'time': 'datetime64[ns]',
+    'acid': 'uint32',
+    'alt': 'float32',
+    'tta': 'float32',
+    'gspd': 'float32',
+    'tas': 'float32',
+    'roll': 'float32',
+}
+
+BDS60 = {
+    'time': 'datetime64[ns]',
+    'acid': 'uint32',
+    'alt': 'float32',
+    'mhed': 'float32',
+    'ias': 'float32',
+    'mach': 'float32',
+    'vr': 'float32',
+}
+
+MERGED = {
+    'time': 'datetime64[ns]',
+    'acid': 'category',
+    'lat': 'float64',
+    'lon': 'float64',
+    'alt': 'float32',
+    'alt_x': 'float32',
+    'alt_y': 'float32',
+    'tta': 'float32',
+    'gspd': 'float32',
+    'tas': 'float32',
+    'roll': 'float32',
+    'mhed': 'float32',
+    'ias': 'float32',
+    'mach': 'float32',
+    'vr': 'float32',
+    'wspd': 'float32',
+    'wdir': 'float32',
+    'sat': 'float32',
+}
+
+METEO = {
+    'time': 'datetime64[ns]',
+    'acid': 'category',
+    'bds': 'uint8',
+    'lat': 'float64',
+    'lon': 'float64',
+    'alt': 'float32',
+    'wspd': 'float32',
+    'wdir': 'float32',
+    'temp': 'float32',
+    'pres': 'float32',
+    'hum': 'float32',
+    'turb': 'float32',
+    'ws': 'float32',
+    'mb': 'float32',
+    'ic': 'float32',
+    'wv': 'float32',
+    'rh': 'float32',
+}
+
+QC = {k: v for k, v in MERGED.items() if k not in ('alt_x', 'alt_y')}
+
+EDR2 = dict(QC, **{k: 'float32' for k in
+                   ('U', 'V', 'dU', 'dV', 'TKE', 'EDR1', 'EDR2_u', 'EDR2_v', 'EDR2_mean')})
+
+JERK = dict(QC, **{k: 'float32' for k in ('dt', 'dvr', 'vr_acc', 'vr_jerk')})
+
+
+def enforce(df, schema):
+    """Cast the columns of `df` that appear in `schema` to their declared dtype.
+    A uint32 acid is written back as its 6 hex digit address when the schema
+    asks for a categorical one; any other acid is taken to be the address
+    already, so an all-digit one such as 718123 must be read as a string.
+    """
+    casts = dict()
+    for col, dtype in schema.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if col == 'acid' and dtype == 'category' and df[col].dtype == np.uint32:
+            df = df.assign(acid=acid2hex(df[col]))
+            continue
+        if col == 'acid' and dtype == 'uint32' and df[col].dtype == object:
+            df = df.assign(acid=hex2acid(df[col]))
+            continue
+        casts[col] = dtype
+    if casts:
+        df = df.astype(casts)
+    return df
+
+
+def hex2acid(s):
+    """ICAO address from hex string to uint32."""
+    return s.map(lambda x: int(x, 16)).astype(np.uint32)
+
+
+def acid2hex(s):
+    """ICAO address from uint32 to a categorical 6 hex digit string."""
+    codes, uniques = pd.factorize(s)
+    return pd.Categorical.from_codes(codes, ["%06X" % u for u in uniques])
+
+
+def frame_words(code):
+    """Split 112-bit frames (28 hex digits) into two uint64 words.
+    The high word holds the first 48 bits, the low word the last 64 bits.
+    """
+    raw = np.asarray(code, dtype='S28')
+    b = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(-1, 28)
+    nib = np.where(b >= ord('A'), (b | 0x20) - (ord('a') - 10), b - ord('0')).astype(np.uint64)
+    shift = np.arange(60, -4, -4, dtype=np.uint64)
+    hi = (nib[:, :12] << shift[4:]).sum(axis=1, dtype=np.uint64)
+    lo = (nib[:, 12:] << shift).sum(axis=1, dtype=np.uint64)
+    return hi, lo
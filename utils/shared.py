@@ -0,0 +1,70 @@
+import logging
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Large read-only tables broadcast to pool workers. The parent copies each
+# array once into a shared memory segment; workers attach in the pool
+# initializer and get read-only NumPy views of the same pages, so memory
+# stays flat as the number of workers grows.
+
+# arrays attached in this process, table -> {key: array}
+_tables = dict()
+# open segments, kept alive as long as the views into them
+_segments = list()
+
+
+@contextmanager
+def publish(tables):
+    """Copy `tables` ({table: {key: array}}) into shared memory for the
+    duration of the block and yield the spec that attach() takes. The
+    segments are unlinked on exit.
+    """
+    segments = list()
+    spec = dict()
+    try:
+        for table, arrays in tables.items():
+            spec[table] = dict()
+            for key, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                segments.append(shm)
+                np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+                spec[table][key] = (shm.name, array.shape, array.dtype.str)
+        if spec:
+            size = sum(shm.size for shm in segments)
+            logging.info(f"Shared tables: {', '.join(spec)} ({size / 2 ** 20:.1f} MiB)")
+        yield spec
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+
+
+def attach(spec):
+    """Map the tables of `spec` (from publish()) into this process."""
+    for table, arrays in spec.items():
+        views = dict()
+        for key, (name, shape, dtype) in arrays.items():
+            shm = shared_memory.SharedMemory(name=name)
+            _segments.append(shm)
+            view = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+            view.flags.writeable = False
+            views[key] = view
+        _tables[table] = views
+
+
+def lookup(table):
+    """Arrays of a shared table as {key: array}, None when not attached."""
+    return _tables.get(table)
+
+
+def init_worker(spec, initializer=None, initargs=()):
+    """Pool initializer: run `initializer` (usually the logging set-up), then
+    attach the shared tables."""
+    if initializer is not None:
+        initializer(*initargs)
+    attach(spec)
+    if spec:
+        logging.debug(f"Attached shared tables: {', '.join(spec)}")
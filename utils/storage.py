@@ -0,0 +1,252 @@
+import io
+import os
+import glob
+
+import numpy as np
+import pandas as pd
+
+from utils.scheduler import atomic_write
+
+# Columns kept at full width in columnar output; other float columns go to float32.
+wide_cols = ('lat', 'lon')
+compression = 'zstd'
+
+
+def compact(df):
+    """Explicit compact dtypes for columnar output."""
+    out = df.copy()
+    for col in out.columns:
+        if col in wide_cols:
+            continue
+        if out[col].dtype == np.float64:
+            out[col] = out[col].astype(np.float32)
+        elif col == 'acid':
+            out[col] = out[col].astype(str)
+    return out
+
+
+def partition_dir(root, date, hour):
+    return f"{root}/date={date}/hour={hour:02d}"
+
+
+def write_parquet(df, root, name):
+    """Write `df` as one compressed Parquet file per date/hour partition:
+    {root}/date=YYYY-MM-DD/hour=HH/{name}.parquet
+    Partitions of `name` left by an earlier write and not rewritten are
+    removed afterwards, so a rewrite leaves no stale hours.
+    Returns the list of files written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = compact(df)
+    out_files = list()
+    times = pd.to_datetime(df['time'])
+    for (date, hour), part in df.groupby([times.dt.strftime('%Y-%m-%d'), times.dt.hour]):
+        part_dir = partition_dir(root, date, hour)
+        os.makedirs(part_dir, exist_ok=True)
+        out_file = f"{part_dir}/{name}.parquet"
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        with atomic_write(out_file) as tmp:
+            pq.write_table(table, tmp, compression=compression)
+        out_files.append(out_file)
+
+    written = set(out_files)
+    for old in glob.glob(f"{root}/date=*/hour=*/{name}.parquet"):
+        if old not in written:
+            os.remove(old)
+            for d in (os.path.dirname(old), os.path.dirname(os.path.dirname(old))):
+                if not os.listdir(d):
+                    os.rmdir(d)
+    return out_files
+
+
+def write_product(df, out_file, fmt='csv'):
+    """Write a product either as the original CSV file or, for fmt='parquet',
+    as date/hour partitions in the same directory named after `out_file`.
+    Returns the list of files written.
+    """
+    if fmt == 'csv':
+        with atomic_write(out_file) as tmp:
+            df.to_csv(tmp)
+        return [out_file]
+    elif fmt == 'parquet':
+        root, filename = os.path.split(out_file)
+        return write_parquet(df, root, os.path.splitext(filename)[0])
+    else:
+        raise ValueError(f"Unknown output format: {fmt}")
+
+
+def append_partitions(df, root, name, fmt='csv', committed=None):
+    """Append `df` to the date/hour partitions of product `name`:
+    {root}/date=YYYY-MM-DD/hour=HH/{name}.csv (or .parquet)
+    `committed` maps partition files to the size they had after the last
+    successful append (bytes for CSV, rows for Parquet). Anything past that
+    was left by an interrupted run and is dropped before appending, so a
+    rerun from the same checkpoint does not duplicate rows.
+    Returns:
+        dict: the updated `committed` sizes
+    """
+    committed = dict(committed or dict())
+    times = pd.to_datetime(df['time'])
+    for (date, hour), part in df.groupby([times.dt.strftime('%Y-%m-%d'), times.dt.hour]):
+        part_dir = partition_dir(root, date, hour)
+        os.makedirs(part_dir, exist_ok=True)
+        out_file = f"{part_dir}/{name}.{fmt}"
+        size = committed.get(out_file, 0)
+
+        if fmt == 'csv':
+            if os.path.exists(out_file) and os.path.getsize(out_file) != size:
+                os.truncate(out_file, size)
+            with open(out_file, 'a') as out:
+                part.to_csv(out, header=size == 0)
+            committed[out_file] = os.path.getsize(out_file)
+
+        elif fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            part = compact(part)
+            if size > 0:
+                old = pq.read_table(out_file).slice(0, size).to_pandas()
+                part = pd.concat([old, part], ignore_index=True)
+            with atomic_write(out_file) as tmp:
+                pq.write_table(pa.Table.from_pandas(part, preserve_index=False), tmp, compression=compression)
+            committed[out_file] = len(part)
+
+        else:
+            raise ValueError(f"Unknown output format: {fmt}")
+    return committed
+
+
+def row_offsets(path):
+    """Byte offset of each data row of a CSV file with one header line,
+    then the end of the file."""
+    buf = np.fromfile(path, dtype=np.uint8)
+    return np.flatnonzero(buf == ord('\n')) + 1
+
+
+def read_ranges(path, ranges, fmt='csv'):
+    """Rows of a product file in the given ranges, byte ranges of data rows
+    for CSV and row ranges for Parquet, in the order given."""
+    if fmt == 'csv':
+        with open(path, 'rb') as f:
+            parts = [f.readline()]
+            for start, end in ranges:
+                f.seek(start)
+                parts.append(f.read(end - start))
+        # dtypes are inferred from the selected rows only, so keep addresses
+        # such as 000E10 or 718123 from being read as numbers
+        return pd.read_csv(io.BytesIO(b''.join(parts)), index_col=0, dtype={'acid': str})
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        return pd.concat([table.slice(start, end - start).to_pandas() for start, end in ranges], ignore_index=True)
+    else:
+        raise ValueError(f"Unknown output format: {fmt}")
+
+
+def product_name(f):
+    """Product name of a CSV file or of one of its Parquet partitions."""
+    return os.path.splitext(os.path.basename(f))[0]
+
+
+def list_products(root, pattern='*', fmt='csv', ext='csv'):
+    """One representative path per product, in the form the workers expect."""
+    if fmt == 'csv':
+        return glob.glob(f"{root}/{pattern}.{ext}")
+    files = sorted(glob.glob(f"{root}/date=*/hour=*/{pattern}.parquet"))
+    first = dict()
+    for f in files:
+        first.setdefault(product_name(f), f)
+    return list(first.values())
+
+
+def _filter_expression(time_range=None, acid=None, bbox=None):
+    import pyarrow.dataset as ds
+
+    expr = None
+    conds = list()
+    if time_range is not None:
+        t0, t1 = pd.Timestamp(time_range[0]), pd.Timestamp(time_range[1])
+        # partition pruning first, then the row-level filter
+        conds.append(ds.field('date') >= t0.strftime('%Y-%m-%d'))
+        conds.append(ds.field('date') <= t1.strftime('%Y-%m-%d'))
+        conds.append(ds.field('time') >= t0)
+        conds.append(ds.field('time') <= t1)
+    if acid is not None:
+        acid = [acid] if isinstance(acid, str) else list(acid)
+        conds.append(ds.field('acid').isin(acid))
+    if bbox is not None:
+        lon0, lat0, lon1, lat1 = bbox
+        conds.append((ds.field('lon') >= lon0) & (ds.field('lon') <= lon1))
+        conds.append((ds.field('lat') >= lat0) & (ds.field('lat') <= lat1))
+    for c in conds:
+        expr = c if expr is None else expr & c
+    return expr
+
+
+def _filter_frame(df, time_range=None, acid=None, bbox=None):
+    if time_range is None and acid is None and bbox is None:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    if time_range is not None:
+        mask &= (df['time'] >= pd.Timestamp(time_range[0])) & (df['time'] <= pd.Timestamp(time_range[1]))
+    if acid is not None:
+        acid = [acid] if isinstance(acid, str) else list(acid)
+        mask &= df['acid'].isin(acid)
+    if bbox is not None:
+        lon0, lat0, lon1, lat1 = bbox
+        mask &= (df['lon'] >= lon0) & (df['lon'] <= lon1) & (df['lat'] >= lat0) & (df['lat'] <= lat1)
+    return df[mask]
+
+
+def read_product(path, fmt='csv', name=None, columns=None, time_range=None, acid=None, bbox=None):
+    """Read a product with column projection and row filters.
+    Args:
+        path (str): CSV file, or the Parquet root directory
+        fmt (str): 'csv' or 'parquet'
+        name (str): only read partitions of this product name (Parquet)
+        columns (list): columns to load, None for all
+        time_range (tuple): (t0, t1) inclusive
+        acid (str or list): aircraft address(es)
+        bbox (tuple): (lon0, lat0, lon1, lat1)
+    Returns:
+        pd.DataFrame with a datetime64 'time' column
+    For Parquet the filters are pushed down to partition and row-group
+    level; CSV is filtered after loading.
+    """
+    filter_cols = [c for c, v in (('time', time_range), ('acid', acid), ('lat', bbox), ('lon', bbox))
+                   if v is not None]
+    load_cols = None if columns is None else list(dict.fromkeys(list(columns) + filter_cols))
+
+    if fmt == 'csv':
+        if load_cols is None:
+            df = pd.read_csv(path, index_col=0, dtype={'acid': str})
+        else:
+            df = pd.read_csv(path, index_col=0, dtype={'acid': str},
+                             usecols=lambda c: c in load_cols or c.startswith('Unnamed'))
+        if 'time' in df.columns:
+            df['time'] = pd.to_datetime(df['time'])
+        df = _filter_frame(df, time_range, acid, bbox)
+
+    elif fmt == 'parquet':
+        import pyarrow.dataset as ds
+
+        # CSV products may share the directory, so list the partitions explicitly
+        source = sorted(glob.glob(f"{path}/date=*/hour=*/{name or '*'}.parquet"))
+        dataset = ds.dataset(source, format='parquet', partitioning='hive', partition_base_dir=path)
+        table = dataset.to_table(columns=load_cols, filter=_filter_expression(time_range, acid, bbox))
+        df = table.to_pandas()
+        df = df.drop(columns=[c for c in ('date', 'hour') if c in df.columns and
+                              (columns is None or c not in columns)])
+        if 'time' in df.columns:
+            df = df.sort_values('time', kind='stable').reset_index(drop=True)
+
+    else:
+        raise ValueError(f"Unknown output format: {fmt}")
+
+    if columns is not None:
+        df = df[list(columns)]
+    return df
@@ -0,0 +1,94 @@
+import time
+
+
+def parse_raw(line):
+    """'timestamp hexframe' line of the raw DF files, timestamp in milliseconds.
+    Returns:
+        (float, str): time in seconds and the upper case frame, or None
+    """
+    parts = line.split()
+    if len(parts) != 2:
+        return None
+    try:
+        return int(parts[0]) / 1000., parts[1].upper()
+    except ValueError:
+        return None
+
+
+def parse_avr(line):
+    """AVR frame '*8D...;' or '@<12 hex digit MLAT clock>8D...;'.
+    AVR has no wall clock, so the receive time is used.
+    """
+    line = line.strip()
+    if len(line) < 3 or line[-1] != ';':
+        return None
+    if line[0] == '*':
+        msg = line[1:-1]
+    elif line[0] == '@':
+        msg = line[13:-1]
+    else:
+        return None
+    return time.time(), msg.upper()
+
+
+line_parsers = {
+    'raw': parse_raw,
+    'avr': parse_avr,
+}
+
+
+class BeastDecoder:
+    """Incremental decoder of the Beast binary format.
+    Frames are <esc> <type> <6 byte MLAT clock> <1 byte signal> <payload>,
+    with every 0x1a inside a frame doubled. Only Mode-S long frames
+    (type '3', 14 byte payload) are returned.
+    """
+    ESC = 0x1a
+    payload_len = {0x31: 2, 0x32: 7, 0x33: 14}
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """Add received bytes and return the list of complete (time, frame) pairs."""
+        self.buffer.extend(data)
+        frames = list()
+        buf = self.buffer
+        i = 0
+        while True:
+            start = buf.find(self.ESC, i)
+            if start < 0 or start + 1 >= len(buf):
+                i = len(buf) if start < 0 else start
+                break
+            ftype = buf[start + 1]
+            if ftype not in self.payload_len:
+                i = start + 1
+                continue
+
+            # unescape until the frame is complete
+            need = 7 + self.payload_len[ftype]
+            body = bytearray()
+            j = start + 2
+            while len(body) < need and j < len(buf):
+                b = buf[j]
+                if b == self.ESC:
+                    if j + 1 >= len(buf):
+                        break
+                    if buf[j + 1] != self.ESC:
+                        # frame cut short by a new frame
+                        break
+                    j += 1
+                body.append(b)
+                j += 1
+            if len(body) < need:
+                if j >= len(buf) - 1:
+                    i = start
+                    break
+                i = j
+                continue
+
+            if ftype == 0x33:
+                frames.append((time.time(), body[7:].hex().upper()))
+            i = j
+        del buf[:i]
+        return frames
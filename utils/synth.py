@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+
+from utils.common import crc
+from utils.position import cprNL
+from utils.air import tas2mach, mach2cas, temperature
+from utils.constants import kts, ft
+
+
+def _bits(value, width):
+    return format(int(value) & ((1 << width) - 1), f"0{width}b")
+
+
+def _to_hex(binstr):
+    return "%0*X" % (len(binstr) // 4, int(binstr, 2))
+
+
+def cpr_encode(lat, lon, odd):
+    """Airborne CPR encoding of a position.
+    Returns:
+        (int, int): 17-bit encoded latitude and longitude
+    """
+    i = 1 if odd else 0
+    d_lat = 360. / (60 - i)
+    yz = int(np.floor(131072 * (lat % d_lat) / d_lat + 0.5))
+    r_lat = d_lat * (yz / 131072 + np.floor(lat / d_lat))
+    ni = max(cprNL(r_lat) - i, 1)
+    d_lon = 360. / ni
+    xz = int(np.floor(131072 * (lon % d_lon) / d_lon + 0.5))
+    return yz & 0x1FFFF, xz & 0x1FFFF
+
+
+def encode_alt12(alt):
+    """12-bit ADS-B altitude with the Q bit set (25 ft steps)."""
+    n = _bits(round((alt + 1000) / 25), 11)
+    return n[:7] + "1" + n[7:]
+
+
+def encode_alt13(alt):
+    """13-bit Mode-S altitude code with M=0 and Q=1 (25 ft steps)."""
+    n = _bits(round((alt + 1000) / 25), 11)
+    return n[:6] + "0" + n[6] + "1" + n[7:]
+
+
+def with_parity(binstr, addr=None):
+    """Append the 24-bit parity to an 88-bit frame.
+    Without `addr` the parity is the plain CRC (DF17); with it, the CRC is
+    overlaid with the address as in the AP field of DF20/21.
+    """
+    msg = _to_hex(binstr) + "000000"
+    parity = crc(msg, encode=True)
+    if addr is not None:
+        parity ^= int(addr, 16)
+    return msg[:-6] + "%06X" % parity
+
+
+def df17_position(addr, lat, lon, alt, odd, tc=11):
+    yz, xz = cpr_encode(lat, lon, odd)
+    me = _bits(tc, 5) + "00" + "0" + encode_alt12(alt) + "0" + str(int(odd)) + _bits(yz, 17) + _bits(xz, 17)
+    return with_parity(_bits(17, 5) + _bits(5, 3) + _bits(int(addr, 16), 24) + me)
+
+
+def df17_velocity(addr, gs_u, gs_v, vr=0):
+    """TC 19 subtype 1 airborne velocity with the ground vector in knots."""
+    me = (_bits(19, 5) + _bits(1, 3) + "00" + "000" +
+          ("1" if gs_u < 0 else "0") + _bits(round(abs(gs_u)) + 1, 10) +
+          ("1" if gs_v < 0 else "0") + _bits(round(abs(gs_v)) + 1, 10) +
+          "1" + ("1" if vr < 0 else "0") + _bits(round(abs(vr) / 64) + 1, 9) + "00" + "0" * 8)
+    return with_parity(_bits(17, 5) + _bits(5, 3) + _bits(int(addr, 16), 24) + me)
+
+
+def _signed(value, width):
+    return ("1" if value < 0 else "0") + _bits(value, width)
+
+
+def bds50_mb(roll, trk, gs, rtrk, tas):
+    trk = trk - 360 if trk > 180 else trk
+    return ("1" + _signed(round(roll * 256 / 45), 9) +
+            "1" + _signed(round(trk * 512 / 90), 10) +
+            "1" + _bits(round(gs / 2), 10) +
+            "1" + _signed(round(rtrk * 256 / 8), 9) +
+            "1" + _bits(round(tas / 2), 10))
+
+
+def bds60_mb(hdg, ias, mach, vr_baro, vr_ins):
+    hdg = hdg - 360 if hdg > 180 else hdg
+    return ("1" + _signed(round(hdg * 512 / 90), 10) +
+            "1" + _bits(round(ias), 10) +
+            "1" + _bits(round(mach * 512 / 2.048), 10) +
+            "1" + _signed(round(vr_baro / 32), 9) +
+            "1" + _signed(round(vr_ins / 32), 9))
+
+
+def bds44_mb(wspd, wdir, temp, p=None, hum=None):
+    """MRAR with wind (knots, direction from), temperature (C), pressure (hPa)
+    and humidity (%); the source field says INS."""
+    return (_bits(1, 4) +
+            "1" + _bits(round(wspd), 9) + _bits(round(wdir % 360 * 256 / 180) % 512, 9) +
+            _signed(round(temp * 4), 10) +
+            ("0" + "0" * 11 if p is None else "1" + _bits(round(p), 11)) +
+            "0" + "00" +
+            ("0" + "0" * 6 if hum is None else "1" + _bits(round(hum * 64 / 100), 6)))
+
+
+def commb_reply(addr, mb, alt=None):
+    """DF20 (with altitude) or DF21 (alt None) reply carrying `mb`."""
+    if alt is None:
+        head = _bits(21, 5) + "000" + "00000" + "000000" + "0" * 13
+    else:
+        head = _bits(20, 5) + "000" + "00000" + "000000" + encode_alt13(alt)
+    return with_parity(head + mb, addr)
+
+
+def noise_frame(rng):
+    return "".join(rng.choice(list("0123456789ABCDEF"), 28))
+
+
+def flip_bit(msg, bit):
+    """Flip one bit (0 = first) of a hex frame."""
+    n = len(msg) * 4
+    return "%0*X" % (len(msg), int(msg, 16) ^ (1 << (n - 1 - bit)))
+
+
+def tracks(n_aircraft, duration, seed=0, wind=(20., 10.), bbox=(120, 30, 135, 40)):
+    """Straight constant-speed tracks flying through a uniform wind.
+    Args:
+        n_aircraft (int): number of aircraft
+        duration (float): seconds
+        wind (tuple): (u, v) wind in knots, blowing towards east and north
+        bbox (tuple): (lon0, lat0, lon1, lat1) of the start positions
+    Returns:
+        pd.DataFrame: one row per aircraft with the track parameters
+    """
+    rng = np.random.default_rng(seed)
+    addrs = set()
+    while len(addrs) < n_aircraft:
+        addrs.add("%06X" % rng.integers(0x700000, 0x7FFFFF))
+    heading = rng.uniform(0, 360, n_aircraft)
+    tas = rng.uniform(380, 480, n_aircraft)
+    gs_u = tas * np.sin(np.radians(heading)) + wind[0]
+    gs_v = tas * np.cos(np.radians(heading)) + wind[1]
+    return pd.DataFrame({
+        'acid': sorted(addrs),
+        'lat0': rng.uniform(bbox[1], bbox[3], n_aircraft),
+        'lon0': rng.uniform(bbox[0], bbox[2], n_aircraft),
+        'alt': np.round(rng.uniform(20000, 40000, n_aircraft) / 25) * 25,
+        'heading': heading,
+        'tas': tas,
+        'gs_u': gs_u,
+        'gs_v': gs_v,
+        'start': np.floor(rng.uniform(0, duration / 4, n_aircraft)),
+        'duration': duration,
+    })
+
+
+def generate(n_aircraft=50, duration=600., t0=1640995200000, seed=0, noise=0.05, bit_errors=0.,
+             wind=(20., 10.), declination=-8., velocity=False, meteo=False):
+    """Synthetic raw DF stream from known tracks.
+    Every aircraft sends an even and an odd DF17 position per second and a
+    BDS 5,0 and a BDS 6,0 reply inside the same 0.5 s time bucket, so
+    decode() pairs them into wind observations. The BDS 6,0 heading is magnetic,
+    offset by `declination` from the true heading.
+    Args:
+        noise (float): fraction of random frames added
+        bit_errors (float): fraction of valid frames with one flipped bit
+        velocity (bool): also send a TC 19 airborne velocity message per second
+        meteo (bool): also send a BDS 4,4 reply with the wind and the ISA
+            temperature every 10 s
+    Returns:
+        pd.DataFrame: columns time (unix ms) and code, sorted by time
+    """
+    rng = np.random.default_rng(seed)
+    rows = list()
+    for ac in tracks(n_aircraft, duration, seed, wind).itertuples():
+        for sec in np.arange(ac.start, ac.duration, 1.):
+            hours = sec / 3600.
+            lat = ac.lat0 + ac.gs_v * hours / 60.
+            lon = ac.lon0 + ac.gs_u * hours / 60. / np.cos(np.radians(lat))
+            trk = np.degrees(np.arctan2(ac.gs_u, ac.gs_v)) % 360
+            gs = np.hypot(ac.gs_u, ac.gs_v)
+            mach = tas2mach(ac.tas * kts, ac.alt * ft)
+            ias = mach2cas(mach, ac.alt * ft) / kts
+            base = t0 + int(sec * 1000)
+            if velocity:
+                rows.append((base + 30, df17_velocity(ac.acid, ac.gs_u, ac.gs_v)))
+            rows.append((base + 50, df17_position(ac.acid, lat, lon, ac.alt, odd=False)))
+            rows.append((base + 100, df17_position(ac.acid, lat, lon, ac.alt, odd=True)))
+            rows.append((base + 150, commb_reply(ac.acid, bds50_mb(0., trk, gs, 0., ac.tas), ac.alt)))
+            rows.append((base + 200, commb_reply(ac.acid, bds60_mb((ac.heading - declination) % 360,
+                                                                   ias, mach, 0, 0), ac.alt)))
+            if meteo and sec % 10 == 0:
+                wdir = np.degrees(np.arctan2(-wind[0], -wind[1])) % 360
+                temp = temperature(ac.alt * ft) - 273.15
+                rows.append((base + 250, commb_reply(ac.acid, bds44_mb(np.hypot(*wind), wdir, temp), ac.alt)))
+
+    frames = pd.DataFrame(rows, columns=['time', 'code'])
+    if bit_errors > 0:
+        pick = rng.random(len(frames)) < bit_errors
+        frames.loc[pick, 'code'] = [flip_bit(c, int(rng.integers(5, 112))) for c in frames.loc[pick, 'code']]
+    if noise > 0:
+        n_noise = int(len(frames) * noise)
+        noise_rows = pd.DataFrame({
+            'time': rng.integers(t0, t0 + int(duration * 1000), n_noise),
+            'code': [noise_frame(rng) for _ in range(n_noise)],
+        })
+        frames = pd.concat([frames, noise_rows])
+    return frames.sort_values('time', kind='stable').reset_index(drop=True)
+
+
+def write_raw(frames, path):
+    """Write frames in the 'timestamp hexframe' format of the raw DF files."""
+    frames[['time', 'code']].to_csv(path, sep=' ', header=False, index=False)
@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.storage import read_ranges
+from utils.trajectory import build_index, write_index, load_index
+
+# Space-time tile index of a product: one row per run of consecutive rows in
+# one lat/lon/level/hour tile, with the byte range (CSV) or row range
+# (Parquet) of the run and summary statistics. Written next to the product
+# in {root}/tiles/{name}.csv.
+tiles_dir = "tiles"
+tile_deg = 1.       # degrees of latitude and longitude
+level_ft = 5000.    # ft per level band
+
+
+def tile_keys(df):
+    """Tile of each row: lat and lon tile numbers, level band and hour."""
+    return pd.DataFrame({
+        'lat_i': np.floor(df['lat'].to_numpy(dtype=np.float64) / tile_deg).astype(np.int32),
+        'lon_i': np.floor(df['lon'].to_numpy(dtype=np.float64) / tile_deg).astype(np.int32),
+        'lev_i': np.floor(df['alt'].to_numpy(dtype=np.float64) / level_ft).astype(np.int32),
+        'hour': pd.to_datetime(df['time']).dt.floor('h').to_numpy(),
+    })
+
+
+def tile_segments(df):
+    """Runs of consecutive rows in one tile, with count, time span, altitude
+    range, mean and max wind speed and, for EDR products, the max EDR."""
+    keys = tile_keys(df)
+    change = np.zeros(len(df), dtype=bool)
+    for col in keys.columns:
+        k = keys[col].to_numpy()
+        change[1:] |= k[1:] != k[:-1]
+    keys['run'] = np.cumsum(change)
+    keys['row'] = np.arange(len(df))
+    keys['time'] = pd.to_datetime(df['time']).to_numpy()
+    keys['alt'] = df['alt'].to_numpy(dtype=np.float64)
+
+    aggs = dict(lat_i=('lat_i', 'first'), lon_i=('lon_i', 'first'), lev_i=('lev_i', 'first'),
+                hour=('hour', 'first'), first=('row', 'min'), rows=('row', 'size'),
+                t0=('time', 'min'), t1=('time', 'max'), alt0=('alt', 'min'), alt1=('alt', 'max'))
+    if 'wspd' in df.columns:
+        keys['wspd'] = df['wspd'].to_numpy(dtype=np.float64)
+        aggs.update(wspd_mean=('wspd', 'mean'), wspd_max=('wspd', 'max'))
+    if 'EDR2_mean' in df.columns:
+        keys['edr'] = df['EDR2_mean'].to_numpy(dtype=np.float64)
+        aggs.update(edr_max=('edr', 'max'))
+    return keys.groupby('run', sort=False).agg(**aggs).reset_index(drop=True)
+
+
+def write_tiles(df, out_files, root, name, fmt='csv'):
+    """Tile index of `df` as just written to `out_files`.
+    Returns:
+        int: number of index rows
+    """
+    index = build_index(df, out_files, fmt, segment=tile_segments)
+    write_index(index, root, name, tiles_dir)
+    return len(index)
+
+
+def load_tiles(root):
+    tiles = load_index(root, tiles_dir)
+    if len(tiles) == 0:
+        return tiles
+    for col in ('hour', 't0', 't1'):
+        tiles[col] = pd.to_datetime(tiles[col])
+    return tiles
+
+
+def select_tiles(root, bbox=None, alt_range=None, time_range=None):
+    """Index rows whose tile meets the bounding box (lon0, lat0, lon1, lat1),
+    the altitude band (ft) and the time range."""
+    tiles = load_tiles(root)
+    if len(tiles) == 0:
+        return tiles
+    sel = np.ones(len(tiles), dtype=bool)
+    if bbox is not None:
+        lon0, lat0, lon1, lat1 = bbox
+        sel &= ((tiles['lat_i'] + 1) * tile_deg >= lat0) & (tiles['lat_i'] * tile_deg <= lat1)
+        sel &= ((tiles['lon_i'] + 1) * tile_deg >= lon0) & (tiles['lon_i'] * tile_deg <= lon1)
+    if alt_range is not None:
+        sel &= (tiles['alt1'] >= alt_range[0]) & (tiles['alt0'] <= alt_range[1])
+    if time_range is not None:
+        sel &= (tiles['t1'] >= pd.Timestamp(time_range[0])) & (tiles['t0'] <= pd.Timestamp(time_range[1]))
+    return tiles[sel]
+
+
+def query(root, bbox=None, alt_range=None, time_range=None, fmt='csv', columns=None):
+    """Rows of the products under `root` inside the bounding box
+    (lon0, lat0, lon1, lat1), altitude band (ft) and time range, all
+    inclusive. Only the runs of the tiles that meet them are read.
+    Returns:
+        pd.DataFrame with a datetime64 'time' column
+    """
+    tiles = select_tiles(root, bbox, alt_range, time_range)
+    return read_tiles(root, tiles, bbox, alt_range, time_range, fmt, columns)
+
+
+def read_tiles(root, tiles, bbox=None, alt_range=None, time_range=None, fmt='csv', columns=None):
+    """Rows of the given select_tiles() index rows inside the bounding box,
+    altitude band and time range, as query()."""
+    frames = [read_ranges(os.path.join(root, file), list(zip(seg['start'], seg['end'])), fmt)
+              for file, seg in tiles.sort_values(['file', 'start']).groupby('file', sort=False)]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.concat(frames, ignore_index=True)
+    df['time'] = pd.to_datetime(df['time'])
+    mask = np.ones(len(df), dtype=bool)
+    if bbox is not None:
+        lon0, lat0, lon1, lat1 = bbox
+        mask &= (df['lon'] >= lon0) & (df['lon'] <= lon1) & (df['lat'] >= lat0) & (df['lat'] <= lat1)
+    if alt_range is not None:
+        mask &= (df['alt'] >= alt_range[0]) & (df['alt'] <= alt_range[1])
+    if time_range is not None:
+        mask &= (df['time'] >= pd.Timestamp(time_range[0])) & (df['time'] <= pd.Timestamp(time_range[1]))
+    df = df[mask].reset_index(drop=True)
+    return df if columns is None else df[list(columns)]
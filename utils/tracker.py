@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+
+from utils.common import df, typecode, icao
+from utils.position import oe_flag, altitude05, altcode, airborne_position, airborne_position_with_ref
+from utils.BDS50 import is50, roll50, trk50, gs50, tas50
+from utils.BDS60 import is60, hdg60, vr60ins, mach60, ias60
+from utils.air import tas2sat
+from utils.constants import kts
+from utils.declination import declination
+from utils.wind import calc_gspd_vector, calc_tas_vector, calc_wspd, calc_wdir
+from utils import vector
+
+# CRC of vector.crc and its single bit error syndromes, for one frame at a time
+_crc_table = vector.crc_table.tolist()
+_syndrome_bits = dict(zip(vector.syndromes.tolist(), vector.syndrome_bits.tolist()))
+
+
+def check_parity(msg, fix=True):
+    """Parity check of one DF17 frame, as vector.correct() does for arrays.
+    Returns:
+        str: the frame, with a single bit error fixed when `fix`, or None
+        when the parity fails
+    """
+    n = int(msg, 16)
+    rem = 0
+    for k in range(11):
+        byte = (n >> (104 - 8 * k)) & 0xFF
+        rem = ((rem << 8) & 0xFFFFFF) ^ _crc_table[((rem >> 16) ^ byte) & 0xFF]
+    syndrome = rem ^ (n & 0xFFFFFF)
+    if syndrome == 0:
+        return msg
+    bit = _syndrome_bits.get(syndrome) if fix else None
+    if bit is None:
+        return None
+    return "%028X" % (n ^ (1 << (112 - bit)))
+
+
+class AircraftState:
+    """Last CPR frames, position and Comm-B replies of one aircraft."""
+
+    def __init__(self):
+        self.cpr = [None, None]     # (t, msg, alt) of the last even and odd frame
+        self.position = None        # (t, lat, lon, alt)
+        self.bds50 = None           # (t, dict of fields)
+        self.bds60 = None           # (t, dict of fields)
+        self.declination = None     # (t, degrees) of the last lookup
+        self.last_seen = None
+
+
+class Tracker:
+    """Per-aircraft CPR and Comm-B state for message-by-message decoding.
+    Feed (time, message) pairs in time order with update(); a wind
+    observation is returned as soon as a position, a BDS 5,0 and a BDS 6,0
+    reply of the same aircraft fall within `time_window` seconds, which
+    mirrors the time bucket pairing of decode(). Fields and units are those
+    of the merged product (wind speed in knots). DF17 frames go through the
+    parity check of decode() first, so a corrupted one neither creates an
+    aircraft nor lets its address authorize Comm-B replies.
+    Args:
+        time_window (float): seconds allowed between the three parts of a wind observation
+        pair_window (float): seconds allowed between the even and odd CPR frames
+        ref_age (float): seconds a decoded position stays usable as local reference
+        max_age (float): seconds without messages before an aircraft is forgotten
+        parity (str): DF17 parity, "off", "check" or "correct" as in decode()
+        dec_age (float): seconds the declination of an aircraft is reused
+    """
+
+    def __init__(self, time_window=0.5, pair_window=10., ref_age=60., max_age=300., parity='correct',
+                 dec_age=60.):
+        self.time_window = time_window
+        self.pair_window = pair_window
+        self.ref_age = ref_age
+        self.max_age = max_age
+        self.parity = parity
+        self.dec_age = dec_age
+        self.aircraft = dict()
+        self.n_msg = 0
+        self.n_obs = 0
+        self._last_expire = None
+
+    def __len__(self):
+        return len(self.aircraft)
+
+    def update(self, t, msg):
+        """Decode one message received at `t` (seconds).
+        Returns:
+            dict: wind observation, or None
+        """
+        self.n_msg += 1
+        if len(msg) != 28:
+            return None
+
+        DF = df(msg)
+        if DF == 17:
+            if self.parity != 'off':
+                msg = check_parity(msg, fix=self.parity == 'correct')
+                if msg is None:
+                    return None
+            tc = typecode(msg)
+            if tc is None or tc < 9 or tc > 18:
+                return None
+            addr = icao(msg)
+            state = self._state(addr, t)
+            if not self._update_position(state, t, msg):
+                return None
+        elif DF in (20, 21):
+            addr = icao(msg)
+            if addr not in self.aircraft:
+                # Comm-B address is only trustworthy for aircraft already seen in ADS-B
+                return None
+            flag50, flag60 = is50(msg), is60(msg)
+            if flag50 == flag60:
+                return None
+            state = self._state(addr, t)
+            if flag50:
+                fields = dict(alt=altcode(msg), roll=roll50(msg), tta=trk50(msg), gspd=gs50(msg), tas=tas50(msg))
+                if fields['tta'] is None or fields['gspd'] is None or fields['tas'] is None:
+                    return None
+                state.bds50 = (t, fields)
+            else:
+                fields = dict(alt=altcode(msg), mhed=hdg60(msg), vr=vr60ins(msg), mach=mach60(msg), ias=ias60(msg))
+                if fields['mhed'] is None:
+                    return None
+                state.bds60 = (t, fields)
+        else:
+            return None
+
+        self._expire(t)
+        return self._observation(addr, state)
+
+    def _state(self, addr, t):
+        state = self.aircraft.get(addr)
+        if state is None:
+            state = AircraftState()
+            self.aircraft[addr] = state
+        state.last_seen = t
+        return state
+
+    def _update_position(self, state, t, msg):
+        oe = oe_flag(msg)
+        alt = altitude05(msg)
+        state.cpr[oe] = (t, msg, alt)
+
+        latlon = None
+        other = state.cpr[1 - oe]
+        if other is not None and t - other[0] <= self.pair_window and alt is not None and other[2] is not None \
+                and abs(alt - other[2]) < 50:
+            latlon = airborne_position(msg, other[1], t, other[0])
+        elif state.position is not None and t - state.position[0] <= self.ref_age and alt is not None:
+            latlon = airborne_position_with_ref(msg, state.position[1], state.position[2])
+
+        if latlon is None or alt is None:
+            return False
+        state.position = (t, latlon[0], latlon[1], alt)
+        return True
+
+    def _observation(self, addr, state):
+        if state.position is None or state.bds50 is None or state.bds60 is None:
+            return None
+        times = (state.position[0], state.bds50[0], state.bds60[0])
+        if max(times) - min(times) > self.time_window:
+            return None
+
+        t, lat, lon, alt = state.position
+        f50, f60 = state.bds50[1], state.bds60[1]
+        if state.declination is None or abs(t - state.declination[0]) > self.dec_age:
+            state.declination = (t, declination(lat, lon, pd.to_datetime(t, unit='s'))[0])
+        dec = state.declination[1]
+        u, v = calc_gspd_vector(f50['gspd'], f50['tta']) - calc_tas_vector(f50['tas'], f60['mhed'], dec)
+        u, v = np.atleast_1d(u).astype(float), np.atleast_1d(v).astype(float)
+        obs = dict(time=max(times), acid=addr, lat=lat, lon=lon, alt=alt,
+                   alt_x=f50['alt'], alt_y=f60['alt'],
+                   tta=f50['tta'], gspd=f50['gspd'], tas=f50['tas'], roll=f50['roll'],
+                   mhed=f60['mhed'], ias=f60['ias'], mach=f60['mach'], vr=f60['vr'],
+                   wspd=float(calc_wspd(u, v)[0]), wdir=float(calc_wdir(u, v)[0]),
+                   sat=float(tas2sat(f50['tas'] * kts, f60['mach']) - 273.15) if f60['mach'] else np.nan)
+
+        # each Comm-B reply contributes to one observation only
+        state.bds50 = None
+        state.bds60 = None
+        self.n_obs += 1
+        return obs
+
+    def _expire(self, t):
+        if self._last_expire is not None and t - self._last_expire < self.max_age / 10:
+            return
+        self._last_expire = t
+        stale = [addr for addr, state in self.aircraft.items() if t - state.last_seen > self.max_age]
+        for addr in stale:
+            del self.aircraft[addr]
+
+
+class KnownAircraft:
+    """ICAO addresses confirmed by a parity-checked DF11 or DF17 frame.
+    DF20/21 addresses are recovered from the AP field, so a corrupted reply
+    yields a random address; only replies from known addresses are worth
+    the BDS inference. With `ttl` (seconds) the set is rolling: an address
+    stays known for `ttl` after it was last confirmed. Without it, every
+    address seen stays known, which suits one file at a time.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = None if ttl is None else pd.Timedelta(seconds=ttl)
+        self.last_seen = pd.Series(dtype='datetime64[ns]', index=pd.Index([], dtype=np.uint32))
+
+    def __len__(self):
+        return len(self.last_seen)
+
+    def update(self, acid, time):
+        """Confirm addresses (uint32 array) seen at `time` (datetime array or scalar)."""
+        seen = pd.Series(time, index=pd.Index(acid, dtype=np.uint32)).groupby(level=0).max()
+        last = pd.concat([self.last_seen, seen]).groupby(level=0).max()
+        if self.ttl is not None and len(last) > 0:
+            last = last[last >= last.max() - self.ttl]
+        self.last_seen = last
+
+    def known(self, acid, time):
+        """Boolean mask of the addresses known at `time`."""
+        last = self.last_seen.reindex(pd.Index(acid, dtype=np.uint32)).to_numpy()
+        ok = ~pd.isna(last)
+        if self.ttl is not None:
+            ok &= (np.asarray(time) - last) <= self.ttl.to_timedelta64()
+        return ok
+
+
+class LastPositions:
+    """Last decoded position of each aircraft, the reference for local CPR
+    decoding of the messages that follow it, also across batches.
+    """
+
+    def __init__(self):
+        self.last = pd.DataFrame({'time': pd.Series(dtype='datetime64[ns]'), 'acid': pd.Series(dtype=np.uint32),
+                                  'lat': pd.Series(dtype=np.float64), 'lon': pd.Series(dtype=np.float64)})
+
+    def __len__(self):
+        return len(self.last)
+
+    def update(self, pos):
+        """Keep the latest row of each aircraft in `pos` (time, acid, lat, lon)."""
+        last = pd.concat([self.last, pos[['time', 'acid', 'lat', 'lon']]], ignore_index=True)
+        self.last = last.sort_values('time', kind='stable').groupby('acid').tail(1).reset_index(drop=True)
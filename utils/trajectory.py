@@ -0,0 +1,130 @@
+import os
+import glob
+
+import numpy as np
+import pandas as pd
+
+from utils.scheduler import atomic_write
+from utils.storage import row_offsets, read_ranges
+
+# Per-aircraft index of a product: one row per run of consecutive rows of one
+# aircraft in one file, with the byte range (CSV) or row range (Parquet) of
+# the run, its time span and bounding box. Written next to the product in
+# {root}/index/{name}.csv.
+index_dir = "index"
+INDEX_COLS = ['acid', 'file', 'start', 'end', 'rows', 't0', 't1', 'lat0', 'lat1', 'lon0', 'lon1']
+
+
+def segments(df):
+    """Runs of consecutive rows of one aircraft.
+    Returns:
+        pd.DataFrame: acid, first row, row count, time span and bounding box per run
+    """
+    acid = df['acid'].astype(str).to_numpy()
+    run = np.cumsum(np.r_[False, acid[1:] != acid[:-1]][:len(acid)])
+    frame = pd.DataFrame({'run': run, 'row': np.arange(len(df)), 'acid': acid,
+                          'time': pd.to_datetime(df['time']).to_numpy(),
+                          'lat': df['lat'].to_numpy(), 'lon': df['lon'].to_numpy()})
+    return frame.groupby('run', sort=False).agg(
+        acid=('acid', 'first'), first=('row', 'min'), rows=('row', 'size'),
+        t0=('time', 'min'), t1=('time', 'max'),
+        lat0=('lat', 'min'), lat1=('lat', 'max'), lon0=('lon', 'min'), lon1=('lon', 'max'),
+    ).reset_index(drop=True)
+
+
+def build_index(df, out_files, fmt='csv', segment=segments):
+    """Index of `df` as just written to `out_files` by write_product().
+    `segment` splits a frame into runs (see segments()); CSV runs are
+    located by byte range, Parquet runs by row range inside their date/hour
+    partition.
+    """
+    parts = list()
+    if fmt == 'csv':
+        seg = segment(df)
+        offsets = row_offsets(out_files[0])
+        seg['file'] = os.path.basename(out_files[0])
+        seg['start'] = offsets[seg['first']]
+        seg['end'] = offsets[seg['first'] + seg['rows']]
+        parts.append(seg)
+    elif fmt == 'parquet':
+        # {root}/date=YYYY-MM-DD/hour=HH/{name}.parquet, grouped and ordered as in write_parquet()
+        root = os.path.dirname(os.path.dirname(os.path.dirname(out_files[0])))
+        times = pd.to_datetime(df['time'])
+        files = iter(out_files)
+        for _, part in df.groupby([times.dt.strftime('%Y-%m-%d'), times.dt.hour]):
+            seg = segment(part)
+            seg['file'] = os.path.relpath(next(files), root)
+            seg['start'] = seg['first']
+            seg['end'] = seg['first'] + seg['rows']
+            parts.append(seg)
+    else:
+        raise ValueError(f"Unknown output format: {fmt}")
+    if not parts:
+        parts.append(segment(df.iloc[:0]).assign(file='', start=0, end=0))
+    index = pd.concat(parts, ignore_index=True)
+    # file and range take the place of the first row number
+    cols = list(index.columns[:-3])
+    i = cols.index('first')
+    cols[i:i + 1] = ['file', 'start', 'end']
+    return index[cols]
+
+
+def write_index(index, root, name, directory=index_dir):
+    os.makedirs(f"{root}/{directory}", exist_ok=True)
+    out_file = f"{root}/{directory}/{name}.csv"
+    with atomic_write(out_file) as tmp:
+        index.to_csv(tmp, index=False)
+    return out_file
+
+
+# index files already read by this process, path -> (mtime, index)
+_loaded = dict()
+
+
+def load_index(root, directory=index_dir):
+    """All index files under `root`, re-reading only those that changed."""
+    frames = list()
+    for path in sorted(glob.glob(f"{root}/{directory}/*.csv")):
+        mtime = os.path.getmtime(path)
+        cached = _loaded.get(path)
+        if cached is None or cached[0] != mtime:
+            index = pd.read_csv(path, dtype={'acid': str, 'file': str}, parse_dates=['t0', 't1'])
+            cached = _loaded[path] = (mtime, index)
+        frames.append(cached[1])
+    if not frames:
+        return pd.DataFrame(columns=INDEX_COLS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_trajectory(acid, t0=None, t1=None, root=".", fmt='csv', columns=None):
+    """Rows of one aircraft between t0 and t1 (inclusive), read through the
+    index so that only the runs of that aircraft are loaded.
+    Args:
+        acid (str): 6 hex digit ICAO address
+        t0, t1: time bounds, None for open
+        root (str): product directory holding the index
+        fmt (str): 'csv' or 'parquet'
+        columns (list): columns to return, None for all
+    Returns:
+        pd.DataFrame sorted by time
+    """
+    index = load_index(root)
+    sel = index['acid'] == acid.upper()
+    if t0 is not None:
+        sel &= index['t1'] >= pd.Timestamp(t0)
+    if t1 is not None:
+        sel &= index['t0'] <= pd.Timestamp(t1)
+
+    frames = [read_ranges(os.path.join(root, file), list(zip(seg['start'], seg['end'])), fmt)
+              for file, seg in index[sel].groupby('file', sort=False)]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.concat(frames, ignore_index=True)
+    df['time'] = pd.to_datetime(df['time'])
+    if t0 is not None:
+        df = df[df['time'] >= pd.Timestamp(t0)]
+    if t1 is not None:
+        df = df[df['time'] <= pd.Timestamp(t1)]
+    df = df.sort_values('time', kind='stable').reset_index(drop=True)
+    return df if columns is None else df[list(columns)]
@@ -1,5 +1,4 @@
 import numpy as np
-import netCDF4 as nc4
 import pandas as pd
 
 
@@ -8,6 +7,8 @@ def round_by_step(x, step):
 
 
 def read_AMDAR_to_df(f):
+    import netCDF4 as nc4
+
     nc = nc4.Dataset(f)
     dtime = nc4.num2date(nc.variables['timeObs'][:],
                          nc.variables['timeObs'].units,
@@ -56,6 +57,8 @@ def spatial_filtered_groupby(df):
 
 
 def read_ERA5_to_df(f):
+    import netCDF4 as nc4
+
     nc = nc4.Dataset(f)
     dtime = nc4.num2date(nc.variables['time'][:],
                          nc.variables['time'].units,
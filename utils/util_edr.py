@@ -1,9 +1,9 @@
 import numpy as np
 import pandas as pd
-from scipy import signal
-import matplotlib.pyplot as plt
 
 def calculate_edr2(data, window_size=30):
+    from scipy import signal
+
     data["U"] = (-1) * (np.cos((np.pi / 180) * (90 - data["wdir"]))) * data["wspd"]
     data["V"] = (-1) * (np.sin((np.pi / 180) * (90 - data["wdir"]))) * data["wspd"]
 
@@ -81,6 +81,8 @@ def calculate_edr2(data, window_size=30):
 
 
 def draw_edr2(data_i, fig_out_path):
+    import matplotlib.pyplot as plt
+
     # Draw PSD_u.
     fig = plt.figure(dpi=100)
     plt.ylabel("S$_u$ [$\mathrm{{m^2}{s^{-1}}}$]")
@@ -1,11 +1,105 @@
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
 import numpy as np
-import cartopy.crs as crs
-from scipy.stats import linregress
+from scipy.stats import linregress, t as t_dist
 
 from utils.util_compare import rms
 
 
+def streaming_linregress(x, y, chunk_size=1000000):
+    """Least-squares regression accumulated from per-chunk moments.
+    Gives the same result as scipy.stats.linregress without holding
+    centered copies of the full arrays.
+    Args:
+        x, y (array-like): paired samples
+        chunk_size (int): number of samples reduced at once
+    Returns:
+        (slope, intercept, r_value, p_value, std_err)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    n, mx, my, sxx, syy, sxy = 0, 0., 0., 0., 0., 0.
+    for start in range(0, len(x), chunk_size):
+        cx = x[start:start + chunk_size]
+        cy = y[start:start + chunk_size]
+        cn = len(cx)
+        cmx, cmy = cx.mean(), cy.mean()
+        dx, dy = cx - cmx, cy - cmy
+        csxx, csyy, csxy = np.dot(dx, dx), np.dot(dy, dy), np.dot(dx, dy)
+
+        # Chan et al. pairwise update of the co-moments
+        total = n + cn
+        ddx, ddy = cmx - mx, cmy - my
+        sxx += csxx + ddx * ddx * n * cn / total
+        syy += csyy + ddy * ddy * n * cn / total
+        sxy += csxy + ddx * ddy * n * cn / total
+        mx += ddx * cn / total
+        my += ddy * cn / total
+        n = total
+
+    slope = sxy / sxx if sxx > 0 else np.nan
+    intercept = my - slope * mx
+    r_value = sxy / np.sqrt(sxx * syy) if sxx * syy > 0 else 0.
+    r_value = min(max(r_value, -1.), 1.)
+    dof = n - 2
+    if abs(r_value) == 1.:
+        p_value, std_err = 0., 0.
+    elif dof <= 0 or sxx == 0:
+        # fewer than three samples or a constant x: no error estimate
+        p_value, std_err = np.nan, np.nan
+    else:
+        t_stat = r_value * np.sqrt(dof / ((1. - r_value) * (1. + r_value)))
+        p_value = 2 * t_dist.sf(np.abs(t_stat), dof)
+        std_err = np.sqrt((1 - r_value ** 2) * syy / sxx / dof)
+    return slope, intercept, r_value, p_value, std_err
+
+
+def density_raster(x, y, bins, xrange, yrange, weights=None, chunk_size=1000000):
+    """Bin points into a fixed (ny, nx) raster with bincount.
+    Points outside the ranges are dropped. When weights are given, the
+    per-cell sum of weights is returned alongside the counts.
+    Returns:
+        counts, weight_sums (or None), xedges, yedges
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    nx, ny = (bins, bins) if np.isscalar(bins) else bins
+    xedges = np.linspace(xrange[0], xrange[1], nx + 1)
+    yedges = np.linspace(yrange[0], yrange[1], ny + 1)
+    xscale = nx / (xrange[1] - xrange[0]) if xrange[1] > xrange[0] else 0.
+    yscale = ny / (yrange[1] - yrange[0]) if yrange[1] > yrange[0] else 0.
+
+    counts = np.zeros(nx * ny, dtype=np.int64)
+    sums = None if weights is None else np.zeros(nx * ny, dtype=np.float64)
+    for start in range(0, len(x), chunk_size):
+        cx = x[start:start + chunk_size]
+        cy = y[start:start + chunk_size]
+        ix = np.floor((cx - xrange[0]) * xscale).astype(np.int64)
+        iy = np.floor((cy - yrange[0]) * yscale).astype(np.int64)
+        # the upper edge belongs to the last bin, as in np.histogram2d
+        ix[cx == xrange[1]] = nx - 1
+        iy[cy == yrange[1]] = ny - 1
+        inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+        flat = iy[inside] * nx + ix[inside]
+        counts += np.bincount(flat, minlength=nx * ny)
+        if sums is not None:
+            cw = np.asarray(weights[start:start + chunk_size], dtype=np.float64)
+            sums += np.bincount(flat, weights=cw[inside], minlength=nx * ny)
+
+    counts = counts.reshape(ny, nx)
+    if sums is not None:
+        sums = sums.reshape(ny, nx)
+    return counts, sums, xedges, yedges
+
+
+def draw_density(ax, x, y, bins, xrange, yrange):
+    counts, _, xedges, yedges = density_raster(x, y, bins, xrange, yrange)
+    masked = np.ma.masked_equal(counts, 0)
+    mesh = ax.pcolormesh(xedges, yedges, masked, cmap=plt.cm.Greys, norm=LogNorm(vmin=1))
+    return mesh
+
+
 def draw_bias_histogram(merged_df, i, comparison_target, target_year, out_path, time_resolution, thinning_method):
     hist_fig, axes = plt.subplots(2, 2, figsize=(12, 12))
     merged_df[f'ugap{i}'].hist(bins=100, ax=axes[0][0])
@@ -66,13 +160,19 @@ def draw_box_plot(merged_df, i, comparison_target, target_year, out_path, time_r
 
 
 def draw_scatter_plot(merged_df, i, suffix_list, suffix_name_list,
-                      comparison_target, target_year, out_path, time_resolution, thinning_method):
+                      comparison_target, target_year, out_path, time_resolution, thinning_method,
+                      density=False, bins=200):
     scatter_fig, axes = plt.subplots(1, 3, figsize=(16, 6))
     for j, scatter_target in enumerate(['u', 'v', 'wspd']):
         x = merged_df[f'{scatter_target}{suffix_list[i // 3]}']
         y = merged_df[f'{scatter_target}{suffix_list[i % 3 + (i // 3) * 2]}']
-        slope, intercept, r_value, p_value, std_err = linregress(x, y)
-        axes[j].scatter(x, y, c='k', s=1)
+        if density:
+            slope, intercept, r_value, p_value, std_err = streaming_linregress(x, y)
+            mesh = draw_density(axes[j], x, y, bins, (np.min(x), np.max(x)), (np.min(x), np.max(x)))
+            scatter_fig.colorbar(mesh, ax=axes[j], label='count')
+        else:
+            slope, intercept, r_value, p_value, std_err = linregress(x, y)
+            axes[j].scatter(x, y, c='k', s=1)
         axes[j].plot(np.linspace(np.min(x), np.max(x), 3), np.linspace(np.min(x), np.max(x), 3), c='r', lw=0.7)
         axes[j].set_xlim(np.min(x), np.max(x))
         axes[j].set_ylim(np.min(x), np.max(x))
@@ -84,8 +184,9 @@ def draw_scatter_plot(merged_df, i, suffix_list, suffix_name_list,
                                fc=(1., 1., 1.))
                      )
     scatter_fig.suptitle(f'{comparison_target} Scatter plot, {target_year}')
+    suffix = '_density' if density else ''
     scatter_fig.savefig(
-        f"{out_path}/c{i}/{target_year}_scatter_t{time_resolution}_{thinning_method}.png")
+        f"{out_path}/c{i}/{target_year}_scatter{suffix}_t{time_resolution}_{thinning_method}.png")
 
 
 def draw_bias_rms(merged_df, target_year, out_path, time_resolution, thinning_method):
@@ -137,7 +238,9 @@ def draw_bias_rms(merged_df, target_year, out_path, time_resolution, thinning_me
         f"{out_path}/{target_year}_uvlev_t{time_resolution}_{thinning_method}.png")
 
 
-def draw_map(merged_df, target_year, out_path, time_resolution, thinning_method):
+def draw_map(merged_df, target_year, out_path, time_resolution, thinning_method, density=False, cell_deg=0.05):
+    import cartopy.crs as crs
+
     x = merged_df["lon"]
     y = merged_df["lat"]
 
@@ -162,34 +265,56 @@ def draw_map(merged_df, target_year, out_path, time_resolution, thinning_method)
     ax_histy = plt.axes(rect_histy)
     ax_histy.tick_params(direction='in', labelleft=False)
 
-    # the scatter plot:
-    ax_scatter.scatter(x,
-                       y,
-                       c=merged_df['lev'],
-                       s=2,
-                       cmap=cm,
-                       transform=crs.PlateCarree())
+    if density:
+        # mean level of the points falling in each cell
+        nx, ny = int(round(15 / cell_deg)), int(round(10 / cell_deg))
+        counts, lev_sum, xedges, yedges = density_raster(x, y, (nx, ny), (120, 135), (30, 40),
+                                                         weights=merged_df['lev'].values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            lev_mean = np.ma.masked_where(counts == 0, lev_sum / counts)
+        ax_scatter.pcolormesh(xedges, yedges, lev_mean, cmap=cm, transform=crs.PlateCarree())
+
+        # marginal histograms on the 0.25 degree grid, summed from the raster
+        hist_x, _, hist_xedges, _ = density_raster(x, y, (60, 1), (120, 135), (-90, 90))
+        hist_y, _, _, hist_yedges = density_raster(x, y, (1, 40), (-180, 180), (30, 40))
+        ax_histx.bar(hist_xedges[:-1], hist_x.sum(axis=0), width=np.diff(hist_xedges), align='edge', color='k')
+        ax_histy.barh(hist_yedges[:-1], hist_y.sum(axis=1), height=np.diff(hist_yedges), align='edge', color='k')
+    else:
+        # the scatter plot:
+        ax_scatter.scatter(x,
+                           y,
+                           c=merged_df['lev'],
+                           s=2,
+                           cmap=cm,
+                           transform=crs.PlateCarree())
+        ax_histx.hist(x, bins=np.arange(120, 135+0.25, 0.25), color='k')
+        ax_histy.hist(y, bins=np.arange(30, 40+0.25, 0.25), orientation='horizontal', color='k')
 
     ax_scatter.set_xlim((120, 135))
     ax_scatter.set_ylim((30, 40))
-    ax_histx.hist(x, bins=np.arange(120, 135+0.25, 0.25), color='k')
-    ax_histy.hist(y, bins=np.arange(30, 40+0.25, 0.25), orientation='horizontal', color='k')
     ax_histx.set_xlim(ax_scatter.get_xlim())
     ax_histy.set_ylim(ax_scatter.get_ylim())
 
     plt.title(f'{target_year} \n map (triple), \n total point: {len(merged_df)}', loc='right')
+    suffix = '_density' if density else ''
     fig.savefig(
-        f'{out_path}/{target_year}_map_t{time_resolution}_{thinning_method}.png', bbox_inches='tight')
+        f'{out_path}/{target_year}_map{suffix}_t{time_resolution}_{thinning_method}.png', bbox_inches='tight')
 
 
-def draw_jerk_scatter_plot(merged_df, out_path, time_resolution, thinning_method):
+def draw_jerk_scatter_plot(merged_df, out_path, time_resolution, thinning_method, density=False, bins=200):
+    suffix = '_density' if density else ''
     fig1 = plt.figure(figsize=(8, 8))
     x = merged_df['vsr_jerk'].values
     y = merged_df['grav_jerk'].values
     x = (x - x.min()) / (x.max() - x.min())
     y = (y - y.min()) / (y.max() - y.min())
-    slope, intercept, r_value, p_value, std_err = linregress(x, y)
-    plt.scatter(x, y, c='k', s=1)
+    if density:
+        slope, intercept, r_value, p_value, std_err = streaming_linregress(x, y)
+        mesh = draw_density(plt.gca(), x, y, bins, (0, 1), (0, 1))
+        plt.colorbar(mesh, label='count')
+    else:
+        slope, intercept, r_value, p_value, std_err = linregress(x, y)
+        plt.scatter(x, y, c='k', s=1)
     # plt.hist2d(x,y, bins=np.linspace(0,1,50), cmap=plt.cm.Greys)
     plt.plot(np.linspace(0, 1, 3), np.linspace(1, 0, 3), c='r', lw=0.7)
     plt.xlim(np.min(x), np.max(x))
@@ -202,15 +327,20 @@ def draw_jerk_scatter_plot(merged_df, out_path, time_resolution, thinning_method
                        fc=(1., 1., 1.))
              )
     fig1.suptitle(f'Scatter plot')
-    fig1.savefig(f"{out_path}/scatter_vsr_grav_t{time_resolution}_{thinning_method}.png")
+    fig1.savefig(f"{out_path}/scatter_vsr_grav{suffix}_t{time_resolution}_{thinning_method}.png")
 
     fig2 = plt.figure(figsize=(8, 8))
     x = merged_df['vsr_jerk'].values
     y = merged_df['vr_jerk'].values
     x = (x - x.min()) / (x.max() - x.min())
     y = (y - y.min()) / (y.max() - y.min())
-    slope, intercept, r_value, p_value, std_err = linregress(x, y)
-    plt.scatter(x, y, c='k', s=1)
+    if density:
+        slope, intercept, r_value, p_value, std_err = streaming_linregress(x, y)
+        mesh = draw_density(plt.gca(), x, y, bins, (0, 1), (0, 1))
+        plt.colorbar(mesh, label='count')
+    else:
+        slope, intercept, r_value, p_value, std_err = linregress(x, y)
+        plt.scatter(x, y, c='k', s=1)
     # plt.hist2d(x,y, bins=np.linspace(0,1,50), cmap=plt.cm.Greys)
     plt.plot(np.linspace(0, 1, 3), np.linspace(0, 1, 3), c='r', lw=0.7)
     plt.xlim(np.min(x), np.max(x))
@@ -223,15 +353,20 @@ def draw_jerk_scatter_plot(merged_df, out_path, time_resolution, thinning_method
                        fc=(1., 1., 1.))
              )
     fig2.suptitle(f'Scatter plot')
-    fig2.savefig(f"{out_path}/scatter_vsr_vr_t{time_resolution}_{thinning_method}.png")
+    fig2.savefig(f"{out_path}/scatter_vsr_vr{suffix}_t{time_resolution}_{thinning_method}.png")
 
     fig3 = plt.figure(figsize=(8, 8))
     x = merged_df['vsr_jerk'].values
     y = merged_df['ivv_jerk'].values
     x = (x - x.min()) / (x.max() - x.min())
     y = (y - y.min()) / (y.max() - y.min())
-    slope, intercept, r_value, p_value, std_err = linregress(x, y)
-    plt.scatter(x, y, c='k', s=1)
+    if density:
+        slope, intercept, r_value, p_value, std_err = streaming_linregress(x, y)
+        mesh = draw_density(plt.gca(), x, y, bins, (0, 1), (0, 1))
+        plt.colorbar(mesh, label='count')
+    else:
+        slope, intercept, r_value, p_value, std_err = linregress(x, y)
+        plt.scatter(x, y, c='k', s=1)
     # plt.hist2d(x,y, bins=np.linspace(0,1,50), cmap=plt.cm.Greys)
     plt.plot(np.linspace(0, 1, 3), np.linspace(0, 1, 3), c='r', lw=0.7)
     plt.xlim(np.min(x), np.max(x))
@@ -244,15 +379,20 @@ def draw_jerk_scatter_plot(merged_df, out_path, time_resolution, thinning_method
                        fc=(1., 1., 1.))
              )
     fig3.suptitle(f'Scatter plot')
-    fig3.savefig(f"{out_path}/scatter_vsr_ivv_t{time_resolution}_{thinning_method}.png")
+    fig3.savefig(f"{out_path}/scatter_vsr_ivv{suffix}_t{time_resolution}_{thinning_method}.png")
 
     fig4 = plt.figure(figsize=(8, 8))
     x = merged_df['vr_jerk'].values
     y = merged_df['ivv_jerk'].values
     x = (x - x.min()) / (x.max() - x.min())
     y = (y - y.min()) / (y.max() - y.min())
-    slope, intercept, r_value, p_value, std_err = linregress(x, y)
-    plt.scatter(x, y, c='k', s=1)
+    if density:
+        slope, intercept, r_value, p_value, std_err = streaming_linregress(x, y)
+        mesh = draw_density(plt.gca(), x, y, bins, (0, 1), (0, 1))
+        plt.colorbar(mesh, label='count')
+    else:
+        slope, intercept, r_value, p_value, std_err = linregress(x, y)
+        plt.scatter(x, y, c='k', s=1)
     # plt.hist2d(x,y, bins=np.linspace(0,1,50), cmap=plt.cm.Greys)
     plt.plot(np.linspace(0, 1, 3), np.linspace(0, 1, 3), c='r', lw=0.7)
     plt.xlim(np.min(x), np.max(x))
@@ -265,4 +405,4 @@ def draw_jerk_scatter_plot(merged_df, out_path, time_resolution, thinning_method
                        fc=(1., 1., 1.))
              )
     fig4.suptitle(f'Scatter plot')
-    fig4.savefig(f"{out_path}/scatter_vr_ivv_t{time_resolution}_{thinning_method}.png")
+    fig4.savefig(f"{out_path}/scatter_vr_ivv{suffix}_t{time_resolution}_{thinning_method}.png")
@@ -0,0 +1,659 @@
+"""Vectorized Mode-S decoders.
+
+Frames are held as two uint64 words (see utils.schema.frame_words): the
+first 48 bits in `hi` and the last 64 bits in `lo`. Bits are numbered 1 to
+112 as in the Mode-S documents, so the data field ME/MB is bits 33 to 88.
+Every function mirrors the scalar function of the same name in
+utils.common, utils.position, utils.velocity or the utils.BDS modules and
+returns float arrays with NaN where the scalar function returns None.
+"""
+import numpy as np
+
+from utils.air import mach2cas, mach2tas, cas2tas
+from utils.constants import kts, ft
+
+_one = np.uint64(1)
+
+
+def bits(hi, lo, msb, lsb):
+    """Unsigned value of frame bits msb..lsb (1-indexed, inclusive)."""
+    width = lsb - msb + 1
+    mask = np.uint64((1 << width) - 1)
+    if lsb <= 48:
+        return (hi >> np.uint64(48 - lsb)) & mask
+    if msb > 48:
+        return (lo >> np.uint64(112 - lsb)) & mask
+    high = hi & np.uint64((1 << (49 - msb)) - 1)
+    return ((high << np.uint64(lsb - 48)) | (lo >> np.uint64(112 - lsb))) & mask
+
+
+def dbits(hi, lo, msb, lsb):
+    """Data field bits, numbered 1 to 56 as in the BDS decoders."""
+    return bits(hi, lo, msb + 32, lsb + 32)
+
+
+def pyround(x, ndigits):
+    """np.round that agrees with the built-in round() on every element.
+    np.round scales by 10**ndigits before rounding, which can land on the
+    other side of a tie; those few elements are redone with round().
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.round(x, ndigits)
+    scaled = x * 10. ** ndigits
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        idx = np.nonzero(near_tie & np.isfinite(x))[0]
+        out[idx] = [round(float(v), ndigits) for v in x[idx]]
+    return out
+
+
+def _nan_where(values, invalid):
+    out = values.astype(np.float64)
+    out[invalid] = np.nan
+    return out
+
+
+# -----------------------------------------------------
+# CRC
+# -----------------------------------------------------
+def _crc_table():
+    generator = 0xFFF409
+    table = np.zeros(256, dtype=np.uint64)
+    for byte in range(256):
+        c = byte << 16
+        for _ in range(8):
+            c = ((c << 1) ^ generator) if c & 0x800000 else (c << 1)
+        table[byte] = c & 0xFFFFFF
+    return table
+
+
+crc_table = _crc_table()
+
+
+def crc(hi, lo, encode=False):
+    """Mode-S CRC remainder of the whole 112-bit frame, as utils.common.crc.
+    With encode=True the parity field is taken as zero, which gives the
+    checksum of the first 88 bits.
+    """
+    rem = np.zeros(len(hi), dtype=np.uint64)
+    for k in range(11):
+        byte = bits(hi, lo, 8 * k + 1, 8 * k + 8)
+        idx = ((rem >> np.uint64(16)) ^ byte) & np.uint64(0xFF)
+        rem = ((rem << np.uint64(8)) & np.uint64(0xFFFFFF)) ^ crc_table[idx.astype(np.intp)]
+    if encode:
+        return rem
+    return rem ^ (lo & np.uint64(0xFFFFFF))
+
+
+def flip(hi, lo, bit):
+    """Flip frame bit `bit` (1 to 112, array) of every frame."""
+    bit = np.asarray(bit, dtype=np.int64)
+    in_hi = bit <= 48
+    hi = hi ^ np.where(in_hi, _one << np.where(in_hi, 48 - bit, 0).astype(np.uint64), np.uint64(0))
+    lo = lo ^ np.where(in_hi, np.uint64(0), _one << np.where(in_hi, 0, 112 - bit).astype(np.uint64))
+    return hi, lo
+
+
+def _syndrome_table(first_bit=6):
+    """Syndrome of a single bit error at each of bits first_bit..112.
+    The CRC is linear, so the syndrome of a flipped bit does not depend on
+    the rest of the frame. The DF bits 1-5 are left out: a frame "corrected"
+    into another downlink format is more likely wrong than right.
+    """
+    positions = np.arange(first_bit, 113)
+    zeros = np.zeros(len(positions), dtype=np.uint64)
+    hi, lo = flip(zeros, zeros, positions)
+    syndromes = crc(hi, lo)
+    order = np.argsort(syndromes)
+    return syndromes[order], positions[order]
+
+
+syndromes, syndrome_bits = _syndrome_table()
+
+
+def correct(hi, lo):
+    """Check the parity of DF17 frames and fix single bit errors.
+    Returns:
+        (hi, lo, status): corrected words, and per frame 0 for a clean
+        frame, 1 for a corrected one, 2 for an uncorrectable one
+    """
+    syndrome = crc(hi, lo)
+    status = np.where(syndrome == 0, 0, 2).astype(np.uint8)
+    bad = np.nonzero(syndrome != 0)[0]
+    if len(bad) == 0:
+        return hi, lo, status
+
+    idx = np.minimum(np.searchsorted(syndromes, syndrome[bad]), len(syndromes) - 1)
+    found = syndromes[idx] == syndrome[bad]
+    fix = bad[found]
+    hi, lo = hi.copy(), lo.copy()
+    hi[fix], lo[fix] = flip(hi[fix], lo[fix], syndrome_bits[idx[found]])
+    status[fix] = 1
+    return hi, lo, status
+
+
+def words2hex(hi, lo):
+    return ["%012X%016X" % (h, l) for h, l in zip(hi.tolist(), lo.tolist())]
+
+
+def short_words(code):
+    """56-bit frames (14 hex digits) as one uint64 each."""
+    raw = np.asarray(code, dtype='S14')
+    b = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(-1, 14)
+    nib = np.where(b >= ord('A'), (b | 0x20) - (ord('a') - 10), b - ord('0')).astype(np.uint64)
+    return (nib << np.arange(52, -4, -4, dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+
+
+def crc_short(w):
+    """CRC remainder of 56-bit frames."""
+    rem = np.zeros(len(w), dtype=np.uint64)
+    for k in range(4):
+        byte = (w >> np.uint64(48 - 8 * k)) & np.uint64(0xFF)
+        idx = ((rem >> np.uint64(16)) ^ byte) & np.uint64(0xFF)
+        rem = ((rem << np.uint64(8)) & np.uint64(0xFFFFFF)) ^ crc_table[idx.astype(np.intp)]
+    return rem ^ (w & np.uint64(0xFFFFFF))
+
+
+def df11_icao(w):
+    """Addresses of DF11 all-call replies (56-bit words, see short_words())
+    and whether they pass the parity check. The interrogator code is folded
+    into the low 7 parity bits, so any remainder below 0x80 is a clean frame.
+    Returns:
+        (ok, acid): boolean mask and uint32 addresses
+    """
+    ok = ((w >> np.uint64(51)) == 11) & (crc_short(w) < 0x80)
+    return ok, ((w >> np.uint64(24)) & np.uint64(0xFFFFFF)).astype(np.uint32)
+
+
+# -----------------------------------------------------
+# Common fields
+# -----------------------------------------------------
+def df(hi, lo):
+    return np.minimum(bits(hi, lo, 1, 5), np.uint64(24)).astype(np.uint8)
+
+
+def typecode(hi, lo):
+    DF = df(hi, lo)
+    return _nan_where(bits(hi, lo, 33, 37), (DF != 17) & (DF != 18))
+
+
+def icao(hi, lo):
+    """ICAO address as a number (int(icao(msg), 16) of the scalar decoder)."""
+    DF = df(hi, lo)
+    addr = np.zeros(len(hi), dtype=np.uint64)
+    direct = np.isin(DF, (11, 17, 18))
+    addr[direct] = bits(hi[direct], lo[direct], 9, 32)
+    parity = np.isin(DF, (0, 4, 5, 16, 20, 21))
+    addr[parity] = crc(hi[parity], lo[parity], encode=True) ^ (lo[parity] & np.uint64(0xFFFFFF))
+    return _nan_where(addr, ~(direct | parity))
+
+
+def oe_flag(hi, lo):
+    tc = typecode(hi, lo)
+    return _nan_where(bits(hi, lo, 54, 54), ~((tc >= 5) & (tc <= 18)))
+
+
+# -----------------------------------------------------
+# Altitude
+# -----------------------------------------------------
+def _gray2int(num):
+    num = num ^ (num >> np.uint64(8))
+    num = num ^ (num >> np.uint64(4))
+    num = num ^ (num >> np.uint64(2))
+    num = num ^ (num >> np.uint64(1))
+    return num
+
+
+def _gillham(code13):
+    """100 ft Gillham (Gray) altitude of a 13-bit code, NaN where invalid."""
+    def b(i):
+        # i is the 0-indexed character position of the 13-bit string
+        return (code13 >> np.uint64(12 - i)) & _one
+
+    C1, A1, C2, A2, C4, A4 = b(0), b(1), b(2), b(3), b(4), b(5)
+    B1, B2, D2, B4, D4 = b(7), b(9), b(10), b(11), b(12)
+    gc500 = (D2 << np.uint64(7)) | (D4 << np.uint64(6)) | (A1 << np.uint64(5)) | (A2 << np.uint64(4)) | \
+        (A4 << np.uint64(3)) | (B1 << np.uint64(2)) | (B2 << np.uint64(1)) | B4
+    gc100 = (C1 << np.uint64(2)) | (C2 << np.uint64(1)) | C4
+    n500 = _gray2int(gc500).astype(np.int64)
+    n100 = _gray2int(gc100).astype(np.int64)
+
+    invalid = np.isin(n100, (0, 5, 6))
+    n100 = np.where(n100 == 7, 5, n100)
+    n100 = np.where(n500 % 2 == 1, 6 - n100, n100)
+    return _nan_where(n500 * 500 + n100 * 100 - 1300, invalid)
+
+
+def altitude(code13):
+    """Decode 13-bit altitude codes held in uint64, as utils.position.altitude."""
+    M = (code13 >> np.uint64(6)) & _one
+    Q = (code13 >> np.uint64(4)) & _one
+    high6 = code13 >> np.uint64(7)
+    low4 = code13 & np.uint64(0xF)
+    bit7 = (code13 >> np.uint64(5)) & _one
+
+    ft25 = ((high6 << np.uint64(5)) | (bit7 << np.uint64(4)) | low4).astype(np.int64) * 25 - 1000
+    metre = ((high6 << np.uint64(6)) | (code13 & np.uint64(0x3F))).astype(np.int64)
+    # int() of the scalar decoder truncates towards zero
+    metre = np.trunc(metre * 3.28084)
+
+    alt = np.where(Q == 1, ft25.astype(np.float64), _gillham(code13))
+    alt = np.where(M == 1, metre, alt)
+    alt[code13 == 0] = np.nan
+    return alt
+
+
+def altitude05(hi, lo):
+    tc = typecode(hi, lo)
+    altbin = bits(hi, lo, 41, 52)
+    # insert the M bit (0) after the first 6 bits
+    code13 = ((altbin >> np.uint64(6)) << np.uint64(7)) | (altbin & np.uint64(0x3F))
+    alt = np.where(tc < 19, altitude(code13), altbin.astype(np.float64) * 3.28084)
+    invalid = np.isnan(tc) | (tc < 9) | (tc == 19) | (tc > 22)
+    alt[invalid] = np.nan
+    return alt
+
+
+def altcode(hi, lo):
+    DF = df(hi, lo)
+    alt = altitude(bits(hi, lo, 20, 32))
+    alt[~np.isin(DF, (0, 4, 16, 20))] = np.nan
+    return alt
+
+
+# -----------------------------------------------------
+# Airborne velocity (TC 19)
+# -----------------------------------------------------
+def velocity(hi, lo):
+    """Airborne velocity messages (TC 19, subtypes 1 to 4).
+    Subtypes 1 and 2 carry the ground vector as east/west and north/south
+    components; 3 and 4 carry heading and airspeed. Subtypes 2 and 4 are
+    the supersonic ones, in 4 kt steps.
+    Returns:
+        dict of float arrays: subtype, gs (kts), trk (deg), hdg (deg),
+        airspeed (kts), tas (1 when airspeed is TAS, 0 for IAS),
+        vr (ft/min), NaN where not available
+    """
+    tc = typecode(hi, lo)
+    st = dbits(hi, lo, 6, 8).astype(np.int64)
+    valid = (tc == 19) & (st >= 1) & (st <= 4)
+    scale = np.where((st == 2) | (st == 4), 4., 1.)
+
+    ground = valid & (st <= 2)
+    v_ew = dbits(hi, lo, 15, 24).astype(np.float64)
+    v_ns = dbits(hi, lo, 26, 35).astype(np.float64)
+    ground &= (v_ew > 0) & (v_ns > 0)
+    v_ew = np.where(dbits(hi, lo, 14, 14) == 1, -1, 1) * (v_ew - 1) * scale
+    v_ns = np.where(dbits(hi, lo, 25, 25) == 1, -1, 1) * (v_ns - 1) * scale
+    # rounded as the scalar decoder: NumPy's hypot and arctan2 may differ
+    # from the C library ones in the last bit
+    gs = pyround(np.hypot(v_ew, v_ns), 2)
+    trk = pyround(np.mod(np.degrees(np.arctan2(v_ew, v_ns)), 360), 2)
+
+    air = valid & (st >= 3)
+    hdg = _nan_where(dbits(hi, lo, 15, 24) * 360. / 1024, ~(air & (dbits(hi, lo, 14, 14) == 1)))
+    speed = dbits(hi, lo, 26, 35).astype(np.float64)
+    airspeed = _nan_where((speed - 1) * scale, ~(air & (speed > 0)))
+    tas = _nan_where(dbits(hi, lo, 25, 25), ~air)
+
+    vr = dbits(hi, lo, 38, 46).astype(np.float64)
+    vr = _nan_where(np.where(dbits(hi, lo, 37, 37) == 1, -1, 1) * (vr - 1) * 64, ~(valid & (vr > 0)))
+
+    return dict(subtype=_nan_where(st, ~valid), gs=np.where(ground, gs, np.nan), trk=np.where(ground, trk, np.nan),
+                hdg=hdg, airspeed=airspeed, tas=tas, vr=vr)
+
+
+# -----------------------------------------------------
+# CPR positions
+# -----------------------------------------------------
+def cprNL(lat):
+    lat = np.asarray(lat, dtype=np.float64)
+    nz = 15
+    a = 1 - np.cos(np.pi / (2 * nz))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        b = np.cos(np.pi / 180 * np.abs(lat)) ** 2
+        nl = 2 * np.pi / (np.arccos(1 - a / b))
+    NL = np.floor(nl)
+    NL = np.where((lat > 87) | (lat < -87), 1, NL)
+    NL = np.where(np.isclose(np.abs(lat), 87), 2, NL)
+    NL = np.where(np.isclose(lat, 0), 59, NL)
+    return NL
+
+
+def _cpr(hi, lo):
+    oe = bits(hi, lo, 54, 54)
+    cprlat = bits(hi, lo, 55, 71).astype(np.float64) / 131072
+    cprlon = bits(hi, lo, 72, 88).astype(np.float64) / 131072
+    return oe, cprlat, cprlon
+
+
+def airborne_position(hi0, lo0, hi1, lo1, t0, t1):
+    """Globally unambiguous position of even/odd pairs, NaN where undecodable.
+    Returns:
+        (lat, lon) float arrays
+    """
+    oe0, lat0, lon0 = _cpr(hi0, lo0)
+    oe1, lat1, lon1 = _cpr(hi1, lo1)
+    t0 = np.asarray(t0)
+    t1 = np.asarray(t1)
+
+    swap = (oe0 == 1) & (oe1 == 0)
+    valid = oe0 != oe1
+    cprlat_even = np.where(swap, lat1, lat0)
+    cprlon_even = np.where(swap, lon1, lon0)
+    cprlat_odd = np.where(swap, lat0, lat1)
+    cprlon_odd = np.where(swap, lon0, lon1)
+    t_even = np.where(swap, t1, t0)
+    t_odd = np.where(swap, t0, t1)
+
+    j = np.floor(59 * cprlat_even - 60 * cprlat_odd + 0.5)
+    lat_even = (360 / 60) * (np.mod(j, 60) + cprlat_even)
+    lat_odd = (360 / 59) * (np.mod(j, 59) + cprlat_odd)
+    lat_even = np.where(lat_even >= 270, lat_even - 360, lat_even)
+    lat_odd = np.where(lat_odd >= 270, lat_odd - 360, lat_odd)
+    valid &= cprNL(lat_even) == cprNL(lat_odd)
+
+    use_even = t_even > t_odd
+    lat = np.where(use_even, lat_even, lat_odd)
+    nl = cprNL(lat)
+    ni = np.maximum(np.where(use_even, nl, nl - 1), 1)
+    m = np.floor(cprlon_even * (nl - 1) - cprlon_odd * nl + 0.5)
+    lon = (360 / ni) * (np.mod(m, ni) + np.where(use_even, cprlon_even, cprlon_odd))
+    lon = np.where(lon > 180, lon - 360, lon)
+
+    lat = pyround(np.where(valid, lat, np.nan), 5)
+    lon = pyround(np.where(valid, lon, np.nan), 5)
+    return lat, lon
+
+
+def airborne_position_with_ref(hi, lo, lat_ref, lon_ref):
+    """Locally unambiguous position of single messages against a reference.
+    Returns:
+        (lat, lon) float arrays
+    """
+    oe, cprlat, cprlon = _cpr(hi, lo)
+    lat_ref = np.asarray(lat_ref, dtype=np.float64)
+    lon_ref = np.asarray(lon_ref, dtype=np.float64)
+
+    d_lat = np.where(oe == 1, 360 / 59, 360 / 60)
+    j = np.floor(lat_ref / d_lat) + np.floor(0.5 + (np.mod(lat_ref, d_lat) / d_lat) - cprlat)
+    lat = d_lat * (j + cprlat)
+
+    ni = cprNL(lat) - oe.astype(np.float64)
+    with np.errstate(divide='ignore'):
+        d_lon = np.where(ni > 0, 360 / ni, 360)
+    m = np.floor(lon_ref / d_lon) + np.floor(0.5 + (np.mod(lon_ref, d_lon) / d_lon) - cprlon)
+    lon = d_lon * (m + cprlon)
+    return pyround(lat, 5), pyround(lon, 5)
+
+
+# -----------------------------------------------------
+# BDS 5,0
+# -----------------------------------------------------
+def allzeros(hi, lo):
+    return dbits(hi, lo, 1, 56) == 0
+
+
+def wrongstatus(hi, lo, sb, msb, lsb):
+    return (dbits(hi, lo, sb, sb) == 0) & (dbits(hi, lo, msb, lsb) != 0)
+
+
+def is50(hi, lo):
+    wrong = allzeros(hi, lo)
+    for sb, msb, lsb in ((1, 3, 11), (12, 13, 23), (24, 25, 34), (35, 36, 45), (46, 47, 56)):
+        wrong |= wrongstatus(hi, lo, sb, msb, lsb)
+
+    roll = roll50(hi, lo)
+    gs = gs50(hi, lo)
+    tas = tas50(hi, lo)
+    # comparisons with NaN are False, as the scalar checks skip None
+    with np.errstate(invalid='ignore'):
+        wrong |= np.abs(roll) > 50
+        wrong |= gs > 600
+        wrong |= tas > 500
+        wrong |= np.abs(tas - gs) > 200
+    return ~wrong
+
+
+def _signed(value, sign, width):
+    value = value.astype(np.int64)
+    return np.where(sign == 1, value - (1 << width), value)
+
+
+def roll50(hi, lo):
+    value = _signed(dbits(hi, lo, 3, 11), dbits(hi, lo, 2, 2), 9)
+    return _nan_where(pyround(value * 45 / 256, 1), dbits(hi, lo, 1, 1) == 0)
+
+
+def trk50(hi, lo):
+    value = _signed(dbits(hi, lo, 14, 23), dbits(hi, lo, 13, 13), 10)
+    trk = value * 90 / 512.0
+    trk = np.where(trk < 0, 360 + trk, trk)
+    return _nan_where(pyround(trk, 3), dbits(hi, lo, 12, 12) == 0)
+
+
+def gs50(hi, lo):
+    return _nan_where(dbits(hi, lo, 25, 34) * np.uint64(2), dbits(hi, lo, 24, 24) == 0)
+
+
+def rtrk50(hi, lo):
+    raw = dbits(hi, lo, 37, 45)
+    value = _signed(raw, dbits(hi, lo, 36, 36), 9)
+    invalid = (dbits(hi, lo, 35, 35) == 0) | (raw == 511)
+    return _nan_where(pyround(value * 8 / 256, 3), invalid)
+
+
+def tas50(hi, lo):
+    return _nan_where(dbits(hi, lo, 47, 56) * np.uint64(2), dbits(hi, lo, 46, 46) == 0)
+
+
+# -----------------------------------------------------
+# BDS 6,0
+# -----------------------------------------------------
+def is60(hi, lo):
+    wrong = allzeros(hi, lo)
+    for sb, msb, lsb in ((1, 2, 12), (13, 14, 23), (24, 25, 34), (35, 36, 45), (46, 47, 56)):
+        wrong |= wrongstatus(hi, lo, sb, msb, lsb)
+
+    ias = ias60(hi, lo)
+    mach = mach60(hi, lo)
+    with np.errstate(invalid='ignore'):
+        wrong |= ias > 500
+        wrong |= mach > 1
+        wrong |= np.abs(vr60baro(hi, lo)) > 6000
+        wrong |= np.abs(vr60ins(hi, lo)) > 6000
+
+        # additional check knowing altitude
+        alt = altcode(hi, lo)
+        check = ~np.isnan(mach) & ~np.isnan(ias) & (df(hi, lo) == 20) & ~np.isnan(alt)
+        if check.any():
+            ias_ = mach2cas(mach[check], alt[check] * 0.3048) / 0.514444
+            wrong[check] |= np.abs(ias[check] - ias_) > 20
+    return ~wrong
+
+
+def hdg60(hi, lo):
+    value = _signed(dbits(hi, lo, 3, 12), dbits(hi, lo, 2, 2), 10)
+    hdg = value * 90 / 512
+    hdg = np.where(hdg < 0, 360 + hdg, hdg)
+    return _nan_where(pyround(hdg, 3), dbits(hi, lo, 1, 1) == 0)
+
+
+def ias60(hi, lo):
+    return _nan_where(dbits(hi, lo, 14, 23), dbits(hi, lo, 13, 13) == 0)
+
+
+def mach60(hi, lo):
+    mach = dbits(hi, lo, 25, 34).astype(np.float64) * 2.048 / 512.0
+    return _nan_where(pyround(mach, 3), dbits(hi, lo, 24, 24) == 0)
+
+
+def _vr60(hi, lo, status, sign):
+    raw = dbits(hi, lo, sign + 1, sign + 9)
+    value = _signed(raw, dbits(hi, lo, sign, sign), 9)
+    roc = np.where((raw == 0) | (raw == 511), 0, value * 32)
+    return _nan_where(roc, dbits(hi, lo, status, status) == 0)
+
+
+def vr60baro(hi, lo):
+    return _vr60(hi, lo, 35, 36)
+
+
+def vr60ins(hi, lo):
+    return _vr60(hi, lo, 46, 47)
+
+
+# -----------------------------------------------------
+# BDS 4,4
+# -----------------------------------------------------
+def is44(hi, lo):
+    wrong = allzeros(hi, lo)
+    for sb, msb, lsb in ((5, 6, 23), (35, 36, 46), (47, 48, 49), (50, 51, 56)):
+        wrong |= wrongstatus(hi, lo, sb, msb, lsb)
+    wrong |= dbits(hi, lo, 1, 4) > 4
+
+    speed, _ = wind44(hi, lo)
+    temp = temp44(hi, lo)
+    with np.errstate(invalid='ignore'):
+        wrong |= speed > 250
+        wrong |= (temp > 60) | (temp < -80)
+    return ~wrong
+
+
+def wind44(hi, lo):
+    invalid = dbits(hi, lo, 5, 5) == 0
+    speed = _nan_where(dbits(hi, lo, 6, 14), invalid)
+    direction = _nan_where(pyround(dbits(hi, lo, 15, 23) * 180 / 256, 1), invalid)
+    return speed, direction
+
+
+def temp44(hi, lo):
+    value = _signed(dbits(hi, lo, 25, 34), dbits(hi, lo, 24, 24), 10)
+    return pyround(value * 0.25, 2)
+
+
+def p44(hi, lo):
+    return _nan_where(dbits(hi, lo, 36, 46), dbits(hi, lo, 35, 35) == 0)
+
+
+def turb44(hi, lo):
+    return _nan_where(dbits(hi, lo, 48, 49), dbits(hi, lo, 47, 47) == 0)
+
+
+def hum44(hi, lo):
+    return _nan_where(pyround(dbits(hi, lo, 51, 56) * 100 / 64, 1), dbits(hi, lo, 50, 50) == 0)
+
+
+# -----------------------------------------------------
+# BDS 4,5
+# -----------------------------------------------------
+def is45(hi, lo):
+    wrong = allzeros(hi, lo)
+    for sb, msb, lsb in ((1, 2, 3), (4, 5, 6), (7, 8, 9), (10, 11, 12), (13, 14, 15),
+                         (16, 17, 26), (27, 28, 38), (39, 40, 51)):
+        wrong |= wrongstatus(hi, lo, sb, msb, lsb)
+    wrong |= dbits(hi, lo, 52, 56) != 0
+
+    temp = temp45(hi, lo)
+    with np.errstate(invalid='ignore'):
+        wrong |= (temp > 60) | (temp < -80)
+    return ~wrong
+
+
+def _hazard(hi, lo, sb):
+    return _nan_where(dbits(hi, lo, sb + 1, sb + 2), dbits(hi, lo, sb, sb) == 0)
+
+
+def turb45(hi, lo):
+    return _hazard(hi, lo, 1)
+
+
+def ws45(hi, lo):
+    return _hazard(hi, lo, 4)
+
+
+def mb45(hi, lo):
+    return _hazard(hi, lo, 7)
+
+
+def ic45(hi, lo):
+    return _hazard(hi, lo, 10)
+
+
+def wv45(hi, lo):
+    return _hazard(hi, lo, 13)
+
+
+def temp45(hi, lo):
+    value = _signed(dbits(hi, lo, 18, 26), dbits(hi, lo, 17, 17), 9)
+    return _nan_where(pyround(value * 0.25, 1), dbits(hi, lo, 16, 16) == 0)
+
+
+def p45(hi, lo):
+    return _nan_where(dbits(hi, lo, 28, 38), dbits(hi, lo, 27, 27) == 0)
+
+
+def rh45(hi, lo):
+    return _nan_where(dbits(hi, lo, 40, 51) * np.uint64(16), dbits(hi, lo, 39, 39) == 0)
+
+
+
+# -----------------------------------------------------
+# BDS inference
+# -----------------------------------------------------
+BDS_NONE, BDS_50, BDS_60, BDS_AMBIGUOUS, BDS_44, BDS_45 = 0, 1, 2, 3, 4, 5
+bds_labels = {BDS_NONE: 'none', BDS_50: '5,0', BDS_60: '6,0', BDS_AMBIGUOUS: 'ambiguous',
+              BDS_44: '4,4', BDS_45: '4,5'}
+
+
+def infer_bds(hi, lo, meteo=False):
+    """Label Comm-B replies as BDS 5,0, 6,0, ambiguous (both rule sets
+    pass) or none, with the rules of is50 and is60. With `meteo`, replies
+    that are neither are labelled BDS 4,4 or 4,5 when exactly one of is44
+    and is45 passes.
+    Returns:
+        np.ndarray: uint8 labels, see bds_labels
+    """
+    flag50 = is50(hi, lo)
+    flag60 = is60(hi, lo)
+    label = np.full(len(hi), BDS_NONE, dtype=np.uint8)
+    label[flag50 & ~flag60] = BDS_50
+    label[flag60 & ~flag50] = BDS_60
+    label[flag50 & flag60] = BDS_AMBIGUOUS
+    if meteo:
+        rest = label == BDS_NONE
+        flag44 = rest & is44(hi, lo)
+        flag45 = rest & is45(hi, lo)
+        label[flag44 & ~flag45] = BDS_44
+        label[flag45 & ~flag44] = BDS_45
+    return label
+
+
+def resolve_bds(hi, lo, alt, gs_ref, trk_ref):
+    """Resolve ambiguous replies against the aircraft's ADS-B ground vector.
+    Read as BDS 5,0 the reply gives the ground vector itself (gs50, trk50);
+    read as BDS 6,0 it gives the air vector (TAS from Mach or IAS, hdg60),
+    which only differs from the ground vector by the wind. The reading
+    closer to the reference wins.
+    Args:
+        alt (array): altitude in ft, for the BDS 6,0 airspeed conversion
+        gs_ref (array): reference ground speed in kts
+        trk_ref (array): reference track in degrees
+    Returns:
+        np.ndarray: BDS_50 or BDS_60, BDS_AMBIGUOUS where there is no reference
+    """
+    h = np.asarray(alt, dtype=np.float64) * ft
+    mach = mach60(hi, lo)
+    tas60 = np.where(np.isnan(mach), cas2tas(ias60(hi, lo) * kts, h), mach2tas(mach, h)) / kts
+
+    def distance(v, hdg):
+        hdg, trk = np.radians(hdg), np.radians(trk_ref)
+        return np.hypot(v * np.sin(hdg) - gs_ref * np.sin(trk), v * np.cos(hdg) - gs_ref * np.cos(trk))
+
+    d50 = distance(gs50(hi, lo), trk50(hi, lo))
+    d60 = distance(tas60, hdg60(hi, lo))
+    label = np.full(len(hi), BDS_AMBIGUOUS, dtype=np.uint8)
+    with np.errstate(invalid='ignore'):
+        label[d50 < d60] = BDS_50
+        label[d60 < d50] = BDS_60
+    return label
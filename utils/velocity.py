@@ -0,0 +1,49 @@
+import math
+
+from utils.common import hex2bin, data, bin2int, typecode
+
+
+def velocity(msg):
+    """Airborne velocity, ADS-B TC 19 subtypes 1 to 4
+    Subtypes 1 and 2 carry the ground vector as east/west and north/south
+    components, 3 and 4 the heading and airspeed; 2 and 4 are the
+    supersonic ones, in 4 kt steps.
+    Args:
+        msg (str): 28 hexdigits string
+    Returns:
+        tuple: subtype, ground speed (kts), track (deg), heading (deg),
+               airspeed (kts), 1 if the airspeed is TAS and 0 if IAS,
+               vertical rate (ft/min); None where not available
+    """
+    if typecode(msg) != 19:
+        return (None,) * 7
+
+    d = hex2bin(data(msg))
+    subtype = bin2int(d[5:8])
+    if subtype < 1 or subtype > 4:
+        return (None,) * 7
+    scale = 4 if subtype in (2, 4) else 1
+
+    gs = trk = hdg = airspeed = tas = None
+    if subtype <= 2:
+        v_ew = bin2int(d[14:24])
+        v_ns = bin2int(d[25:35])
+        if v_ew > 0 and v_ns > 0:
+            v_ew = (v_ew - 1) * scale * (-1 if d[13] == "1" else 1)
+            v_ns = (v_ns - 1) * scale * (-1 if d[24] == "1" else 1)
+            gs = round(math.hypot(v_ew, v_ns), 2)
+            trk = round(math.degrees(math.atan2(v_ew, v_ns)) % 360, 2)
+    else:
+        if d[13] == "1":
+            hdg = bin2int(d[14:24]) * 360 / 1024
+        speed = bin2int(d[25:35])
+        if speed > 0:
+            airspeed = (speed - 1) * scale
+        tas = int(d[24])
+
+    vr = None
+    value = bin2int(d[37:46])
+    if value > 0:
+        vr = (value - 1) * 64 * (-1 if d[36] == "1" else 1)
+
+    return subtype, gs, trk, hdg, airspeed, tas, vr
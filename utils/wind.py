@@ -1,11 +1,14 @@
 import numpy as np
 
+from utils.declination import declination as lookup_declination
+
 def calc_gspd_vector(gspd, tta):
     return np.array((gspd*np.sin(np.pi/180.*tta), gspd*np.cos(np.pi/180.*tta)))
 
 
-def calc_tas_vector(tas, mhed):
-    return np.array((tas*np.sin(np.pi/180.*(mhed-8)), tas*np.cos(np.pi/180.*(mhed-8))))
+def calc_tas_vector(tas, mhed, declination=-8.):
+    hed = mhed + declination
+    return np.array((tas*np.sin(np.pi/180.*hed), tas*np.cos(np.pi/180.*hed)))
 
 
 def calc_wspd(u, v):
@@ -18,8 +21,19 @@ def calc_wdir(u, v):
     return np.where(u > 0, 270.-np.arctan(v/u)*180./np.pi, 90.-np.arctan(v/u)*180./np.pi)
 
 
-def calculate(chunk):
-    u, v = calc_gspd_vector(chunk['gspd'], chunk['tta']) - calc_tas_vector(chunk['tas'], chunk['mhed'])
+def calculate(chunk, ground='bds50'):
+    """Wind from the ground vector minus the air vector.
+    ground='bds50' takes the ground vector from gspd/tta (BDS 5,0); 'tc19'
+    takes it from the ADS-B airborne velocity columns gs19/trk19 where
+    present and from gspd/tta elsewhere. The magnetic heading is turned
+    true with the declination at each position and time.
+    """
+    gspd, tta = chunk['gspd'], chunk['tta']
+    if ground == 'tc19':
+        gspd = chunk['gs19'].fillna(gspd)
+        tta = chunk['trk19'].fillna(tta)
+    dec = lookup_declination(chunk['lat'], chunk['lon'], chunk['time']) if len(chunk) else 0.
+    u, v = calc_gspd_vector(gspd, tta) - calc_tas_vector(chunk['tas'], chunk['mhed'], dec)
     chunk['wspd'] = calc_wspd(u, v)
     chunk['wdir'] = calc_wdir(u, v)
     return chunk